@@ -24,19 +24,13 @@ class Resource(API):
 
     def add_tags(self, artist, album, *tags):
         """
-        Tag an album using a list of user supplied tags.
+        Tag an album using a list of user supplied tags.  More than 10 tags
+        are added with several requests.
 
         http://www.last.fm/api/show/album.addTags
         """
-        self._request(
-            'POST',
-            'album.addTags',
-            data=dict(
-                artist=artist,
-                album=album,
-                tags=','.join(str(tag) for tag in tags),
-            ),
-        )
+        self._add_tags('album.addTags', dict(artist=artist, album=album),
+                       tags)
 
     @keywords('username', 'language', autocorrect=False)
     def get_info(self, *args, **kwargs):
@@ -88,6 +82,10 @@ class Resource(API):
             unwrap='tags',
         ).get('tag') or []
 
+        # A single tag isn't wrapped in a list
+        if isinstance(resp, dict):
+            resp = [resp]
+
         return [self.model(Tag, item) for item in resp]
 
     @keywords(autocorrect=False)
@@ -136,8 +134,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/album.search
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'album.search',
@@ -146,7 +142,6 @@ class Resource(API):
                 album=album,
             ),
             unwrap='results',
-            perpage=perpage,
             limit=limit,
             paginate_attr_class=common.SearchPaginateMixin,
         )['albummatches']['album']
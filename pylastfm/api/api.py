@@ -1,3 +1,6 @@
+import six
+
+from pylastfm import constants
 from pylastfm.response.common import ApiConfig
 
 
@@ -13,20 +16,38 @@ class API(object):
     def _paginate_request(self, *args, **kwargs):
         return self._client._paginate_request(*args, **kwargs)
 
+    def _add_tags(self, method, data, tags):
+        """
+        Make `method` addTags requests for a list of tags, with at most
+        `constants.MAX_TAGS` tags per request
+        """
+        tags = [six.text_type(tag) for tag in tags]
+        size = constants.MAX_TAGS
+        for start in six.moves.range(0, len(tags), size):
+            self._request(
+                'POST',
+                method,
+                data=dict(data, tags=','.join(tags[start:start + size])),
+            )
+
     def model_iterator(self, model_class, iterator):
         """
         Create a new iterator from an existing PaginatedIterator by applying
         the model class to each item
         """
-        return iterator.map(lambda item: self.model(model_class, item))
+        return iterator.map(lambda item: self.model(model_class, item),
+                            model=model_class)
 
     def model(self, model_class, data):
         """
         Return an instance of the model created form the data
         """
-        if issubclass(model_class, ApiConfig):
-            kwargs = {'client': self._client}
-        else:
-            kwargs = {}
+        if not issubclass(model_class, ApiConfig):
+            return model_class(data)
+
+        model = model_class(data, client=self._client)
+        entities = self._client.entities
+        if entities is not None:
+            entities.intern_model(model)
 
-        return model_class(data, **kwargs)
+        return model
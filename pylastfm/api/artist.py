@@ -8,18 +8,12 @@ class Resource(API):
 
     def add_tags(self, artist, *tags):
         """
-        Tag an artist with one or more user supplied tags.
+        Tag an artist with one or more user supplied tags.  More than 10 tags
+        are added with several requests.
 
         http://www.last.fm/api/show/artist.addTags
         """
-        self._request(
-            'POST',
-            'artist.addTags',
-            data=dict(
-                artist=artist,
-                tags=','.join(tags),
-            )
-        )
+        self._add_tags('artist.addTags', dict(artist=artist), tags)
 
     def get_correction(self, artist):
         """
@@ -117,12 +111,17 @@ class Resource(API):
                 artist=artist,
                 mbid=mbid,
                 autocorrect=int(autocorrect),
-                username=username or self._client.username,
+                user=username or self._client.username,
             ),
             unwrap='tags'
         )
 
-        tags = resp.get('tag', [])
+        tags = resp.get('tag') or []
+
+        # A single tag isn't wrapped in a list
+        if isinstance(tags, dict):
+            tags = [tags]
+
         return [self.model(common.Tag, tag) for tag in tags]
 
     def get_top_albums(self, artist=None, mbid=None, autocorrect=False,
@@ -132,8 +131,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/artist.getTopAlbums
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'artist.getTopAlbums',
@@ -144,7 +141,6 @@ class Resource(API):
                 autocorrect=int(autocorrect),
             ),
             limit=limit,
-            perpage=perpage,
             unwrap='topalbums'
         )['album']
 
@@ -176,8 +172,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/artist.getTopTracks
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'artist.getTopTracks',
@@ -189,7 +183,6 @@ class Resource(API):
             ),
             unwrap='toptracks',
             limit=limit,
-            perpage=perpage,
         )['track']
 
         return self.model_iterator(response.Track, resp)
@@ -216,8 +209,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/artist.search
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'artist.search',
@@ -226,7 +217,6 @@ class Resource(API):
             unwrap='results',
             paginate_attr_class=common.SearchPaginateMixin,
             limit=limit,
-            perpage=perpage,
         )['artistmatches']['artist']
 
         return self.model_iterator(response.Artist, resp)
@@ -5,13 +5,10 @@ from pylastfm.response import chart
 class Resource(API):
 
     def get_top_artists(self, limit=None):
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'chart.getTopArtists',
             'artist',
-            perpage=perpage,
             limit=limit,
             unwrap='artists'
         )['artist']
@@ -29,13 +26,10 @@ class Resource(API):
         return self.model_iterator(chart.Tag, resp)
 
     def get_top_tracks(self, limit=None):
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'chart.getTopTracks',
             'track',
-            perpage=perpage,
             limit=limit,
             unwrap='tracks'
         )['track']
@@ -1,21 +1,25 @@
 from pylastfm.response import geo as response
 from pylastfm.api.api import API
-from iso3166 import countries
+from pylastfm.countries import country_name
+from pylastfm.util import parallel_map
 
 
 class Resource(API):
 
     def get_top_artists(self, country, limit=None):
-        perpage = min(30, limit) if limit else 30
+        """
+        Get the most popular artists on Last.fm by country. `country` may be
+        an ISO 3166-1 code or a country name.
 
+        http://www.last.fm/api/show/geo.getTopArtists
+        """
         resp = self._paginate_request(
             'POST',
             'geo.getTopArtists',
             'artist',
             params=dict(
-                country=countries.get(country).name,
+                country=country_name(country),
             ),
-            perpage=perpage,
             limit=limit,
             unwrap='topartists',
         )['artist']
@@ -23,18 +27,48 @@ class Resource(API):
         return self.model_iterator(response.Artist, resp)
 
     def get_top_tracks(self, country, limit=None):
-        perpage = min(30, limit) if limit else 30
+        """
+        Get the most popular tracks on Last.fm last week by country. `country`
+        may be an ISO 3166-1 code or a country name.
 
+        http://www.last.fm/api/show/geo.getTopTracks
+        """
         resp = self._paginate_request(
             'POST',
             'geo.getTopTracks',
             'track',
             params=dict(
-                country=countries.get(country).name,
+                country=country_name(country),
             ),
-            perpage=perpage,
             limit=limit,
             unwrap='tracks',
         )['track']
 
         return self.model_iterator(response.Track, resp)
+
+    def _get_many(self, func, countries, limit, workers):
+        # Resolve every country before making any requests, so that an
+        # invalid country fails fast
+        countries = list(countries)
+        for country in countries:
+            country_name(country)
+
+        results = parallel_map(lambda country: list(func(country, limit)),
+                               countries, workers=workers)
+        return dict(zip(countries, results))
+
+    def get_top_artists_by_country(self, countries, limit=None, workers=4):
+        """
+        Get the most popular artists for each of several countries, fetched
+        concurrently by `workers` threads. Returns a dict of country to list
+        of artists. Responses are cached if the client has a cache.
+        """
+        return self._get_many(self.get_top_artists, countries, limit, workers)
+
+    def get_top_tracks_by_country(self, countries, limit=None, workers=4):
+        """
+        Get the most popular tracks for each of several countries, fetched
+        concurrently by `workers` threads. Returns a dict of country to list
+        of tracks. Responses are cached if the client has a cache.
+        """
+        return self._get_many(self.get_top_tracks, countries, limit, workers)
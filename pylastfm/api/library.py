@@ -11,8 +11,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/library.getArtists
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'library.getArtists',
@@ -21,7 +19,6 @@ class Resource(API):
                 user=username or self._client.username,
             ),
             unwrap='artists',
-            perpage=perpage,
             limit=limit,
         )['artist']
 
@@ -10,8 +10,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/tag.getTopAlbums
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'tag.getTopAlbums',
@@ -21,7 +19,6 @@ class Resource(API):
             ),
             unwrap='albums',
             limit=limit,
-            perpage=perpage,
         )['album']
 
         return self.model_iterator(common.TagAlbum, resp)
@@ -32,8 +29,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/tag.getTopArtists
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'tag.getTopArtists',
@@ -43,7 +38,6 @@ class Resource(API):
             ),
             unwrap='topartists',
             limit=limit,
-            perpage=perpage,
         )['artist']
 
         return self.model_iterator(common.TagArtist, resp)
@@ -64,8 +58,6 @@ class Resource(API):
     def get_top_tracks(self, tag, limit=None):
         """
         """
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'tag.getTopTracks',
@@ -75,7 +67,6 @@ class Resource(API):
             ),
             unwrap='tracks',
             limit=limit,
-            perpage=perpage,
         )['track']
 
         return self.model_iterator(common.TagTrack, resp)
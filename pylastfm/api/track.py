@@ -1,10 +1,68 @@
 import six
-import itertools
 from types import GeneratorType
 
 from pylastfm.response import common, track as response
 from pylastfm.api.api import API
-from pylastfm.util import keywords
+from pylastfm.util import NOT_SPECIFIED, keywords, parse_timestamp
+
+# (scrobble key, API parameter, type, default) for each field of
+# `response.Scrobble`, in the same order
+SCROBBLE_FIELDS = (
+    ('artist', 'artist', six.text_type, NOT_SPECIFIED),
+    ('track', 'track', six.text_type, NOT_SPECIFIED),
+    ('timestamp', 'timestamp', int, NOT_SPECIFIED),
+    ('mbid', 'mbid', six.text_type, None),
+    ('album', 'album', six.text_type, None),
+    ('context', 'context', six.text_type, None),
+    ('stream_id', 'streamId', six.text_type, None),
+    ('chosen_by_user', 'chosenByUser', int, 1),
+    ('track_number', 'trackNumber', int, None),
+    ('album_artist', 'albumArtist', six.text_type, None),
+    ('duration', 'duration', int, None),
+)
+
+REQUIRED_SCROBBLE_KEYS = tuple(key for key, _, _, default in SCROBBLE_FIELDS
+                               if default is NOT_SPECIFIED)
+
+# Maximum number of scrobbles in one request
+MAX_SCROBBLES = 50
+
+
+def _scrobble_parameters(index):
+    """Return the indexed API parameter names of the scrobble at `index`"""
+    return tuple('{0}[{1}]'.format(parameter, index)
+                 for _, parameter, _, _ in SCROBBLE_FIELDS)
+
+
+SCROBBLE_PARAMETERS = tuple(_scrobble_parameters(index)
+                            for index in six.moves.range(MAX_SCROBBLES))
+
+
+def _scrobble_values(scrobble):
+    """
+    Return the API values of the fields of a scrobble, in the same order as
+    SCROBBLE_FIELDS.  Values that already have the right type are used as
+    they are; anything unusual is left to `response.Scrobble`, so that values
+    and errors are the same as with the model.
+    """
+    if type(scrobble) is dict and all(key in scrobble
+                                      for key in REQUIRED_SCROBBLE_KEYS):
+        values = []
+        try:
+            for key, _, kind, default in SCROBBLE_FIELDS:
+                value = scrobble.get(key, default)
+                if value is not None and type(value) is not kind:
+                    value = (parse_timestamp(value) if key == 'timestamp'
+                             else kind(value))
+                values.append(value)
+        except (TypeError, ValueError):
+            pass
+        else:
+            if values[2] is None or values[2] >= 0:
+                return values
+
+    data = response.Scrobble(scrobble).to_dict()
+    return [data[parameter] for _, parameter, _, _ in SCROBBLE_FIELDS]
 
 
 def _track_arguments(name, args):
@@ -27,26 +85,31 @@ class Resource(API):
 
     def add_tags(self, artist, track, tags):
         """
-        Tag an album using a list of user supplied tags. Only accepts up to 10
-        tags.
+        Tag a track using a list of user supplied tags.  More than 10 tags
+        are added with several requests.
 
         http://www.last.fm/api/show/track.addTags
         """
-        # TODO: Can you add more than 10 tags?
-        self._request(
-            'POST',
-            'track.addTags',
-            data=dict(
-                artist=artist,
-                track=track,
-                tags=','.join(tags[:10]),
-            )
-        )
+        self._add_tags('track.addTags', dict(artist=artist, track=track),
+                       tags)
+
+    def coalescer(self, delay=1.0, max_delay=None, workers=2, retries=3,
+                  retry_delay=1.0):
+        """
+        Return a :class:`pylastfm.writes.WriteCoalescer`, which sends
+        now-playing updates and love/unlove requests asynchronously, dropping
+        writes that are superseded within `delay` seconds
+        """
+        from pylastfm.writes import WriteCoalescer
+        return WriteCoalescer(self._client, delay=delay, max_delay=max_delay,
+                              workers=workers, retries=retries,
+                              retry_delay=retry_delay)
 
     def get_correction(self, artist, track):
         """
         Use the last.fm corrections data to check whether the supplied track
-        has a correction to a canonical track
+        has a correction to a canonical track.  Returns `None` if there is no
+        correction.
 
         http://www.last.fm/api/show/track.getCorrection
         """
@@ -59,7 +122,18 @@ class Resource(API):
             ),
             unwrap='corrections',
         )
-        return self.model(response.CorrectedTrack, resp['correction']['track'])
+
+        try:
+            correction = resp['correction']['track']
+        except TypeError:
+            # As with artist.getCorrection, the API may return a whitespace
+            # string instead of a dict
+            if not isinstance(resp, six.text_type):
+                raise
+
+            return None
+
+        return self.model(response.CorrectedTrack, correction)
 
     @keywords('username', autocorrect=False)
     def get_info(self, *args, **kwargs):
@@ -117,7 +191,7 @@ class Resource(API):
                 limit=int(limit) if limit is not None else limit,
             )
         )
-        return [self.model(common.Track, item) for item in resp]
+        return [self.model(common.SimilarTrack, item) for item in resp]
 
     @keywords('username', autocorrect=False)
     def get_tags(self, *args, **kwargs):
@@ -144,9 +218,13 @@ class Resource(API):
                 track=track,
                 mbid=mbid,
                 autocorrect=int(kwargs['autocorrect']),
-                user=kwargs.get('username', self._client.username),
+                user=kwargs.get('username') or self._client.username,
             )
-        )['tag']
+        ).get('tag') or []
+
+        # A single tag isn't wrapped in a list
+        if isinstance(resp, dict):
+            resp = [resp]
 
         return [self.model(common.Tag, tag) for tag in resp]
 
@@ -202,7 +280,7 @@ class Resource(API):
         """
         self._request(
             'POST',
-            'track.remove_tag',
+            'track.removeTag',
             data=dict(
                 artist=artist,
                 track=track,
@@ -212,13 +290,16 @@ class Resource(API):
 
     def _marshal_scrobbles(self, scrobbles):
         """Marshal each scrobble in the correct format for the API"""
-        data = (response.Scrobble(scrobble).to_dict()
-                for scrobble in scrobbles)
-        return dict(itertools.chain.from_iterable(
-            [('{0}[{1}]'.format(key, i), value)
-             for key, value in scrobble.items()]
-            for i, scrobble in enumerate(data)
-        ))
+        data = {}
+        for index, scrobble in enumerate(scrobbles):
+            if index < MAX_SCROBBLES:
+                parameters = SCROBBLE_PARAMETERS[index]
+            else:
+                parameters = _scrobble_parameters(index)
+
+            data.update(zip(parameters, _scrobble_values(scrobble)))
+
+        return data
 
     def scrobble(self, *args, **kwargs):
         """
@@ -252,14 +333,15 @@ class Resource(API):
             scrobble(artist=artist, track=track, timestamp=timestamp, ...)
 
         In the first case, you may call the function with a tuple, list, or
-        generator.
+        generator.  Returns the decoded response, which counts the accepted
+        and ignored scrobbles.
 
         http://www.last.fm/api/show/track.scrobble
         """
         if args and isinstance(args[0], (tuple, list, GeneratorType)):
             if kwargs:
                 raise TypeError("scrobbles() got unexpected keyword "
-                                "argument: '{1}'".format(
+                                "argument: '{0}'".format(
                                     six.next(iter(kwargs))))
 
             data = dict(self._marshal_scrobbles(args[0]))
@@ -269,7 +351,7 @@ class Resource(API):
             raise TypeError('scrobbles() expected an iterable or keyword '
                             'arguments, but not both')
 
-        self._request(
+        return self._request(
             'POST',
             'track.scrobble',
             data=data,
@@ -282,9 +364,6 @@ class Resource(API):
 
         http://www.last.fm/api/show/track.search
         """
-        # limited by LastFM API
-        perpage = min(30, limit) if limit else 30
-
         resp = self._paginate_request(
             'GET',
             'track.search',
@@ -292,7 +371,6 @@ class Resource(API):
             unwrap='results',
             paginate_attr_class=common.SearchPaginateMixin,
             limit=limit,
-            perpage=perpage,
             params=dict(
                 artist=artist,
                 track=track,
@@ -321,7 +399,7 @@ class Resource(API):
         """
         http://www.last.fm/api/show/track.updateNowPlaying
         """
-        artist, track, mbid = _track_arguments('get_info', args)
+        artist, track, mbid = _track_arguments('update_now_playing', args)
 
         self._request(
             'POST',
@@ -159,8 +159,6 @@ class Resource(API):
         if period is not None and period not in VALID_PERIODS:
             raise ValueError('Invalid period: {0}'.format(period))
 
-        perpage = min(30, limit) if limit else 30
-
         resp = self._client._paginate_request(
             'GET',
             'user.getTopAlbums',
@@ -170,7 +168,6 @@ class Resource(API):
                 period=period
             ),
             limit=limit,
-            perpage=perpage,
             unwrap='topalbums',
         )['album']
 
@@ -187,8 +184,6 @@ class Resource(API):
         if period is not None and period not in VALID_PERIODS:
             raise ValueError('Invalid period: {0}'.format(period))
 
-        perpage = min(30, limit) if limit else 30
-
         resp = self._client._paginate_request(
             'GET',
             'user.getTopArtists',
@@ -198,7 +193,6 @@ class Resource(API):
                 period=period
             ),
             limit=limit,
-            perpage=perpage,
             unwrap='topartists',
         )['artist']
 
@@ -231,8 +225,6 @@ class Resource(API):
         if period is not None and period not in VALID_PERIODS:
             raise ValueError('Invalid period: {0}'.format(period))
 
-        perpage = min(30, limit) if limit else 30
-
         resp = self._client._paginate_request(
             'GET',
             'user.getTopTracks',
@@ -242,7 +234,6 @@ class Resource(API):
                 period=period,
             ),
             limit=limit,
-            perpage=perpage,
             unwrap='toptracks',
         )['track']
 
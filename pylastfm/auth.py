@@ -3,22 +3,27 @@ from pylastfm.error import AuthenticationError, FileError
 import six
 import hashlib
 import logging
-import requests
 
 
 LOGGER = logging.getLogger('lastfm')
 
+# Timeout of login requests, in seconds, if the client has no timeout.
+# Logins hold the session store's lock, so they must not wait forever.
+LOGIN_TIMEOUT = 30
+
 
 class Authenticator(object):
     """Base class for LastFM authenticators"""
 
     def __init__(self, signer, api_info, username=None, password=None,
-                 session_key=None):
+                 session_key=None, session_store=None, timeout=None):
         self._signer = signer
         self._api_info = api_info
         self._username = username
         self._password = password
         self._session_key = session_key
+        self._session_store = session_store
+        self._timeout = timeout or LOGIN_TIMEOUT
 
     @property
     def url(self):
@@ -38,8 +43,65 @@ class Authenticator(object):
     def session_key(self):
         raise NotImplementedError
 
+    def invalidate(self, session_key):
+        """Forget a session key that the API has rejected"""
+        pass
+
+
+class LoginAuthenticator(Authenticator):
+    """
+    Base class for authenticators that log in to get a session key.  If a
+    session store is given, the store is consulted before logging in, and the
+    new session key is saved for other clients to reuse.
+    """
+
+    @property
+    def store_key(self):
+        return '{0}:{1}'.format(self.api_key, self._username)
+
+    def session_key(self):
+        store = self._session_store
+        if store is None:
+            return self._login(None)[0]
+
+        # Hold the lock while logging in, so that concurrent clients wait for
+        # this login instead of starting their own
+        with store.lock():
+            entry = store.get(self.store_key) or {}
+            if entry.get('session_key'):
+                LOGGER.debug('Reusing stored session key for %s',
+                             self._username)
+                return entry['session_key']
+
+            session_key, mode = self._login(entry.get('mode'))
+            store.set(self.store_key, dict(session_key=session_key,
+                                           mode=mode))
+
+        return session_key
+
+    def invalidate(self, session_key):
+        store = self._session_store
+        if store is None:
+            return
+
+        with store.lock():
+            # Another client may already have replaced the rejected key
+            entry = store.get(self.store_key)
+            if entry is not None and entry.get('session_key') == session_key:
+                # Keep the password mode, since it is still valid
+                store.set(self.store_key, dict(session_key=None,
+                                               mode=entry.get('mode')))
+
+    def _login(self, mode):
+        """
+        Log in to the API, returning a tuple of (session key, mode).  `mode`
+        is the mode remembered by the session store from the last successful
+        login, if any.
+        """
+        raise NotImplementedError
+
 
-class PasswordAuthToken(Authenticator):
+class PasswordAuthToken(LoginAuthenticator):
 
     HASH_LOWER = frozenset('abcdef0123456789')
     HASH_UPPER = frozenset('ABCDEFG0123456789')
@@ -50,19 +112,22 @@ class PasswordAuthToken(Authenticator):
 
         super(PasswordAuthToken, self).__init__(*args, **kwargs)
 
-    def session_key(self):
+    def _login(self, mode):
         """Get a LastFM session key"""
 
         # The user told us whether or not the password is hashed
         if self._hashed is not None:
             hashed_tries = (self._hashed,)
+        elif mode is not None:
+            # A previous login told us whether or not the password is hashed
+            hashed_tries = (mode, not mode)
         else:
             guess = self._guess_password_hashed()
             hashed_tries = (guess, not guess)
 
         for hashed in hashed_tries:
             try:
-                return self._authenticate_maybe_hashed(hashed)
+                return self._authenticate_maybe_hashed(hashed), hashed
             except AuthenticationError as exc:
                 LOGGER.debug(
                     'Could not authenticate, assuming password %s hashed',
@@ -74,6 +139,8 @@ class PasswordAuthToken(Authenticator):
         assert False, "This should never be reached"
 
     def _authenticate_maybe_hashed(self, hashed):
+        import requests
+
         if hashed:
             pwhash = self._password
         else:
@@ -95,7 +162,8 @@ class PasswordAuthToken(Authenticator):
         try:
             resp = requests.post(
                 self.url,
-                data=self.sign(**postdata))
+                data=self.sign(**postdata),
+                timeout=self._timeout)
             resp.raise_for_status()
         except requests.exceptions.RequestException as exc:
             six.raise_from(AuthenticationError('Unable to get session'), exc)
@@ -114,9 +182,11 @@ class PasswordAuthToken(Authenticator):
                                   chars.issubset(self.HASH_UPPER))
 
 
-class Password(Authenticator):
+class Password(LoginAuthenticator):
+
+    def _login(self, mode):
+        import requests
 
-    def session_key(self):
         postdata = self.sign(
             method='auth.getMobileSession',
             username=self._username,
@@ -129,7 +199,8 @@ class Password(Authenticator):
         try:
             resp = requests.post(
                 self.url.replace('http://', 'https://'),
-                data=postdata)
+                data=postdata,
+                timeout=self._timeout)
             resp.raise_for_status()
         except requests.exceptions.RequestException as exc:
             six.raise_from(AuthenticationError('Unable to get session'), exc)
@@ -138,7 +209,7 @@ class Password(Authenticator):
         if 'error' in data:
             raise AuthenticationError(data.get('message'))
 
-        return resp.json()['session']['key']
+        return resp.json()['session']['key'], None
 
 
 class SessionKey(Authenticator):
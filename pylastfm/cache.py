@@ -0,0 +1,193 @@
+"""
+In-memory cache of decoded API responses
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+# Cache entry states; see CachePolicy.state
+FRESH = 'fresh'
+REFRESH = 'refresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class CachePolicy(object):
+    """
+    Caching policy for an API method.
+
+    Entries are fresh for `ttl` seconds.  After that, they are served stale
+    for up to `stale_ttl` more seconds while the client fetches a new version
+    in the background (stale-while-revalidate); older entries are not served.
+    If `refresh_ahead` is given, a fresh entry is also refreshed in the
+    background once it is older than `refresh_ahead * ttl`, so that popular
+    entries are replaced before they go stale.
+    """
+
+    def __init__(self, ttl, stale_ttl=0, refresh_ahead=None):
+        if refresh_ahead is not None and not 0 < refresh_ahead < 1:
+            raise ValueError('refresh_ahead must be between 0 and 1')
+
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_ahead = refresh_ahead
+
+    @property
+    def max_age(self):
+        return self.ttl + self.stale_ttl
+
+    def state(self, age):
+        """Return the state of an entry of the given age"""
+        if age < self.ttl:
+            if (self.refresh_ahead is not None and
+                    age >= self.ttl * self.refresh_ahead):
+                return REFRESH
+            return FRESH
+        elif age < self.max_age:
+            return STALE
+
+        return MISS
+
+
+class CacheEntry(object):
+    """
+    A cached response, along with the validators needed to revalidate it:
+    the `ETag` and `Last-Modified` headers of the response, and a digest of
+    the response body
+    """
+
+    __slots__ = ('value', 'stored', 'etag', 'last_modified', 'digest')
+
+    def __init__(self, value, etag=None, last_modified=None, digest=None):
+        self.value = value
+        self.stored = time.time()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+
+    @property
+    def age(self):
+        return time.time() - self.stored
+
+    def renewed(self):
+        """Return a copy of this entry that was stored just now"""
+        return CacheEntry(self.value, etag=self.etag,
+                          last_modified=self.last_modified,
+                          digest=self.digest)
+
+
+class ResponseCache(object):
+    """
+    Thread-safe LRU cache of decoded API responses.  Only read methods are
+    cached; see :meth:`pylastfm.client.LastFM._request`.
+
+    Entries are cached according to the :class:`CachePolicy` for their API
+    method in `policies`, or a default policy created from `ttl`,
+    `stale_ttl`, and `refresh_ahead`.  Expired entries are kept, until they
+    are evicted, so that they can be revalidated instead of downloaded again.
+    For example, to serve charts from the cache while they are refreshed:
+
+        swr = CachePolicy(ttl=300, stale_ttl=3600, refresh_ahead=0.8)
+        ResponseCache(policies={'chart.getTopArtists': swr,
+                                'chart.getTopTracks': swr})
+    """
+
+    def __init__(self, ttl=300, max_entries=1024, stale_ttl=0,
+                 refresh_ahead=None, policies=None):
+        self._default_policy = CachePolicy(ttl, stale_ttl=stale_ttl,
+                                           refresh_ahead=refresh_ahead)
+        self._policies = dict(policies or {})
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+    @property
+    def ttl(self):
+        return self._default_policy.ttl
+
+    def __len__(self):
+        return len(self._entries)
+
+    def policy(self, method=None):
+        """Return the policy for an API method"""
+        return self._policies.get(method, self._default_policy)
+
+    def lookup(self, key, method=None):
+        """
+        Return a tuple of (value, state) for `key`.  The value is `None` if
+        the state is :data:`MISS`.  Stale entries must be revalidated by the
+        caller; see :meth:`begin_refresh`.
+        """
+        policy = self.policy(method)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None, MISS
+
+            # Re-insert to mark as most recently used
+            self._entries[key] = entry
+
+            state = policy.state(entry.age)
+            if state == MISS:
+                self.misses += 1
+                return None, MISS
+            elif state == STALE:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+
+            return entry.value, state
+
+    def get(self, key, method=None):
+        """Return the cached value for `key`, or `None` if missing/expired"""
+        return self.lookup(key, method=method)[0]
+
+    def entry(self, key):
+        """Return the :class:`CacheEntry` for `key`, even if expired"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, value):
+        self.store(key, CacheEntry(value))
+
+    def store(self, key, entry):
+        """Store a :class:`CacheEntry`"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def begin_refresh(self, key):
+        """
+        Mark `key` as being refreshed.  Returns `False` if a refresh is
+        already in progress, in which case the caller shouldn't start another.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
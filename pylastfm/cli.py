@@ -0,0 +1,271 @@
+"""
+Command-line tool for bulk operations, installed as `pylastfm`:
+
+    pylastfm export rj -o export/rj --format parquet
+    pylastfm import scrobbles.csv
+    pylastfm charts --kind tracks --country us --country gb -o charts.ndjson
+    pylastfm warm --corrections corrections.db names.txt
+
+Credentials and client options are read from a config file (see
+:meth:`pylastfm.client.LastFM.from_config`), `~/.pylastfm` by default.
+Throughput statistics are printed to stderr when a command finishes.
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+
+import six
+from six.moves.configparser import Error as ConfigError
+
+from pylastfm.client import LastFM
+from pylastfm.countries import country_name
+from pylastfm.error import LastfmError
+from pylastfm.export import PERIODS, Exporter, encode_items
+from pylastfm.scrobbles import MAX_BATCH, ScrobbleImporter, read_rows
+
+
+DEFAULT_CONFIG = '~/.pylastfm'
+
+CHART_KINDS = ('artists', 'tracks', 'tags')
+
+
+def _client(args):
+    overrides = dict((name, six.text_type(getattr(args, name)))
+                     for name in ('rate', 'timeout', 'cache_ttl')
+                     if getattr(args, name) is not None)
+    return LastFM.from_config(args.config, **overrides)
+
+
+def _output(path):
+    if path is None or path == '-':
+        return sys.stdout
+
+    return io.open(path, 'w', encoding='utf-8')
+
+
+def export_command(client, args):
+    periods = tuple(args.period) if args.period else PERIODS
+    exporter = Exporter(client, args.username, args.output,
+                        workers=args.workers, processes=args.processes,
+                        periods=periods, weekly=not args.no_weekly,
+                        format=args.format)
+    manifest = exporter.run()
+
+    tasks = list(six.itervalues(manifest['tasks']))
+    failed = sum(1 for task in tasks if task['status'] != 'done')
+    if failed:
+        sys.stderr.write('{0} of {1} tasks failed; run again to resume\n'
+                         .format(failed, len(tasks)))
+
+    return sum(task['items'] for task in tasks), 1 if failed else 0
+
+
+def import_command(client, args):
+    format = args.input_format
+    if format is None:
+        format = 'csv' if args.file.endswith('.csv') else 'ndjson'
+
+    def progress(stats):
+        if args.verbose:
+            sys.stderr.write('{0} rows, {1} submitted, {2} duplicates, '
+                             '{3} rejected ({4:.1f} rows/s)\n'.format(
+                                 stats.rows, stats.submitted,
+                                 stats.duplicates, stats.rejected,
+                                 stats.rate))
+
+    importer = ScrobbleImporter(client, batch_size=args.batch_size,
+                                dedupe=not args.no_dedupe, state=args.state,
+                                progress=progress)
+    with io.open(args.file, encoding='utf-8', newline='') as handle:
+        stats = importer.run(read_rows(handle, format))
+
+    sys.stderr.write('{0} submitted ({1} accepted, {2} ignored), '
+                     '{3} duplicates, {4} rejected\n'.format(
+                         stats.submitted, stats.accepted, stats.ignored,
+                         stats.duplicates, stats.rejected))
+    return stats.rows, 0
+
+
+def charts_command(client, args):
+    if args.country:
+        if args.kind == 'tags':
+            raise ValueError('Tag charts are not available by country')
+        for country in args.country:
+            try:
+                country_name(country)
+            except KeyError:
+                raise ValueError('Unknown country: {0}'.format(country))
+
+        method = getattr(client.geo,
+                         'get_top_{0}_by_country'.format(args.kind))
+        charts = method(args.country, limit=args.limit, workers=args.workers)
+        rows = [dict(item.to_dict(), country=country)
+                for country in args.country for item in charts[country]]
+    else:
+        method = getattr(client.chart, 'get_top_{0}'.format(args.kind))
+        items = method() if args.kind == 'tags' else method(limit=args.limit)
+        rows = [item.to_dict() for item in items]
+
+    output = _output(args.output)
+    try:
+        output.write(six.text_type(encode_items(None, rows)))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return len(rows), 0
+
+
+def warm_command(client, args):
+    count = 0
+    if args.session:
+        client.authenticate()
+        count += 1
+
+    if args.corrections:
+        from pylastfm.corrections import CorrectionIndex
+
+        if args.file is None:
+            raise ValueError('A file of names is required to warm '
+                             'corrections')
+
+        with io.open(args.file, encoding='utf-8') as handle:
+            names = [tuple(line.rstrip('\n').split('\t', 1))
+                     if '\t' in line else line.strip()
+                     for line in handle if line.strip()]
+
+        index = CorrectionIndex(client, args.corrections,
+                                workers=args.workers)
+        try:
+            index.correct_many(names)
+        finally:
+            index.close()
+
+        sys.stderr.write(
+            'corrections: {0} cached, {1} requested, {2} failed\n'.format(
+                index.hits, index.misses, len(index.failures)))
+        count += len(names)
+
+    return count, 0
+
+
+def report(client, items, seconds):
+    """Return a summary of throughput for a command"""
+    stats = client.transfer_stats.report()
+    requests = sum(method['requests'] for method in six.itervalues(stats))
+    received = sum(method['compressed'] for method in six.itervalues(stats))
+    seconds = max(seconds, 1e-6)
+
+    return ('{0} items in {1:.1f}s ({2:.1f}/s), {3} requests ({4:.1f}/s), '
+            '{5} bytes received').format(items, seconds, items / seconds,
+                                         requests, requests / seconds,
+                                         received)
+
+
+def parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        '--config', default=os.environ.get('PYLASTFM_CONFIG', DEFAULT_CONFIG),
+        help='config file with credentials (default: %(default)s)')
+    common.add_argument('--rate', type=float,
+                        help='maximum requests per second')
+    common.add_argument('--timeout', type=float,
+                        help='request timeout in seconds')
+    common.add_argument('--cache-ttl', type=float,
+                        help='cache responses for this many seconds')
+    common.add_argument('-v', '--verbose', action='store_true',
+                        help='log requests and retries')
+
+    # Scrobbles are imported in order, one request at a time, so the import
+    # command doesn't take --workers
+    concurrent = argparse.ArgumentParser(add_help=False, parents=[common])
+    concurrent.add_argument('--workers', type=int, default=4,
+                            help='concurrent requests (default: '
+                            '%(default)s)')
+
+    result = argparse.ArgumentParser(
+        prog='pylastfm', description='Bulk Last.fm operations')
+    commands = result.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    export = commands.add_parser(
+        'export', parents=[concurrent],
+        help="export a user's listening history")
+    export.add_argument('username')
+    export.add_argument('-o', '--output', required=True,
+                        help='output directory')
+    export.add_argument('--format', choices=('ndjson', 'parquet'),
+                        default='ndjson')
+    export.add_argument('--processes', type=int,
+                        help='encoding processes (default: one per CPU)')
+    export.add_argument('--period', action='append', choices=PERIODS,
+                        help='top list period (default: all)')
+    export.add_argument('--no-weekly', action='store_true',
+                        help="don't export weekly charts")
+    export.set_defaults(func=export_command)
+
+    scrobbles = commands.add_parser(
+        'import', parents=[common], help='scrobble tracks from a file')
+    scrobbles.add_argument('file', help='NDJSON or CSV file of scrobbles')
+    scrobbles.add_argument('--input-format', choices=('ndjson', 'csv'),
+                           help='file format (default: from the extension)')
+    scrobbles.add_argument('--state', metavar='PATH',
+                           help='save progress to this file, and resume '
+                           'from it')
+    scrobbles.add_argument('--batch-size', type=int, default=MAX_BATCH,
+                           help='scrobbles per request (default: '
+                           '%(default)s)')
+    scrobbles.add_argument('--no-dedupe', action='store_true',
+                           help="don't skip scrobbles that are already in "
+                           "the user's recent tracks")
+    scrobbles.set_defaults(func=import_command)
+
+    charts = commands.add_parser(
+        'charts', parents=[concurrent], help='fetch global or country charts')
+    charts.add_argument('--kind', choices=CHART_KINDS, default='artists')
+    charts.add_argument('--country', action='append',
+                        help='fetch the chart of a country (repeatable)')
+    charts.add_argument('--limit', type=int)
+    charts.add_argument('-o', '--output', help='output file (default: '
+                        'stdout)')
+    charts.set_defaults(func=charts_command)
+
+    warm = commands.add_parser(
+        'warm', parents=[concurrent], help='warm persistent caches')
+    warm.add_argument('file', nargs='?', help='file of artist names, or '
+                      'tab-separated artist and track names')
+    warm.add_argument('--corrections', metavar='PATH',
+                      help='correction database to fill')
+    warm.add_argument('--session', action='store_true',
+                      help='log in and save the session key to the '
+                      'configured session store')
+    warm.set_defaults(func=warm_command)
+
+    return result
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s %(levelname)s %(message)s')
+
+    started = time.time()
+    try:
+        client = _client(args)
+        items, status = args.func(client, args)
+    except (LastfmError, ConfigError, ValueError, IOError,
+            ImportError) as exc:
+        sys.stderr.write('pylastfm {0}: {1}\n'.format(args.command, exc))
+        return 1
+
+    sys.stderr.write(report(client, items, time.time() - started) + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
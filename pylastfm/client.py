@@ -1,16 +1,22 @@
 import os
 import six
-import requests
+import hashlib
+import logging
+import threading
 from itertools import chain
-from requests.adapters import HTTPAdapter
 from six.moves.configparser import SafeConfigParser, NoOptionError
 
-from pylastfm.response.common import PaginateMixin
-from pylastfm import auth, constants, error
-from pylastfm.util import (Signer, PaginatedIterator, nested_get, nested_in,
-                           nested_set, ceildiv)
-from pylastfm.api import (album, artist, chart, geo, library, tag, track,
-                          user, auth as apiauth)
+from pylastfm import auth, constants, error, keypool, session, transport
+from pylastfm.cache import (ResponseCache, CacheEntry, MISS, REFRESH,
+                            STALE)
+from pylastfm.singleflight import SingleFlight
+from pylastfm.util import (Signer, Pager, PaginatedIterator, RateLimiter,
+                           nested_get, nested_in, nested_set, json_copy,
+                           request_key, class_path, import_class, ceildiv,
+                           fetch_first_page)
+
+
+LOGGER = logging.getLogger('lastfm')
 
 
 def prefixed(prfx, *methods):
@@ -38,6 +44,25 @@ AUTHENTICATED_METHODS = frozenset(chain(
 ))
 
 
+def cacheable(method):
+    """Return True if responses for the API method may be cached"""
+    return (method not in AUTHENTICATED_METHODS and
+            not method.startswith('auth.'))
+
+
+def _with_api_key(request_args, key):
+    """Return a copy of request arguments that use another API key"""
+    request_args = dict(request_args)
+    for name in ('params', 'data'):
+        data = request_args.get(name)
+        if data is not None and 'api_key' in data:
+            request_args[name] = dict(data, api_key=key)
+
+    return request_args
+
+
+NOT_MODIFIED = 304
+
 ERROR = 'error'
 MESSAGE = 'message'
 
@@ -45,6 +70,25 @@ MAX_LIMIT = 200
 DEFAULT_LIMIT = MAX_LIMIT
 DEFAULT_PERPAGE = 200
 
+# Largest page size honored by paginated API methods; other methods use
+# DEFAULT_PERPAGE
+MAX_PAGE_SIZE = dict(chain(
+    ((method, 30) for method in chain(
+        prefixed('album', 'search'),
+        prefixed('artist', 'search'),
+        prefixed('track', 'search'),
+    )),
+    ((method, 1000) for method in chain(
+        prefixed('artist', 'getTopAlbums', 'getTopTracks'),
+        prefixed('chart', 'getTopArtists', 'getTopTags', 'getTopTracks'),
+        prefixed('geo', 'getTopArtists', 'getTopTracks'),
+        prefixed('library', 'getArtists'),
+        prefixed('tag', 'getTopAlbums', 'getTopArtists', 'getTopTracks'),
+        prefixed('user', 'getLovedTracks', 'getTopAlbums', 'getTopArtists',
+                 'getTopTracks'),
+    )),
+))
+
 
 def _list_response(data):
     """
@@ -57,6 +101,30 @@ def _list_response(data):
     return data
 
 
+class LazyResource(object):
+    """
+    Descriptor for an API resource (e.g. `LastFM.album`).  The resource module
+    is imported, along with its response models, the first time the resource
+    is accessed on a client.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, client, owner):
+        if client is None:
+            return self
+
+        module = __import__('pylastfm.api.' + self._name,
+                            fromlist=['Resource'])
+        resource = module.Resource(client)
+
+        # Cache the resource on the instance, which takes precedence over
+        # this descriptor from now on
+        client.__dict__[self._name] = resource
+        return resource
+
+
 class ApiInfo(object):
 
     def __init__(self, key, secret, url=None, session_key=None):
@@ -96,6 +164,17 @@ class ApiInfo(object):
 
 class LastFM(object):
 
+    # Exposed API objects
+    album = LazyResource('album')
+    artist = LazyResource('artist')
+    chart = LazyResource('chart')
+    geo = LazyResource('geo')
+    library = LazyResource('library')
+    user = LazyResource('user')
+    tag = LazyResource('tag')
+    track = LazyResource('track')
+    auth = LazyResource('auth')
+
     def __init__(self,
                  api_key,
                  api_secret,
@@ -103,7 +182,17 @@ class LastFM(object):
                  password=None,
                  url=None,
                  session_key=None,
-                 auth_method=None):
+                 auth_method=None,
+                 session_store=None,
+                 cache=None,
+                 api_keys=None,
+                 key_strategy='lru',
+                 key_rate=None,
+                 coalesce=False,
+                 timeout=None,
+                 adaptive_pages=False,
+                 entities=None,
+                 rate=None):
         """
         Create a LastFM client
 
@@ -121,6 +210,31 @@ class LastFM(object):
             'hashed_password', 'session_key', or 'session_key_file'. If not
             specified, the client will attempt to determine the correct method
             from the parameters given.
+        :param session_store: :class:`pylastfm.session.SessionStore` or path
+            to a session store file.  Session keys obtained with 'password' or
+            'hashed_password' authentication are saved to and reused from the
+            store, so that clients sharing it only log in once.
+        :param cache: :class:`pylastfm.cache.ResponseCache`, or `True` to use
+            a cache with default settings.  Responses from read methods are
+            cached, keyed on the API method and parameters.
+        :param api_keys: Additional (key, secret) pairs.  If given,
+            unauthenticated requests are distributed over all of the keys,
+            while signed requests always use `api_key`.
+        :param key_strategy: How to choose a key from the pool; can be 'lru'
+            (least recently used) or 'budget' (most remaining rate budget).
+        :param key_rate: Requests per second allowed for each key; required
+            for the 'budget' strategy.
+        :param coalesce: If `True`, concurrent identical requests to read
+            methods share a single HTTP request and its result; see
+            :attr:`single_flight` for statistics.
+        :param timeout: Request timeout, in seconds
+        :param adaptive_pages: If `True`, paginated requests whose pages time
+            out are retried with smaller pages
+        :param entities: :class:`pylastfm.entities.EntityIndex`, or `True`
+            to create one.  Artists, albums and tracks in responses are
+            linked to a shared entity, and their strings are interned.
+        :param rate: Maximum HTTP requests per second made by this client,
+            over all of its threads
         """
         self._username = username
         self._api_info = api_info = ApiInfo(
@@ -136,22 +250,55 @@ class LastFM(object):
             auth_class = self._get_auth_class(session_key)
 
         self._auth = auth_class(signer, api_info, username=username,
-                                password=password, session_key=session_key)
-
-        # Fix SSL issues for LastFM API
-        self._session = requests.Session()
-        self._session.mount(constants.DEFAULT_URL, HTTPAdapter(max_retries=2))
-
-        # Exposed API objects
-        self.album = album.Resource(self)
-        self.artist = artist.Resource(self)
-        self.chart = chart.Resource(self)
-        self.geo = geo.Resource(self)
-        self.library = library.Resource(self)
-        self.user = user.Resource(self)
-        self.tag = tag.Resource(self)
-        self.track = track.Resource(self)
-        self.auth = apiauth.Resource(self)
+                                password=password, session_key=session_key,
+                                session_store=session.session_store(
+                                    session_store),
+                                timeout=timeout)
+
+        if api_keys:
+            pool_infos = [api_info] + [
+                ApiInfo(key, secret, url=api_info.url)
+                for key, secret in api_keys]
+            self._key_pool = keypool.ApiKeyPool(
+                pool_infos, strategy=key_strategy, rate=key_rate)
+        else:
+            self._key_pool = None
+
+        if cache is True:
+            cache = ResponseCache()
+        elif cache is False:
+            cache = None
+        self._cache = cache
+        self._flight = SingleFlight() if coalesce else None
+        self._transfer_stats = transport.TransferStats()
+        self._timeout = timeout
+        self._adaptive_pages = adaptive_pages
+
+        if entities is True:
+            from pylastfm.entities import EntityIndex
+            entities = EntityIndex()
+        elif entities is False:
+            entities = None
+        self._entities = entities
+        self._limiter = RateLimiter(rate) if rate else None
+
+        # Created on first request, so that requests is only imported when
+        # it's needed
+        self._session = None
+
+    def _http_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            # Fix SSL issues for LastFM API
+            self._session = requests.Session()
+            self._session.mount(constants.DEFAULT_URL,
+                                HTTPAdapter(max_retries=2))
+            self._session.headers['Accept-Encoding'] = \
+                transport.accept_encoding()
+
+        return self._session
 
     def _get_auth_class(self, session_key):
         if not session_key:
@@ -191,12 +338,31 @@ class LastFM(object):
             # Can be 'password' or 'hashed_password'
             auth_method = password
 
+            # Optional; share session keys with other processes
+            session_store = ~/.pylastfm-sessions
+
+            # Optional; spread unauthenticated requests over more keys
+            api_keys = key2:secret2, key3:secret3
+            key_strategy = budget
+            key_rate = 5
+
+            # Optional; requests per second, request timeout in seconds, and
+            # response cache TTL in seconds
+            rate = 5
+            timeout = 10
+            cache_ttl = 300
+
         You can also override config values with keyword arguments.
         """
         config = SafeConfigParser()
         config.add_section('lastfm')
         config.read(os.path.expanduser(os.path.expandvars(path)))
 
+        key_rate = cls._getoption(config, kwargs, 'key_rate', None)
+        rate = cls._getoption(config, kwargs, 'rate', None)
+        timeout = cls._getoption(config, kwargs, 'timeout', None)
+        cache_ttl = cls._getoption(config, kwargs, 'cache_ttl', None)
+
         return LastFM(
             cls._getoption(config, kwargs, 'api_key'),
             cls._getoption(config, kwargs, 'api_secret'),
@@ -205,8 +371,24 @@ class LastFM(object):
             auth_method=cls._getoption(config, kwargs, 'auth_method', None),
             session_key=cls._getoption(config, kwargs, 'session_key', None),
             url=cls._getoption(config, kwargs, 'url', None),
+            session_store=cls._getoption(config, kwargs, 'session_store',
+                                         None),
+            api_keys=cls._parse_api_keys(
+                cls._getoption(config, kwargs, 'api_keys', '')),
+            key_strategy=cls._getoption(config, kwargs, 'key_strategy',
+                                        'lru'),
+            key_rate=float(key_rate) if key_rate else None,
+            rate=float(rate) if rate else None,
+            timeout=float(timeout) if timeout else None,
+            cache=ResponseCache(ttl=float(cache_ttl)) if cache_ttl else None,
         )
 
+    @staticmethod
+    def _parse_api_keys(value):
+        """Parse 'key1:secret1, key2:secret2' into a list of pairs"""
+        return [tuple(item.strip().split(':', 1))
+                for item in value.split(',') if item.strip()]
+
     @property
     def username(self):
         return self._username
@@ -215,6 +397,31 @@ class LastFM(object):
     def api_info(self):
         return self._api_info
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def key_pool(self):
+        return self._key_pool
+
+    @property
+    def single_flight(self):
+        return self._flight
+
+    @property
+    def transfer_stats(self):
+        """
+        :class:`pylastfm.transport.TransferStats` with the compressed and
+        decompressed bytes received for each API method
+        """
+        return self._transfer_stats
+
+    @property
+    def entities(self):
+        """:class:`pylastfm.entities.EntityIndex`, or `None`"""
+        return self._entities
+
     @api_info.setter
     def api_info(self, value):
         self._api_info = value
@@ -267,74 +474,327 @@ class LastFM(object):
         """
         http_method = http_method.upper()
         request_args = self._request_args(http_method, method, kwargs)
+        result = self._read(http_method, method, request_args)
+
+        unwrapped = result[unwrap] if unwrap else result
+        if collection_key is None:
+            return unwrapped
+
+        coll_keys = collection_key.split('.')
+        return _list_response(nested_get(unwrapped, coll_keys))
+
+    def _read(self, http_method, method, request_args):
+        """
+        Return the decoded response for a request, from the cache or shared
+        with an identical request in flight if possible
+        """
+        shared = self._cache is not None or self._flight is not None
+        if not (shared and cacheable(method)):
+            return self._fetch(http_method, method, request_args)
+
+        params = dict(request_args.get('params') or {})
+        params.update(request_args.get('data') or {})
+        key = request_key(method, params)
+
+        def fetch():
+            return self._cached_fetch(key, http_method, method, request_args)
+
+        if self._flight is not None:
+            result = self._flight.do(key, fetch)
+        else:
+            result = fetch()
+
+        # The result may be shared with other callers, who may modify it, so
+        # never hand out the original
+        return json_copy(result)
+
+    def _cached_fetch(self, key, http_method, method, request_args):
+        if self._cache is None:
+            return self._fetch(http_method, method, request_args)
+
+        result, state = self._cache.lookup(key, method)
+        if state == MISS:
+            entry = self._fetch_entry(http_method, method, request_args,
+                                      self._cache.entry(key))
+            self._cache.store(key, entry)
+            result = entry.value
+        elif state in (STALE, REFRESH):
+            self._refresh(key, http_method, method, request_args)
+
+        return result
+
+    def _refresh(self, key, http_method, method, request_args):
+        """Refresh a cache entry in a background thread"""
+        if not self._cache.begin_refresh(key):
+            return
+
+        # The caller may reuse its parameter dicts for other requests
+        request_args = dict(
+            (name, dict(value) if isinstance(value, dict) else value)
+            for name, value in request_args.items())
+
+        def refresh():
+            try:
+                entry = self._fetch_entry(http_method, method, request_args,
+                                          self._cache.entry(key))
+                self._cache.store(key, entry)
+            except error.LastfmError as exc:
+                LOGGER.warning('Unable to refresh %s: %s', method, exc)
+            finally:
+                self._cache.end_refresh(key)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_entry(self, http_method, method, request_args, previous=None):
+        """
+        Fetch a response as a :class:`pylastfm.cache.CacheEntry`,
+        revalidating the `previous` entry if there is one.  GET requests are
+        made conditional on the validators of the previous response; if the
+        server doesn't support them, an unchanged body is detected by its
+        digest, and the previous decoded response is reused.
+        """
+        headers = {}
+        if previous is not None and http_method == 'GET':
+            if previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
+
+        def fetch(request_args):
+            resp = self._send(http_method, request_args, headers=headers)
+            if resp.status_code == NOT_MODIFIED and previous is not None:
+                self._cache.not_modified += 1
+                return previous.renewed()
+
+            digest = hashlib.md5(resp.body).hexdigest()
+            if previous is not None and previous.digest == digest:
+                self._cache.unchanged += 1
+                result = previous.value
+            else:
+                result = self._decode(method, resp)
+
+            return CacheEntry(result,
+                              etag=resp.headers.get('ETag'),
+                              last_modified=resp.headers.get('Last-Modified'),
+                              digest=digest)
+
+        return self._pooled(method, request_args, fetch)
+
+    def _pooled(self, method, request_args, fetch):
+        """
+        Return `fetch(request_args)`.  If there is a key pool, an unsigned
+        request is sent with a key taken from the pool just before it is
+        sent, and if the API reports that key as suspended or rate limited,
+        it is quarantined and the request is retried with the next key.
+        Signed methods are pinned to the key that owns the session.
+        """
+        if self._key_pool is None or not cacheable(method):
+            return fetch(request_args)
+
+        attempts = len(self._key_pool)
+        for attempt in six.moves.range(attempts):
+            api_info = self._key_pool.acquire()
+            try:
+                return fetch(_with_api_key(request_args, api_info.key))
+            except error.APIError as exc:
+                self._key_pool.quarantine(api_info, exc.code)
+                if (exc.code not in keypool.QUARANTINE_SECONDS or
+                        attempt + 1 == attempts):
+                    raise
+
+    @staticmethod
+    def _http_error(resp):
+        """
+        Return an APIError for an HTTP error response, preferring the API
+        error code from the body if there is one
+        """
+        try:
+            result = resp.json()
+            return error.APIError(result[ERROR], result[MESSAGE])
+        except (ValueError, TypeError, KeyError):
+            return error.APIError(resp.status_code, resp.reason)
+
+    def _send(self, http_method, request_args, headers=None):
+        """Make an HTTP request to the API, returning the response"""
+        import requests
+
+        if headers:
+            request_args = dict(request_args, headers=headers)
+
+        if self._limiter is not None:
+            self._limiter.acquire()
 
         try:
-            resp = self._session.request(http_method,
-                                         self.api_info.url,
-                                         **request_args)
-            resp.raise_for_status()
+            resp = self._http_session().request(http_method,
+                                                self.api_info.url,
+                                                stream=True,
+                                                timeout=self._timeout,
+                                                **request_args)
+            if resp.status_code != NOT_MODIFIED:
+                resp.raise_for_status()
+
+            result, received = transport.read_response(resp)
         except requests.exceptions.HTTPError as exc:
-            six.raise_from(
-                error.APIError(exc.response.status_code, exc.response.reason),
-                exc)
+            six.raise_from(self._http_error(exc.response), exc)
+        except requests.exceptions.Timeout as exc:
+            six.raise_from(error.RequestTimeout(
+                'Request timed out: {0}'.format(exc)), exc)
         except requests.exceptions.RequestException as exc:
             newexc = error.LastfmError('Request error: {0}'.format(exc))
             six.raise_from(newexc, exc)
 
+        method = (request_args.get('params') or
+                  request_args.get('data') or {}).get('method')
+        self._transfer_stats.record(method, received, len(result.body))
+
+        return result
+
+    def _decode(self, method, resp):
+        """Return the decoded response, raising an APIError if it is one"""
         result = resp.json()
         if ERROR in result:
+            if (result[ERROR] == constants.INVALID_SESSION_KEY and
+                    method in AUTHENTICATED_METHODS):
+                # Make the next signed request log in again
+                self._auth.invalidate(self.api_info.session_key)
+                self.api_info = self.api_info.add_session_key(None)
+
             raise error.APIError(result[ERROR], result[MESSAGE])
 
-        unwrapped = result[unwrap] if unwrap else result
-        if collection_key is None:
-            return unwrapped
+        return result
 
-        coll_keys = collection_key.split('.')
-        return _list_response(nested_get(unwrapped, coll_keys))
+    def _fetch(self, http_method, method, request_args):
+        """Make an HTTP request to the API, returning the decoded response"""
+        return self._pooled(method, request_args, lambda request_args: (
+            self._decode(method, self._send(http_method, request_args))))
+
+    def page_size(self, method, limit=None):
+        """
+        Return the page size to use for a paginated API method: the largest
+        page size the method supports, or `limit` if that is smaller
+        """
+        size = MAX_PAGE_SIZE.get(method, DEFAULT_PERPAGE)
+        return min(size, limit) if limit else size
 
     def _paginate_request(self, http_method, method, collection_key,
                           perpage=None, limit=None, params=None,
-                          paginate_attr_class=None, **kwargs):
+                          paginate_attr_class=None, page=1, start_total=None,
+                          extra=0, **kwargs):
         if paginate_attr_class is None:
+            from pylastfm.response.common import PaginateMixin
             paginate_attr_class = PaginateMixin
 
         if perpage is None:
-            perpage = DEFAULT_PERPAGE
+            perpage = self.page_size(method, limit)
 
         if params is None:
             params = {}
         params.update(limit=perpage)
 
-        resp = self._request(http_method, method, params=params, **kwargs)
+        request = dict(
+            http_method=http_method,
+            method=method,
+            collection_key=collection_key,
+            params=dict((key, value) for key, value in six.iteritems(params)
+                        if key != 'limit'),
+            kwargs=kwargs,
+            limit=limit or None,
+            paginate_attr_class=class_path(paginate_attr_class),
+        )
+
+        def firstquery(page, size):
+            query = dict(params, limit=size)
+            if page > 1:
+                query.update(page=page)
+            return self._request(http_method, method, params=query, **kwargs)
+
+        resp, size = fetch_first_page(firstquery, page, perpage,
+                                      adaptive=self._adaptive_pages)
 
         coll_keys = collection_key.split('.')
         if not nested_in(resp, coll_keys) and resp.get('total') == '0':
-            nested_set(resp, coll_keys, PaginatedIterator(0, 0, iter([])))
+            nested_set(resp, coll_keys, PaginatedIterator(
+                0, 0, iter([]), start_total=start_total))
             return resp
 
         attributes = paginate_attr_class(resp)
+        thispage = _list_response(nested_get(resp, coll_keys))
+        total_pages = attributes.total_pages
 
-        if limit and limit < attributes.total:
-            n_pages = min(attributes.total_pages, ceildiv(limit, perpage))
-            pagerange = six.moves.range(2, n_pages + 1)
-        else:
-            pagerange = six.moves.range(2, attributes.total_pages + 1)
+        if size < perpage:
+            # The page timed out, and was fetched at a smaller size
+            total_pages = ceildiv(attributes.total, perpage)
+        elif page < total_pages and 0 < len(thispage) < perpage:
+            # The API may return fewer items per page than requested; the
+            # actual page size determines which items are on subsequent pages
+            perpage = size = len(thispage)
 
-        def pagequery(page, http_method=http_method, method=method,
+        def pagequery(page, size, http_method=http_method, method=method,
                       collection_key=collection_key, params=params,
                       kwargs=kwargs):
-            params['page'] = page
-
-            return self._request(http_method, method, params=params,
+            return self._request(http_method, method,
+                                 params=dict(params, page=page, limit=size),
                                  collection_key=collection_key, **kwargs)
 
-        thispage = _list_response(nested_get(resp, coll_keys))
-        remaining_pages = chain.from_iterable(pagequery(page)
-                                              for page in pagerange)
-        iterator = chain(thispage, remaining_pages)
+        pager = Pager(pagequery, perpage, attributes.total,
+                      adaptive=self._adaptive_pages, size=size)
+        if size < perpage and len(thispage) >= size:
+            # Only the first part of the page was fetched at a smaller size
+            thispage = thispage + pager.page(page, start=size)
 
-        nested_set(resp, coll_keys, PaginatedIterator(attributes.total_pages,
+        nested_set(resp, coll_keys, PaginatedIterator(total_pages,
                                                       attributes.total,
-                                                      iterator))
+                                                      pager=pager,
+                                                      first_page=thispage,
+                                                      limit=limit or None,
+                                                      page=page,
+                                                      request=request,
+                                                      start_total=start_total,
+                                                      extra=extra))
 
         return resp
+
+    def resume(self, checkpoint, strict=False):
+        """
+        Resume a paginated API call from a checkpoint returned by
+        :meth:`pylastfm.util.PaginatedIterator.checkpoint`, returning an
+        iterator over the items from the checkpoint on.  Pages before the
+        checkpoint are not requested.
+
+        If the total number of items has changed since the call was first
+        made, items may have moved between pages; a warning is logged, or
+        :class:`pylastfm.error.PaginationDrift` is raised if `strict` is true.
+        """
+        resp = self._paginate_request(
+            checkpoint['http_method'],
+            checkpoint['method'],
+            checkpoint['collection_key'],
+            perpage=checkpoint['perpage'],
+            limit=checkpoint['limit'],
+            params=dict(checkpoint['params']),
+            paginate_attr_class=import_class(
+                checkpoint['paginate_attr_class']),
+            page=checkpoint['page'],
+            start_total=checkpoint['total'],
+            extra=checkpoint.get('extra', 0),
+            **checkpoint['kwargs'])
+
+        iterator = nested_get(resp, checkpoint['collection_key'].split('.'))
+        if iterator.drift:
+            if strict:
+                raise error.PaginationDrift(checkpoint['total'],
+                                            iterator.total)
+
+            LOGGER.warning('Total items of %s changed from %d to %d since '
+                           'checkpoint', checkpoint['method'],
+                           checkpoint['total'], iterator.total)
+
+        iterator.skip(checkpoint['offset'])
+        if checkpoint['model']:
+            from pylastfm.api.api import API
+            iterator = API(self).model_iterator(
+                import_class(checkpoint['model']), iterator)
+
+        return iterator
@@ -1 +1,12 @@
 DEFAULT_URL = 'http://ws.audioscrobbler.com/2.0/'
+
+# Maximum number of tags added by one addTags request
+MAX_TAGS = 10
+
+# API error codes
+INVALID_PARAMETERS = 6
+INVALID_SESSION_KEY = 9
+SERVICE_OFFLINE = 11
+TEMPORARY_ERROR = 16
+SUSPENDED_API_KEY = 26
+RATE_LIMIT_EXCEEDED = 29
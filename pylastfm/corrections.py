@@ -0,0 +1,207 @@
+"""
+Local index of artist and track name corrections
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import namedtuple
+
+import six
+
+from pylastfm import constants
+from pylastfm.error import APIError
+from pylastfm.util import normalize_name, parallel_map
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+Correction = namedtuple('Correction',
+                        ['artist', 'artist_mbid', 'track', 'track_mbid'])
+
+CorrectionFailure = namedtuple('CorrectionFailure', ['item', 'error'])
+
+
+class CorrectionIndex(object):
+    """
+    Memoized corrections of artist names (`artist.getCorrection`) and
+    (artist, track) names (`track.getCorrection`) to their canonical names
+    and MusicBrainz IDs.
+
+    Names are normalized (see :func:`pylastfm.util.normalize_name`) before
+    lookup, so variants that differ only in case, whitespace or Unicode
+    representation share a correction.  Names without a correction are
+    corrected to themselves.  If `path` is given, corrections are persisted
+    to a SQLite database there, so that they are only requested from Last.fm
+    once.  Unknown names are corrected concurrently by `workers` threads.
+    Names whose correction can't be requested are corrected to `None`, and
+    collected in `failures`; they are requested again next time.
+
+        index = CorrectionIndex(client, 'corrections.db')
+        index.correct_many([('guns n roses', 'sweet child of mine'),
+                            'the beatles'])
+    """
+
+    def __init__(self, client, path=None, workers=4):
+        self._client = client
+        self._workers = workers
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = []
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS corrections ('
+                'artist_key TEXT NOT NULL, track_key TEXT NOT NULL, '
+                'artist TEXT, artist_mbid TEXT, track TEXT, track_mbid TEXT, '
+                'PRIMARY KEY (artist_key, track_key))')
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            if self._db is None:
+                return len(self._entries)
+
+            return self._db.execute(
+                'SELECT COUNT(*) FROM corrections').fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    @staticmethod
+    def _key(item):
+        if isinstance(item, tuple):
+            artist, track = item
+            return normalize_name(artist), normalize_name(track)
+
+        return normalize_name(item), ''
+
+    def _lookup(self, key):
+        with self._lock:
+            correction = self._entries.get(key)
+            if correction is not None or self._db is None:
+                return correction
+
+            row = self._db.execute(
+                'SELECT artist, artist_mbid, track, track_mbid '
+                'FROM corrections WHERE artist_key = ? AND track_key = ?',
+                key).fetchone()
+            if row is None:
+                return None
+
+            correction = self._entries[key] = Correction(*row)
+            return correction
+
+    def _store(self, corrections):
+        with self._lock:
+            self._entries.update(corrections)
+            if self._db is None:
+                return
+
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO corrections VALUES '
+                    '(?, ?, ?, ?, ?, ?)',
+                    [key + tuple(correction)
+                     for key, correction in six.iteritems(corrections)])
+
+    def _fetch(self, item):
+        """Request the correction of an artist or (artist, track)"""
+        if isinstance(item, tuple):
+            artist, track = item
+            try:
+                corrected = self._client.track.get_correction(artist, track)
+            except APIError as exc:
+                if exc.code != constants.INVALID_PARAMETERS:
+                    raise
+                corrected = None
+
+            if corrected is None:
+                return Correction(artist, None, track, None)
+
+            return Correction(corrected.artist_name,
+                              corrected.artist_mbid or None,
+                              corrected.name, corrected.mbid or None)
+
+        try:
+            corrected = self._client.artist.get_correction(item)
+        except APIError as exc:
+            if exc.code != constants.INVALID_PARAMETERS:
+                raise
+            corrected = []
+
+        if not corrected:
+            return Correction(item, None, None, None)
+
+        return Correction(corrected[0].name, corrected[0].mbid or None, None,
+                          None)
+
+    def _try_fetch(self, item):
+        try:
+            return self._fetch(item)
+        except Exception as exc:
+            LOGGER.warning('Unable to get correction of %s: %s', item, exc)
+            return CorrectionFailure(item, exc)
+
+    def correct_many(self, items):
+        """
+        Return a list of the :class:`Correction` of each item, which is an
+        artist name or an (artist, track) tuple.  Unknown names are
+        requested concurrently, once per normalized name.  Items whose
+        correction can't be requested are corrected to `None`.
+        """
+        items = list(items)
+        keys = [self._key(item) for item in items]
+
+        results = {}
+        unknown = {}
+        for item, key in zip(items, keys):
+            if key in results or key in unknown:
+                continue
+
+            correction = self._lookup(key)
+            if correction is None:
+                unknown[key] = item
+            else:
+                results[key] = correction
+
+        self.hits += len(results)
+        self.misses += len(unknown)
+
+        if unknown:
+            fetched = parallel_map(self._try_fetch, list(unknown.values()),
+                                   workers=self._workers)
+
+            corrections = {}
+            for key, correction in zip(unknown, fetched):
+                if isinstance(correction, CorrectionFailure):
+                    self.failures.append(correction)
+                else:
+                    corrections[key] = correction
+
+            self._store(corrections)
+            results.update(corrections)
+
+        return [results.get(key) for key in keys]
+
+    def correct_artist(self, artist):
+        """
+        Return the :class:`Correction` of an artist name, or `None` if it
+        can't be requested
+        """
+        return self.correct_many([artist])[0]
+
+    def correct_track(self, artist, track):
+        """
+        Return the :class:`Correction` of an (artist, track) name, or `None`
+        if it can't be requested
+        """
+        return self.correct_many([(artist, track)])[0]
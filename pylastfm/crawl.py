@@ -0,0 +1,645 @@
+"""
+Concurrent crawling of users, friends, and similar artists and tracks
+"""
+
+import csv
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from pylastfm.util import PaginatedIterator, RateLimiter, normalize_name
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+CrawlResult = namedtuple('CrawlResult',
+                         ['username', 'job', 'result', 'error', 'seconds'])
+
+Edge = namedtuple('Edge', ['source', 'target', 'depth'])
+
+
+def user_job(method, **kwargs):
+    """
+    Return a job that calls the `user` resource method named `method` for a
+    user.  Crawlers read every item of the :class:`PaginatedIterator`
+    returned by paginated methods.
+    """
+    def job(client, username):
+        return getattr(client.user, method)(username, **kwargs)
+
+    return job
+
+
+def _percentile(values, fraction):
+    """Return a percentile of a sorted list"""
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+class CrawlStats(object):
+    """Thread-safe progress and per-job latency of a crawl"""
+
+    def __init__(self):
+        self._latencies = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, count):
+        with self._lock:
+            self.scheduled += count
+
+    def record(self, job, seconds, failed=False):
+        with self._lock:
+            self._latencies.setdefault(job, []).append(seconds)
+            self.completed += 1
+            if failed:
+                self._failures[job] = self._failures.get(job, 0) + 1
+                self.failed += 1
+
+    @property
+    def progress(self):
+        """Fraction of scheduled calls that have completed"""
+        with self._lock:
+            if not self.scheduled:
+                return 0.0
+            return float(self.completed) / self.scheduled
+
+    def __getitem__(self, job):
+        """
+        Return a dict of the number of `calls` and `failures` of a job, and
+        the `mean`, `p50`, `p95` and `max` latency of its calls in seconds
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(job, ()))
+            failures = self._failures.get(job, 0)
+
+        if not latencies:
+            return dict(calls=0, failures=0, mean=None, p50=None, p95=None,
+                        max=None)
+
+        return dict(calls=len(latencies),
+                    failures=failures,
+                    mean=sum(latencies) / len(latencies),
+                    p50=_percentile(latencies, 0.5),
+                    p95=_percentile(latencies, 0.95),
+                    max=latencies[-1])
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._latencies)
+
+    def report(self):
+        """Return a dict of stats for every job"""
+        return dict((job, self[job]) for job in self.jobs())
+
+
+class _Crawler(object):
+    """Base class of crawlers that call the API from a pool of threads"""
+
+    def __init__(self, client, workers=8, rate=None, burst=None):
+        self._client = client
+        self._workers = workers
+        self._limiter = RateLimiter(rate, burst=burst) if rate else None
+
+    def _acquire(self):
+        if self._limiter is not None:
+            self._limiter.acquire()
+
+    def _call(self, func, *args):
+        self._acquire()
+        return func(*args)
+
+    def _pages(self, iterator, raw=False):
+        """
+        Yield the pages of a paginated result whose first page has been
+        fetched, taking a token from the rate budget before each other page
+        is requested
+        """
+        pages = iterator.iter_pages(raw=raw)
+        page = next(pages, None)
+        while page is not None:
+            yield page
+            if iterator.remaining > 0:
+                self._acquire()
+            page = next(pages, None)
+
+    def _map(self, func, items):
+        """Yield `func(item)` for each item as calls complete"""
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(self._workers)
+        try:
+            for result in pool.imap_unordered(func, items):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+class UserCrawler(_Crawler):
+    """
+    Runs a set of jobs for each of many users, from a pool of `workers`
+    threads.
+
+    `jobs` is a dict of job name to a function that takes a client and a
+    username, or a list of names of `user` resource methods (see
+    :func:`user_job`); every item of a paginated result is read.  If `rate`
+    is given, at most `rate` requests per second (with bursts of up to
+    `burst`) are made across all workers, including the `user.get_info`
+    calls made to prioritize users: a job takes a token before it starts,
+    and another before each further page of its paginated result.  For
+    example:
+
+        crawler = UserCrawler(client, ['get_recent_tracks',
+                                       'get_top_artists',
+                                       'get_loved_tracks'],
+                              workers=16, rate=5)
+        for result in crawler.run(usernames):
+            store(result.username, result.job, result.result)
+
+    Progress and latency are available from :attr:`stats` while the crawl
+    runs.
+    """
+
+    def __init__(self, client, jobs, workers=8, rate=None, burst=None):
+        super(UserCrawler, self).__init__(client, workers=workers, rate=rate,
+                                          burst=burst)
+        if not isinstance(jobs, dict):
+            jobs = dict((name, user_job(name)) for name in jobs)
+
+        self._jobs = jobs
+
+        # Play counts of users when they were last prioritized
+        self.playcounts = {}
+        self.stats = CrawlStats()
+
+    def _playcount(self, username):
+        try:
+            return username, self._call(self._client.user.get_info,
+                                        username).playcount
+        except Exception as exc:
+            LOGGER.warning('Unable to get info for user %s: %s',
+                           username, exc)
+            return username, None
+
+    def prioritize(self, users, previous=None):
+        """
+        Return a list of (username, delta) tuples ordered by user activity,
+        where delta is the increase in the user's playcount since `previous`
+        (a dict of username to playcount; by default, the playcounts from
+        the last call).  Users that aren't in `previous` are ranked by their
+        playcount, and users whose info can't be fetched are ranked last,
+        with a delta of `None`.  Updates :attr:`playcounts`.
+        """
+        if previous is None:
+            previous = self.playcounts
+
+        ranked = []
+        playcounts = {}
+        for username, playcount in self._map(self._playcount, users):
+            if playcount is None:
+                ranked.append((username, None))
+            else:
+                playcounts[username] = playcount
+                ranked.append((username,
+                               playcount - previous.get(username, 0)))
+
+        self.playcounts.update(playcounts)
+        ranked.sort(key=lambda item: (item[1] is None, -(item[1] or 0)))
+        return ranked
+
+    def _run(self, task):
+        username, name = task
+        self._acquire()
+
+        start = time.time()
+        try:
+            result = self._jobs[name](self._client, username)
+            if isinstance(result, PaginatedIterator):
+                result = [item for page in self._pages(result)
+                          for item in page]
+            error = None
+        except Exception as exc:
+            LOGGER.warning('Job %s failed for user %s: %s', name, username,
+                           exc)
+            result = None
+            error = exc
+
+        seconds = time.time() - start
+        self.stats.record(name, seconds, failed=error is not None)
+        return CrawlResult(username, name, result, error, seconds)
+
+    def run(self, users, prioritize=True, skip_idle=False):
+        """
+        Run every job for every user, yielding a :class:`CrawlResult` for
+        each call as it completes.  Failed calls have an `error` instead of
+        a `result`.
+
+        If `prioritize` is true, the jobs of the most active users are run
+        first (see :meth:`prioritize`), and if `skip_idle` is also true,
+        users whose playcount hasn't changed are skipped.
+        """
+        if prioritize:
+            ranked = self.prioritize(users)
+            if skip_idle:
+                ranked = [item for item in ranked if item[1] != 0]
+            users = [username for username, _ in ranked]
+
+        tasks = [(username, name)
+                 for username in users for name in sorted(self._jobs)]
+        self.stats.schedule(len(tasks))
+
+        for result in self._map(self._run, tasks):
+            yield result
+
+
+class VisitedSet(object):
+    """
+    Set of usernames that stores a 64-bit digest of each (case-insensitive)
+    name instead of the name itself.  Digests of different names are
+    practically never equal: for a million names, the chance of any two
+    being equal is about one in 36 million.
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    @staticmethod
+    def _digest(username):
+        return int(hashlib.md5(
+            username.lower().encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, username):
+        """Add a username, returning `False` if it was already present"""
+        digest = self._digest(username)
+        if digest in self._digests:
+            return False
+
+        self._digests.add(digest)
+        return True
+
+    def __contains__(self, username):
+        return self._digest(username) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+
+class FriendCrawler(_Crawler):
+    """
+    Crawls the graph of Last.fm friends breadth-first, from a pool of
+    `workers` threads, at most `rate` requests per second if given.
+
+    Friends of the seed users are fetched, then friends of their friends,
+    up to `max_depth` hops from the seeds.  No more than `max_nodes` users
+    are added to the graph, if given.  Each friendship is yielded once, as
+    an :class:`Edge`, as soon as it is found, so that graphs can be written
+    out as they are crawled; see :func:`write_csv` and
+    :func:`write_parquet`.
+    """
+
+    def __init__(self, client, max_depth=2, max_nodes=None, workers=8,
+                 rate=None, burst=None):
+        super(FriendCrawler, self).__init__(client, workers=workers,
+                                            rate=rate, burst=burst)
+        self._max_depth = max_depth
+        self._max_nodes = max_nodes
+
+        self.visited = VisitedSet()
+        self.expanded = 0
+        self.failed = 0
+
+    def _friends(self, username):
+        try:
+            friends = self._call(self._client.user.get_friends, username)
+            return username, [item['name']
+                              for page in self._pages(friends, raw=True)
+                              for item in page]
+        except Exception as exc:
+            LOGGER.warning('Unable to get friends of user %s: %s',
+                           username, exc)
+            return username, None
+
+    def _full(self):
+        return (self._max_nodes is not None and
+                len(self.visited) >= self._max_nodes)
+
+    def crawl(self, seeds):
+        """Yield an :class:`Edge` for each friendship found"""
+        expanded = VisitedSet()
+
+        frontier = []
+        for username in seeds:
+            if self._full():
+                break
+            if self.visited.add(username):
+                frontier.append(username)
+
+        depth = 0
+        while frontier and depth < self._max_depth:
+            depth += 1
+            next_frontier = []
+
+            for username, friends in self._map(self._friends, frontier):
+                expanded.add(username)
+                self.expanded += 1
+                if friends is None:
+                    self.failed += 1
+                    continue
+
+                for friend in friends:
+                    # The reverse edge was yielded when the friend expanded
+                    if friend in expanded:
+                        continue
+
+                    if friend not in self.visited:
+                        if self._full():
+                            continue
+                        self.visited.add(friend)
+                        next_frontier.append(friend)
+
+                    yield Edge(username, friend, depth)
+
+            frontier = next_frontier
+
+
+class SimilarityGraph(object):
+    """
+    Weighted directed graph of similar artists or tracks.
+
+    Nodes are numbered in the order they are added, and labelled with an
+    artist name or an (artist, track) tuple.  Each edge is a tuple of
+    (source, target, match) where source and target are node numbers.
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.mbids = []
+        self.edges = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def find(self, keys):
+        """Return the number of the node with any of `keys`, or `None`"""
+        for key in keys:
+            node = self._index.get(key)
+            if node is not None:
+                return node
+
+        return None
+
+    def add_node(self, keys, label, mbid=None):
+        """Add a node, known by each of `keys`, returning its number"""
+        node = len(self.labels)
+        self.labels.append(label)
+        self.mbids.append(mbid or None)
+        self.add_keys(node, keys)
+        return node
+
+    def add_keys(self, node, keys):
+        """Make a node known by each of `keys`"""
+        for key in keys:
+            self._index.setdefault(key, node)
+
+    def add_edge(self, source, target, match):
+        self.edges.append((source, target, match))
+
+    def edge_list(self):
+        """Yield a (source label, target label, match) tuple for each edge"""
+        for source, target, match in self.edges:
+            yield self.labels[source], self.labels[target], match
+
+    def adjacency(self):
+        """Return a dict of node number to a dict of neighbor to match"""
+        adjacency = dict((node, {}) for node in range(len(self.labels)))
+        for source, target, match in self.edges:
+            adjacency[source][target] = match
+
+        return adjacency
+
+    def to_sparse(self):
+        """
+        Return the graph as a `scipy.sparse.csr_matrix` of match scores,
+        indexed by node number.  Requires `scipy`.
+        """
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise ImportError('scipy is required for sparse matrices')
+
+        size = len(self.labels)
+        if not self.edges:
+            return csr_matrix((size, size))
+
+        sources, targets, matches = zip(*self.edges)
+        return csr_matrix((matches, (sources, targets)), shape=(size, size))
+
+
+class SimilarityCrawler(_Crawler):
+    """
+    Builds a :class:`SimilarityGraph` of similar artists (`kind='artist'`)
+    or tracks (`kind='track'`) from seeds, from a pool of `workers` threads,
+    at most `rate` calls per second if given.
+
+    Nodes are expanded best first: a node's score is the product of the
+    match scores on the path to it from a seed, so the strongest
+    associations are explored first.  Nodes are expanded up to `max_depth`
+    hops from the seeds, only through similarities of at least
+    `min_match`, and no more than `max_nodes` nodes are added, if given.
+    Nodes are identified by MusicBrainz ID or normalized name, and similar
+    items are memoized, so nothing is fetched twice, even across builds.
+    """
+
+    def __init__(self, client, kind='artist', max_depth=3, max_nodes=None,
+                 min_match=0.0, workers=8, rate=None, burst=None):
+        if kind not in ('artist', 'track'):
+            raise ValueError('kind must be "artist" or "track"')
+
+        super(SimilarityCrawler, self).__init__(client, workers=workers,
+                                                rate=rate, burst=burst)
+        self._kind = kind
+        self._max_depth = max_depth
+        self._max_nodes = max_nodes
+        self._min_match = min_match
+
+        # Every key of a node to a list of (label, mbid, match) of similar
+        # items, so that a node is found whichever of its keys it's reached by
+        self._similar = {}
+        self.failed = 0
+
+    def _keys(self, label, mbid=None):
+        if self._kind == 'artist':
+            name = normalize_name(label)
+        else:
+            name = tuple(normalize_name(part) for part in label)
+
+        return [mbid, name] if mbid else [name]
+
+    def _node_keys(self, graph, node, keys):
+        """Return the keys a node was reached by, and its own keys"""
+        keys = list(keys)
+        for key in self._keys(graph.labels[node], graph.mbids[node]):
+            if key not in keys:
+                keys.append(key)
+        return keys
+
+    def _memoized(self, keys):
+        """Return the memoized similar items of any of `keys`, or `None`"""
+        for key in keys:
+            if key in self._similar:
+                return self._similar[key]
+        return None
+
+    def _fetch(self, task):
+        keys, label, mbid = task
+
+        def fetch():
+            if self._kind == 'artist':
+                items = self._client.artist.get_similar(artist=label,
+                                                        mbid=mbid or None)
+                return [(item.name, item.mbid, item.match) for item in items]
+
+            if mbid:
+                items = self._client.track.get_similar(mbid)
+            else:
+                items = self._client.track.get_similar(*label)
+            return [((item.artist_name, item.name), item.mbid, item.match)
+                    for item in items]
+
+        try:
+            return keys, self._call(fetch)
+        except Exception as exc:
+            LOGGER.warning('Unable to get items similar to %s: %s',
+                           label, exc)
+            return keys, None
+
+    def build(self, seeds, graph=None):
+        """
+        Return a :class:`SimilarityGraph` of the items similar to `seeds`,
+        which are artist names or (artist, track) tuples.  Nodes and edges
+        are added to `graph`, if given.
+        """
+        if graph is None:
+            graph = SimilarityGraph()
+
+        heap = []
+        order = itertools.count()
+        for seed in seeds:
+            keys = self._keys(seed)
+            if graph.find(keys) is None:
+                graph.add_node(keys, seed)
+            heapq.heappush(heap, (-1.0, next(order), 0, keys))
+
+        expanded = set()
+        while heap:
+            batch = []
+            while heap and len(batch) < self._workers:
+                score, _, depth, keys = heapq.heappop(heap)
+                node = graph.find(keys)
+                if node not in expanded:
+                    expanded.add(node)
+                    batch.append((-score, depth,
+                                  self._node_keys(graph, node, keys), node))
+
+            tasks = [(keys, graph.labels[node], graph.mbids[node])
+                     for _, _, keys, node in batch
+                     if self._memoized(keys) is None]
+            for keys, similar in self._map(self._fetch, tasks):
+                if similar is None:
+                    self.failed += 1
+                else:
+                    for key in keys:
+                        self._similar[key] = similar
+
+            for score, depth, node_keys, source in batch:
+                for label, mbid, match in self._memoized(node_keys) or ():
+                    if match is not None and match < self._min_match:
+                        continue
+
+                    keys = self._keys(label, mbid)
+                    target = graph.find(keys)
+                    if target is None:
+                        if (self._max_nodes is not None and
+                                len(graph) >= self._max_nodes):
+                            continue
+                        target = graph.add_node(keys, label, mbid)
+                    else:
+                        graph.add_keys(target, keys)
+
+                    if target == source:
+                        continue
+
+                    graph.add_edge(source, target, match)
+                    if target not in expanded and depth + 1 < self._max_depth:
+                        heapq.heappush(heap, (-score * (match or 0),
+                                              next(order), depth + 1, keys))
+
+        return graph
+
+
+def write_csv(edges, fileobj):
+    """
+    Write edges to a CSV file with a header row, returning the number of
+    edges written
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(Edge._fields)
+
+    count = 0
+    for edge in edges:
+        writer.writerow(edge)
+        count += 1
+
+    return count
+
+
+def write_parquet(edges, path, batch_size=65536):
+    """
+    Write edges to a Parquet file in batches of `batch_size`, returning the
+    number of edges written.  Requires `pyarrow`.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required to write Parquet files')
+
+    schema = pyarrow.schema([('source', pyarrow.string()),
+                             ('target', pyarrow.string()),
+                             ('depth', pyarrow.int32())])
+
+    def write(writer, batch):
+        columns = list(zip(*batch))
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type)
+             for column, field in zip(columns, schema)],
+            schema=schema))
+
+    count = 0
+    writer = pyarrow.parquet.ParquetWriter(path, schema)
+    try:
+        batch = []
+        for edge in edges:
+            batch.append(edge)
+            if len(batch) >= batch_size:
+                write(writer, batch)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            write(writer, batch)
+            count += len(batch)
+    finally:
+        writer.close()
+
+    return count
@@ -0,0 +1,190 @@
+"""
+Interning of the artists, albums and tracks in API responses
+"""
+
+import threading
+
+import six
+
+from pylastfm.util import normalize_name
+
+
+ARTIST = 'artist'
+ALBUM = 'album'
+TRACK = 'track'
+
+# String fields of response models that are interned
+INTERNED_FIELDS = ('name', 'mbid', 'url', 'artist_name', 'artist_mbid',
+                   'artist_url')
+
+
+def _base_kinds():
+    from pylastfm.response import common
+    return ((common._ArtistBase, ARTIST),
+            (common._AlbumBase, ALBUM),
+            (common._TrackBase, TRACK))
+
+
+def _inherits(model_class, base):
+    """Return True if `model_class` inherits the fields of `base`"""
+    parents = getattr(model_class, '__inherits__', ())
+    return any(parent is base or _inherits(parent, base)
+               for parent in parents)
+
+
+class Entity(object):
+    """
+    An artist, album or track, shared by every response model that refers to
+    it.  `artist` is the artist name of an album or track.
+    """
+
+    __slots__ = ('kind', 'name', 'mbid', 'artist', 'url')
+
+    def __init__(self, kind, name, mbid=None, artist=None, url=None):
+        self.kind = kind
+        self.name = name
+        self.mbid = mbid
+        self.artist = artist
+        self.url = url
+
+    def __repr__(self):
+        return '<Entity({0} {1!r})>'.format(self.kind, self.name)
+
+
+class EntityIndex(object):
+    """
+    Thread-safe index of the artists, albums and tracks seen in API
+    responses.
+
+    When a client has an index (see the `entities` option of
+    :class:`pylastfm.client.LastFM`), every response model of an artist,
+    album or track is linked to a canonical :class:`Entity` (its `entity`
+    attribute), so that the same artist from `user.getTopArtists`,
+    `chart.getTopArtists` and `library.getArtists` is one entity.  Entities
+    are identified by MusicBrainz ID, or by normalized name (and artist name,
+    for albums and tracks) if they don't have one.  The strings of models are
+    interned, so that equal names, IDs and URLs are stored once.
+    """
+
+    def __init__(self):
+        self._entities = {}
+        self._strings = {}
+        self._kinds = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(set(id(entity)
+                           for entity in six.itervalues(self._entities)))
+
+    def entities(self, kind=None):
+        """Return a list of every entity seen so far, optionally of a kind"""
+        with self._lock:
+            entities = dict((id(entity), entity)
+                            for entity in six.itervalues(self._entities))
+
+        return [entity for entity in entities.values()
+                if kind is None or entity.kind == kind]
+
+    def _string(self, value):
+        if value is None:
+            return None
+
+        return self._strings.setdefault(value, value)
+
+    @staticmethod
+    def _name_key(kind, name, artist):
+        if kind == ARTIST:
+            return kind, normalize_name(name)
+
+        return kind, normalize_name(name), normalize_name(artist or '')
+
+    def get(self, kind, mbid=None, name=None, artist=None):
+        """
+        Return the entity of a kind with a MusicBrainz ID, or with a name
+        (and artist, for albums and tracks), or `None` if it hasn't been seen
+        """
+        with self._lock:
+            if mbid:
+                entity = self._entities.get((kind, mbid))
+                if entity is not None:
+                    return entity
+
+            if name is not None:
+                return self._entities.get(self._name_key(kind, name, artist))
+
+        return None
+
+    def intern(self, kind, name, mbid=None, artist=None, url=None):
+        """Return the canonical entity, adding it if it hasn't been seen"""
+        mbid = mbid or None
+        name_key = self._name_key(kind, name, artist)
+
+        with self._lock:
+            entity = self._entities.get((kind, mbid)) if mbid else None
+            if entity is None:
+                entity = self._entities.get(name_key)
+                if (entity is not None and mbid and entity.mbid and
+                        entity.mbid != mbid):
+                    # A different entity with the same name
+                    entity = None
+
+            if entity is None:
+                entity = Entity(kind, self._string(name),
+                                mbid=self._string(mbid),
+                                artist=self._string(artist),
+                                url=self._string(url))
+                self._entities.setdefault(name_key, entity)
+            else:
+                if mbid and not entity.mbid:
+                    entity.mbid = self._string(mbid)
+                if url and not entity.url:
+                    entity.url = self._string(url)
+
+            if mbid:
+                self._entities[(kind, mbid)] = entity
+
+            return entity
+
+    def _kind(self, model_class):
+        try:
+            return self._kinds[model_class]
+        except KeyError:
+            pass
+
+        kind = None
+        for base, base_kind in _base_kinds():
+            if _inherits(model_class, base):
+                kind = base_kind
+                break
+
+        self._kinds[model_class] = kind
+        return kind
+
+    def intern_model(self, model):
+        """
+        Link a response model to its entity and intern its strings.  Models
+        other than artists, albums and tracks are left alone.
+        """
+        kind = self._kind(type(model))
+        if kind is None or model.get('name') is None:
+            return model
+
+        properties = model._properties
+        with self._lock:
+            for field in INTERNED_FIELDS:
+                value = properties.get(field)
+                if isinstance(value, six.string_types):
+                    properties[field] = self._string(value)
+
+        artist = properties.get('artist_name')
+        if not isinstance(artist, six.string_types):
+            artist = properties.get('artist')
+            if not isinstance(artist, six.string_types):
+                artist = None
+
+        model._entity = self.intern(kind, properties.get('name'),
+                                    mbid=properties.get('mbid'),
+                                    artist=artist,
+                                    url=properties.get('url'))
+        return model
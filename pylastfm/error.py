@@ -14,6 +14,25 @@ class APIError(LastfmError):
         msg = 'Error {0}: {1}'.format(code, message)
         super(APIError, self).__init__(msg)
 
+        self.code = code
+        self.message = message
+
+
+class RequestTimeout(LastfmError):
+    """An API request timed out"""
+    pass
+
+
+class PaginationDrift(LastfmError):
+    """The number of items of a resumed paginated call has changed"""
+
+    def __init__(self, expected, actual):
+        msg = 'Expected {0} items, found {1}'.format(expected, actual)
+        super(PaginationDrift, self).__init__(msg)
+
+        self.expected = expected
+        self.actual = actual
+
 
 class FileError(LastfmError, IOError):
     """Error reading/writing a file"""
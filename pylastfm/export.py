@@ -0,0 +1,277 @@
+"""
+Export of a user's whole account to newline-delimited JSON or Parquet files
+"""
+
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import six
+
+from pylastfm.util import PaginatedIterator, class_path, import_class
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+MANIFEST = 'manifest.json'
+
+PERIODS = ('overall', '7day', '1month', '3month', '6month', '12month')
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    return six.text_type(value)
+
+
+def encode_items(model_path, items):
+    """
+    Create models of the class at `model_path`, if given, from raw API items,
+    and encode them as newline-delimited JSON.  Runs in worker processes.
+    """
+    model_class = import_class(model_path) if model_path else None
+
+    lines = []
+    for item in items:
+        if model_class is not None:
+            item = model_class(item).to_dict()
+        lines.append(json.dumps(item, default=_json_default, sort_keys=True))
+        lines.append('\n')
+
+    return ''.join(lines)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.json
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required to export Parquet files')
+
+    return pyarrow
+
+
+def _task(name, resource, method, **kwargs):
+    return name, dict(resource=resource, method=method, kwargs=kwargs,
+                      file=name + '.ndjson', status=PENDING, items=0, bytes=0)
+
+
+class Exporter(object):
+    """
+    Exports a user's recent tracks, loved tracks, library artists, top
+    artists, albums and tracks for each period, and weekly charts into a
+    directory, with one file per API call and a `manifest.json` describing
+    them.
+
+    API calls are made by `workers` threads, and items are modelled and
+    encoded by `processes` worker processes (one per CPU by default, or in
+    the calling threads if 0).  Progress is recorded in the manifest after
+    every page, so an interrupted export continues where it stopped when it
+    is run again.  If `format` is 'parquet', each file is converted to
+    Parquet once it is complete, which requires `pyarrow`.
+
+        Exporter(client, 'rj', 'export/rj').run()
+    """
+
+    def __init__(self, client, username, directory, workers=4,
+                 processes=None, periods=PERIODS, weekly=True,
+                 format='ndjson'):
+        if format not in ('ndjson', 'parquet'):
+            raise ValueError('Invalid format: {0}'.format(format))
+        if format == 'parquet':
+            _pyarrow()
+
+        self._client = client
+        self._username = username
+        self._directory = directory
+        self._workers = workers
+        self._processes = processes
+        self._periods = periods
+        self._weekly = weekly
+        self._format = format
+
+        self._manifest = None
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self._directory, MANIFEST)
+
+    def plan(self):
+        """
+        Return a dict of task name to the API call that exports it.  Planning
+        weekly charts requests the list of the user's charts.
+        """
+        username = self._username
+        tasks = [
+            _task('recent_tracks', 'user', 'get_recent_tracks',
+                  username=username),
+            _task('loved_tracks', 'user', 'get_loved_tracks',
+                  username=username),
+            _task('library_artists', 'library', 'get_artists',
+                  username=username),
+        ]
+
+        for period in self._periods:
+            for kind in ('artists', 'albums', 'tracks'):
+                tasks.append(_task(
+                    'top_{0}_{1}'.format(kind, period), 'user',
+                    'get_top_' + kind, username=username, period=period))
+
+        if self._weekly:
+            charts = self._client._request(
+                'GET',
+                'user.getWeeklyChartList',
+                params=dict(user=username),
+                unwrap='weeklychartlist',
+            ).get('chart', [])
+            if isinstance(charts, dict):
+                charts = [charts]
+
+            for chart in charts:
+                for kind in ('artist', 'album', 'track'):
+                    tasks.append(_task(
+                        'weekly_{0}_chart_{1}_{2}'.format(
+                            kind, chart['from'], chart['to']),
+                        'user', 'get_weekly_{0}_chart'.format(kind),
+                        username=username, start=chart['from'],
+                        end=chart['to']))
+
+        return dict(tasks)
+
+    def _save_manifest(self):
+        with self._lock:
+            fd, tmp = tempfile.mkstemp(dir=self._directory)
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(self._manifest, handle, indent=2, sort_keys=True)
+            os.rename(tmp, self.manifest_path)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as handle:
+                manifest = json.load(handle)
+        except IOError:
+            return None
+
+        if manifest.get('username') != self._username:
+            raise ValueError('{0} is an export of a different user'.format(
+                self._directory))
+
+        return manifest
+
+    def _encode(self, model, items):
+        model_path = class_path(model) if model is not None else None
+        if self._pool is None:
+            return encode_items(model_path, items)
+
+        return self._pool.apply(encode_items, (model_path, items))
+
+    def _update(self, task, **values):
+        with self._lock:
+            task.update(values)
+        self._save_manifest()
+
+    def _export(self, name):
+        task = self._manifest['tasks'][name]
+        path = os.path.join(self._directory, task['file'])
+        resuming = (bool(task.get('checkpoint')) and os.path.exists(path) and
+                    os.path.getsize(path) >= task['bytes'])
+
+        try:
+            if resuming:
+                result = self._client.resume(task['checkpoint'])
+            else:
+                resource = getattr(self._client, task['resource'])
+                result = getattr(resource, task['method'])(**task['kwargs'])
+                self._update(task, items=0, bytes=0)
+
+            with open(path, 'r+b' if resuming else 'wb') as handle:
+                # Discard anything written after the last checkpoint
+                handle.truncate(task['bytes'])
+                handle.seek(task['bytes'])
+
+                if isinstance(result, PaginatedIterator):
+                    for page in result.iter_pages(raw=True):
+                        handle.write(self._encode(
+                            result.model, page).encode('utf-8'))
+                        handle.flush()
+                        self._update(task, items=task['items'] + len(page),
+                                     bytes=handle.tell(),
+                                     checkpoint=result.checkpoint())
+                else:
+                    items = [item.to_dict() if hasattr(item, 'to_dict')
+                             else item for item in result]
+                    handle.write(self._encode(None, items).encode('utf-8'))
+                    self._update(task, items=len(items), bytes=handle.tell())
+
+            if self._format == 'parquet':
+                task['parquet'] = self._to_parquet(path)
+
+            task.pop('error', None)
+            self._update(task, status=DONE, checkpoint=None)
+        except Exception as exc:
+            LOGGER.warning('Failed to export %s: %s', name, exc)
+            self._update(task, status=FAILED, error=six.text_type(exc))
+
+    @staticmethod
+    def _to_parquet(path):
+        pyarrow = _pyarrow()
+
+        target = os.path.splitext(path)[0] + '.parquet'
+        if os.path.getsize(path):
+            pyarrow.parquet.write_table(pyarrow.json.read_json(path), target)
+        return os.path.basename(target)
+
+    def run(self):
+        """
+        Export every task that isn't done yet, and return the manifest.
+        Failed tasks are retried when the export is run again.
+        """
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        self._manifest = self._load_manifest()
+        if self._manifest is None:
+            self._manifest = dict(username=self._username,
+                                  created=int(time.time()),
+                                  complete=False,
+                                  tasks=self.plan())
+            self._save_manifest()
+
+        pending = sorted(name for name, task
+                         in six.iteritems(self._manifest['tasks'])
+                         if task['status'] != DONE)
+
+        from multiprocessing.pool import ThreadPool
+        if self._processes != 0:
+            from multiprocessing import Pool
+            self._pool = Pool(self._processes)
+
+        threads = ThreadPool(self._workers)
+        try:
+            threads.map(self._export, pending)
+        finally:
+            threads.terminate()
+            threads.join()
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+        self._manifest['complete'] = all(
+            task['status'] == DONE
+            for task in six.itervalues(self._manifest['tasks']))
+        self._save_manifest()
+        return self._manifest
@@ -0,0 +1,102 @@
+"""
+Compact representation of the image URLs in API responses
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+import six
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
+
+
+# Last.fm image URLs differ only in a size-dependent path component, e.g.
+# https://lastfm.freetls.fastly.net/i/u/174s/<hash>.png
+IMAGE_URL = re.compile(r'^(.+/i/u/)([^/]+)/([0-9a-f]+)(\.\w+)$')
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _share(value):
+    """Return a shared copy of an immutable value that is often repeated"""
+    with _shared_lock:
+        return _shared.setdefault(value, value)
+
+
+def intern_string(value):
+    """Intern a string, if the Python version supports interning it"""
+    try:
+        return six.moves.intern(value)
+    except TypeError:  # pragma: no cover
+        # Python 2 can only intern byte strings
+        return value
+
+
+class ImageMap(Mapping):
+    """
+    Read-only mapping of image size to URL.
+
+    When the URLs follow Last.fm's pattern, only the image hash is stored
+    per map, along with a layout of (size, path) pairs and a URL prefix that
+    are shared by every map, and URLs are built when they are accessed.
+    Other URLs are interned.
+    """
+
+    __slots__ = ('_layout', '_prefix', '_hash', '_ext', '_urls')
+
+    def __init__(self, images=()):
+        images = OrderedDict(images)
+        sizes = tuple(images)
+        urls = tuple(six.itervalues(images))
+
+        self._prefix = self._hash = self._ext = self._urls = None
+
+        matches = [IMAGE_URL.match(url or '') for url in urls]
+        compact = urls and all(matches) and len(set(
+            (match.group(1), match.group(3), match.group(4))
+            for match in matches)) == 1
+
+        if compact:
+            prefix, _, image_hash, ext = matches[0].groups()
+            self._layout = _share(tuple(
+                (size, match.group(2)) for size, match in zip(sizes, matches)))
+            self._prefix = _share(prefix)
+            self._ext = _share(ext)
+            self._hash = image_hash
+        else:
+            self._layout = _share(tuple((size, None) for size in sizes))
+            self._urls = tuple(intern_string(url) if url else url
+                               for url in urls)
+
+    def _url(self, index):
+        if self._urls is not None:
+            return self._urls[index]
+
+        return '{0}{1}/{2}{3}'.format(self._prefix, self._layout[index][1],
+                                      self._hash, self._ext)
+
+    def __getitem__(self, size):
+        for index, (key, _) in enumerate(self._layout):
+            if key == size:
+                return self._url(index)
+
+        raise KeyError(size)
+
+    def __iter__(self):
+        return (size for size, _ in self._layout)
+
+    def __len__(self):
+        return len(self._layout)
+
+    def __repr__(self):
+        return 'ImageMap({0!r})'.format(dict(self))
+
+
+def images(value):
+    """Converts list of image dicts to an :class:`ImageMap` of size to URL"""
+    return ImageMap((item['size'], item['#text']) for item in value)
@@ -0,0 +1,118 @@
+"""
+Pools of API keys, which let a single client spread unauthenticated requests
+over several keys
+"""
+
+import time
+import logging
+import threading
+
+from pylastfm import constants, error
+from pylastfm.util import RateLimiter
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+STRATEGIES = frozenset(['lru', 'budget'])
+
+# Seconds to stop using a key after the API returns the given error code
+QUARANTINE_SECONDS = {
+    constants.SUSPENDED_API_KEY: 3600,
+    constants.RATE_LIMIT_EXCEEDED: 60,
+}
+
+
+class _PooledKey(object):
+
+    def __init__(self, api_info, rate):
+        self.api_info = api_info
+        self.limiter = RateLimiter(rate) if rate else None
+        self.last_used = 0.0
+        self.quarantined_until = 0.0
+
+    def budget(self):
+        return self.limiter.tokens if self.limiter else float('inf')
+
+
+class ApiKeyPool(object):
+    """
+    Distributes requests over several API keys.
+
+    With the 'lru' strategy, each request uses the least recently used key.
+    With the 'budget' strategy, each request uses the key with the most
+    remaining rate budget, waiting if every key's budget is exhausted; `rate`
+    is the number of requests per second allowed for each key.
+
+    Keys that the API reports as suspended or rate limited are quarantined,
+    i.e. not used again until `QUARANTINE_SECONDS` have passed.
+    """
+
+    def __init__(self, api_infos, strategy='lru', rate=None):
+        if strategy not in STRATEGIES:
+            raise ValueError('Invalid key strategy: {0}'.format(strategy))
+        if strategy == 'budget' and not rate:
+            raise ValueError("The 'budget' key strategy requires a rate")
+        if not api_infos:
+            raise ValueError('At least one API key is required')
+
+        self._strategy = strategy
+        self._keys = [_PooledKey(api_info, rate) for api_info in api_infos]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def strategy(self):
+        return self._strategy
+
+    def _available(self, now):
+        keys = [key for key in self._keys if key.quarantined_until <= now]
+        if not keys:
+            raise error.APIError(constants.RATE_LIMIT_EXCEEDED,
+                                 'All API keys are quarantined')
+        return keys
+
+    def _select(self, now):
+        keys = self._available(now)
+        if self._strategy == 'lru':
+            return min(keys, key=lambda key: key.last_used)
+
+        key = max(keys, key=lambda key: key.budget())
+        return key if key.limiter.try_acquire() else None
+
+    def acquire(self):
+        """Return the :class:`pylastfm.client.ApiInfo` to use next"""
+        while True:
+            with self._lock:
+                now = time.time()
+                key = self._select(now)
+                if key is not None:
+                    key.last_used = now
+                    return key.api_info
+
+                wait = min(key.limiter.wait_time()
+                           for key in self._available(now))
+
+            time.sleep(wait)
+
+    def quarantine(self, api_info, code):
+        """Stop using a key after the API returns the given error code"""
+        seconds = QUARANTINE_SECONDS.get(code)
+        if seconds is None:
+            return
+
+        with self._lock:
+            for key in self._keys:
+                if key.api_info.key == api_info.key:
+                    LOGGER.warning('Quarantining API key %s for %ds after '
+                                   'error %s', api_info.key, seconds, code)
+                    key.quarantined_until = time.time() + seconds
+
+    def status(self):
+        """Return a list of (API key, seconds of quarantine left)"""
+        now = time.time()
+        with self._lock:
+            return [(key.api_info.key, max(0.0, key.quarantined_until - now))
+                    for key in self._keys]
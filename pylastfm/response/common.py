@@ -1,12 +1,13 @@
 import six
 from datetime import datetime
 from figgis import Config, Field
-from dateutil.parser import parse as parse_date
 
+from pylastfm.images import ImageMap, images
 from pylastfm.util import ceildiv
 
 
 def dateparse(value):
+    from dateutil.parser import parse as parse_date
     try:
         return parse_date(str(value))
     except Exception:
@@ -41,7 +42,7 @@ def extract(first, *rest, **kwargs):
     if kwargs:
         key = list(kwargs.keys())[0]
         raise TypeError(
-            "extract() got an unexpected keyword argument '{}'".format(key))
+            "extract() got an unexpected keyword argument '{0}'".format(key))
 
     def extractor(value, keys=(first,) + rest, coerce=kw_coerce,
                   required=required):
@@ -60,11 +61,6 @@ def extract(first, *rest, **kwargs):
     return extractor
 
 
-def images(value):
-    """Converts list of image dicts to a single dict of (size, url) pairs"""
-    return dict((item['size'], item['#text']) for item in value)
-
-
 class PaginatedAttributes(Config):
 
     page = Field(integer, required=True)
@@ -109,16 +105,46 @@ class SearchPaginateMixin(Config):
         return ceildiv(self.total, self.items_per_page)
 
 
+def _plain(value):
+    """Replace the :class:`ImageMap` values in nested dicts and lists"""
+    if isinstance(value, ImageMap):
+        return dict(value)
+    elif isinstance(value, dict):
+        return dict((key, _plain(item)) for key, item in value.items())
+    elif isinstance(value, list):
+        return [_plain(item) for item in value]
+
+    return value
+
+
 ######################################################################
 # Common response objects
 ######################################################################
 
 class ApiConfig(Config):
 
+    # Set by pylastfm.entities.EntityIndex
+    _entity = None
+
     def __init__(self, properties, client=None):
         super(ApiConfig, self).__init__(properties)
         self._client = client
 
+    @property
+    def entity(self):
+        """
+        The :class:`pylastfm.entities.Entity` of this artist, album or track,
+        if the client has an entity index
+        """
+        return self._entity
+
+    def to_dict(self):
+        """
+        Convert the model to a plain python dictionary, with image maps
+        converted to dicts so that the result can be encoded as JSON
+        """
+        return _plain(super(ApiConfig, self).to_dict())
+
     def __repr__(self):
         properties = set(
             key for key, value in six.iteritems(self.__class__.__dict__)
@@ -171,6 +197,13 @@ class Track(ApiConfig):
     artist_url = Field(extract('url', coerce=string_or_null), key='artist')
 
 
+class SimilarTrack(ApiConfig):
+
+    __inherits__ = [Track]
+
+    match = Field(float)
+
+
 class _TagBase(Config):
 
     name = Field(six.text_type, required=True)
@@ -220,6 +253,8 @@ class SimilarArtist(ApiConfig):
 
     __inherits__ = [_ArtistBase]
 
+    match = Field(float)
+
 
 class Artist(ApiConfig):
 
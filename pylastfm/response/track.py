@@ -3,14 +3,14 @@ from figgis import Config, Field
 from pylastfm.response.common import (ApiConfig, extract, _TrackBase,
                                       string_or_null, bool_from_int, Wiki,
                                       images, Tag)
-from pylastfm.util import query_date
+from pylastfm.util import parse_timestamp
 
 
 class Scrobble(Config):
 
     artist = Field(six.text_type, required=True)
     track = Field(six.text_type, required=True)
-    timestamp = Field(query_date, required=True)
+    timestamp = Field(parse_timestamp, required=True)
     mbid = Field(six.text_type)
     album = Field(six.text_type)
     context = Field(six.text_type)
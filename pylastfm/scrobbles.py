@@ -0,0 +1,373 @@
+"""
+Streaming import of listening history files as scrobbles
+"""
+
+import csv
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+import six
+
+from pylastfm.util import RateLimiter, normalize_name, parse_timestamp
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+# Maximum number of scrobbles accepted by one `track.scrobble` request
+MAX_BATCH = 50
+
+REQUIRED_FIELDS = ('artist', 'track', 'timestamp')
+TEXT_FIELDS = ('artist', 'track', 'album', 'album_artist', 'mbid',
+               'context', 'stream_id')
+INTEGER_FIELDS = ('track_number', 'duration', 'chosen_by_user')
+
+REJECTED = 'rejected'
+DUPLICATE = 'duplicate'
+
+
+Rejected = namedtuple('Rejected', ['row', 'reason'])
+
+
+def read_rows(fileobj, format='ndjson'):
+    """
+    Yield dicts from a file of JSON objects, one per line, or from a CSV
+    file with a header.  Empty CSV values are omitted.  The file is read
+    incrementally.
+    """
+    if format == 'csv':
+        for row in csv.DictReader(fileobj):
+            yield dict((key, value) for key, value in six.iteritems(row)
+                       if value)
+    elif format == 'ndjson':
+        for line in fileobj:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError('Invalid format: {0}'.format(format))
+
+
+def normalize_row(row, fields=None, timestamps=None):
+    """
+    Validate and normalize a row into a scrobble dict, with text fields
+    stripped, integer fields converted, and the timestamp converted to a UNIX
+    timestamp (see :func:`pylastfm.util.parse_timestamp`).  `fields` maps
+    row keys to scrobble keys, e.g. `{'artistName': 'artist'}`, and
+    `timestamps` is an optional dict of parsed timestamps to reuse.  Raises
+    `ValueError` if the row is invalid.
+    """
+    if fields:
+        row = dict((fields.get(key, key), value)
+                   for key, value in six.iteritems(row))
+
+    scrobble = {}
+    for key in TEXT_FIELDS:
+        value = row.get(key)
+        if value is not None:
+            value = six.text_type(value).strip()
+            if value:
+                scrobble[key] = value
+
+    try:
+        for key in INTEGER_FIELDS:
+            value = row.get(key)
+            if value not in (None, ''):
+                scrobble[key] = int(value)
+
+        value = row.get('timestamp')
+        if value not in (None, ''):
+            if timestamps is None or not isinstance(value, (
+                    six.string_types, six.integer_types)):
+                scrobble['timestamp'] = parse_timestamp(value)
+            elif value in timestamps:
+                scrobble['timestamp'] = timestamps[value]
+            else:
+                scrobble['timestamp'] = timestamps[value] = \
+                    parse_timestamp(value)
+    except TypeError as exc:
+        raise ValueError(six.text_type(exc))
+
+    missing = [key for key in REQUIRED_FIELDS if key not in scrobble]
+    if missing:
+        raise ValueError('Missing {0}'.format(', '.join(missing)))
+
+    return scrobble
+
+
+def normalize_rows(rows, fields=None):
+    """
+    Normalize a batch of rows with :func:`normalize_row`, returning a list
+    of scrobbles and a list of :class:`Rejected` rows
+    """
+    # Histories tend to repeat timestamp values and formats, so parse each
+    # distinct value once per batch
+    timestamps = {}
+
+    scrobbles = []
+    rejected = []
+    for row in rows:
+        try:
+            scrobbles.append(normalize_row(row, fields, timestamps))
+        except ValueError as exc:
+            rejected.append(Rejected(row, six.text_type(exc)))
+
+    return scrobbles, rejected
+
+
+def scrobble_key(timestamp, artist, track):
+    """Key identifying a scrobble, for detecting duplicates"""
+    return int(timestamp), normalize_name(artist), normalize_name(track)
+
+
+class ImportStats(object):
+    """Counts of the rows processed by a :class:`ScrobbleImporter`"""
+
+    def __init__(self, rows=0, submitted=0, accepted=0, ignored=0,
+                 duplicates=0, rejected=0):
+        self.rows = rows
+        self.submitted = submitted
+        self.accepted = accepted
+        self.ignored = ignored
+        self.duplicates = duplicates
+        self.rejected = rejected
+        self.started = time.time()
+
+    def to_dict(self):
+        return dict(rows=self.rows, submitted=self.submitted,
+                    accepted=self.accepted, ignored=self.ignored,
+                    duplicates=self.duplicates, rejected=self.rejected)
+
+    @property
+    def rate(self):
+        """Rows processed per second"""
+        return self.rows / max(time.time() - self.started, 1e-6)
+
+    def __repr__(self):
+        return '<ImportStats({0})>'.format(', '.join(
+            '{0}={1}'.format(key, value)
+            for key, value in sorted(self.to_dict().items())))
+
+
+class ScrobbleImporter(object):
+    """
+    Imports a stream of listening history rows (dicts with `artist`, `track`
+    and `timestamp`, and optionally the other keys accepted by
+    :meth:`pylastfm.api.track.Resource.scrobble`) as scrobbles for the
+    client's user.
+
+    Rows are normalized in batches (see :func:`normalize_rows`) and
+    submitted in `track.scrobble` requests of `batch_size` scrobbles, at
+    most `rate` requests per second.  If `dedupe` is true, scrobbles that are
+    already in the user's recent tracks, or earlier in the history, are
+    skipped; recent tracks are requested once for each span of time that
+    the history covers.
+
+    If `state` is given, progress is saved to a JSON file at that path after
+    every request, and an interrupted import started again with the same
+    state and history skips the rows that were already processed.
+
+        importer = ScrobbleImporter(client, state='import.json', rate=5)
+        with open('history.csv') as handle:
+            importer.run(read_rows(handle, 'csv'))
+    """
+
+    def __init__(self, client, username=None, batch_size=MAX_BATCH,
+                 rate=None, dedupe=True, state=None, fields=None,
+                 progress=None):
+        if not 0 < batch_size <= MAX_BATCH:
+            raise ValueError('Batch size must be between 1 and {0}'.format(
+                MAX_BATCH))
+
+        self._client = client
+        self._username = username or client.username
+        self._batch_size = batch_size
+        self._limiter = RateLimiter(rate) if rate else None
+        self._dedupe = dedupe
+        self._state = state
+        self._fields = fields
+        self._progress = progress
+
+        self._seen = set()
+        self._covered = []
+
+        self.stats = ImportStats()
+        self.rejected = []
+
+    def _load_state(self):
+        if self._state is None or not os.path.exists(self._state):
+            return
+
+        with open(self._state) as handle:
+            state = json.load(handle)
+
+        self.stats = ImportStats(**state)
+
+    def _save_state(self):
+        if self._state is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self._state))
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as handle:
+            json.dump(self.stats.to_dict(), handle, sort_keys=True)
+        os.rename(tmp, self._state)
+
+    def _uncovered(self, start, end):
+        """
+        Return the spans of [start, end] whose recent tracks haven't been
+        requested, and mark them as requested
+        """
+        gaps = []
+        position = start
+        for low, high in self._covered:
+            if high < position:
+                continue
+            if low > end:
+                break
+            if low > position:
+                gaps.append((position, low - 1))
+            position = max(position, high + 1)
+
+        if position <= end:
+            gaps.append((position, end))
+
+        # Merge the new spans into the sorted list of covered spans
+        spans = sorted(self._covered + [(start, end)])
+        merged = [spans[0]]
+        for low, high in spans[1:]:
+            if low <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+            else:
+                merged.append((low, high))
+        self._covered = merged
+
+        return gaps
+
+    def _fetch_recent(self, start, end):
+        tracks = self._client.user.get_recent_tracks(
+            self._username,
+            start=datetime.utcfromtimestamp(start),
+            end=datetime.utcfromtimestamp(end))
+
+        for page in tracks.iter_pages(raw=True):
+            for track in page:
+                date = track.get('date')
+                if not date:
+                    # Now playing
+                    continue
+
+                artist = track['artist']
+                if isinstance(artist, dict):
+                    artist = artist.get('name') or artist.get('#text')
+
+                self._seen.add(scrobble_key(date['uts'], artist,
+                                            track['name']))
+
+    def _prepare(self, rows, first, pending, skipped):
+        """
+        Normalize and dedupe a batch of rows, numbered from `first`, adding
+        new scrobbles to `pending` and other rows to `skipped`
+        """
+        timestamps = {}
+        scrobbles = []
+        events = []
+        for index, row in enumerate(rows, first):
+            try:
+                scrobbles.append(
+                    (index, normalize_row(row, self._fields, timestamps)))
+            except ValueError as exc:
+                LOGGER.debug('Rejected row %d: %s', index, exc)
+                self.rejected.append(Rejected(row, six.text_type(exc)))
+                events.append((index, REJECTED))
+
+        if scrobbles and self._dedupe:
+            timestamps = [scrobble['timestamp'] for _, scrobble in scrobbles]
+            for start, end in self._uncovered(min(timestamps),
+                                              max(timestamps)):
+                self._fetch_recent(start, end)
+
+        for index, scrobble in scrobbles:
+            if self._dedupe:
+                key = scrobble_key(scrobble['timestamp'], scrobble['artist'],
+                                   scrobble['track'])
+                if key in self._seen:
+                    events.append((index, DUPLICATE))
+                    continue
+                self._seen.add(key)
+
+            pending.append((index, scrobble))
+
+        skipped.extend(sorted(events))
+
+    def _submit(self, scrobbles):
+        if self._limiter is not None:
+            self._limiter.acquire()
+
+        resp = self._client.track.scrobble(scrobbles)
+        attributes = {}
+        if isinstance(resp, dict):
+            attributes = (resp.get('scrobbles') or {}).get('@attr') or {}
+
+        self.stats.submitted += len(scrobbles)
+        self.stats.accepted += int(attributes.get('accepted',
+                                                  len(scrobbles)))
+        self.stats.ignored += int(attributes.get('ignored', 0))
+
+    def _commit(self, rows, skipped):
+        """Record that every row before `rows` has been processed"""
+        while skipped and skipped[0][0] < rows:
+            _, kind = skipped.popleft()
+            if kind == REJECTED:
+                self.stats.rejected += 1
+            else:
+                self.stats.duplicates += 1
+
+        self.stats.rows = rows
+        self._save_state()
+
+        if self._progress is not None:
+            self._progress(self.stats)
+
+    def run(self, rows):
+        """
+        Import an iterable of rows, returning :class:`ImportStats`.  Rows
+        processed by an earlier run with the same `state` are skipped.
+        """
+        self._load_state()
+
+        size = self._batch_size
+        start = index = self.stats.rows
+        pending = []
+        skipped = deque()
+        batch = []
+
+        def flush(final=False):
+            while len(pending) >= size or (final and pending):
+                self._submit([scrobble for _, scrobble in pending[:size]])
+                del pending[:size]
+
+                # Rows after the first unsubmitted scrobble are processed
+                # again if the import is resumed
+                self._commit(pending[0][0] if pending else index, skipped)
+
+        for row in itertools.islice(rows, start, None):
+            batch.append(row)
+            if len(batch) == size:
+                self._prepare(batch, index, pending, skipped)
+                index += len(batch)
+                batch = []
+                flush()
+
+        if batch:
+            self._prepare(batch, index, pending, skipped)
+            index += len(batch)
+
+        flush(final=True)
+        self._commit(index, skipped)
+        return self.stats
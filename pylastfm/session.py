@@ -0,0 +1,181 @@
+"""
+Session key stores, which allow LastFM session keys to be reused between
+clients and processes instead of logging in every time
+"""
+
+import os
+import json
+import errno
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from pylastfm.error import FileError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+class SessionStore(object):
+    """
+    Base class for session key stores.  Entries are dicts with the keys
+    `session_key` and `mode`, where `mode` records which password mode (hashed
+    or not) was successful for the `hashed_password` authentication method.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def lock(self):
+        """
+        Hold an exclusive lock on the store.  Authenticators hold this lock
+        while logging in, so that concurrent clients wait for the first login
+        and then reuse its session key.  The lock is reentrant.
+        """
+        with self._lock:
+            yield self
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        raise NotImplementedError
+
+    def remove(self, key):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Session store that shares session keys between clients in a process"""
+
+    def __init__(self):
+        super(MemorySessionStore, self).__init__()
+        self._entries = {}
+
+    def get(self, key):
+        with self.lock():
+            entry = self._entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def set(self, key, entry):
+        with self.lock():
+            self._entries[key] = dict(entry)
+
+    def remove(self, key):
+        with self.lock():
+            self._entries.pop(key, None)
+
+
+class FileSessionStore(SessionStore):
+    """
+    Session store backed by a JSON file, which is shared by every process on
+    the host that uses the same path.  Access is serialized with an advisory
+    lock on `<path>.lock`; on platforms without `fcntl`, the lock only
+    protects against other threads in the same process.
+    """
+
+    def __init__(self, path):
+        super(FileSessionStore, self).__init__()
+        self._path = os.path.expanduser(os.path.expandvars(path))
+        self._depth = 0
+        self._lockfile = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            if self._depth == 0:
+                self._acquire()
+
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._release()
+
+    def _acquire(self):
+        try:
+            self._lockfile = open(self._path + '.lock', 'a')
+        except IOError as exc:
+            raise FileError('Unable to open session store lock {0}: {1}'
+                            .format(self._path + '.lock', exc))
+
+        if fcntl is not None:
+            fcntl.flock(self._lockfile.fileno(), fcntl.LOCK_EX)
+
+    def _release(self):
+        if fcntl is not None:
+            fcntl.flock(self._lockfile.fileno(), fcntl.LOCK_UN)
+
+        self._lockfile.close()
+        self._lockfile = None
+
+    def _read(self):
+        try:
+            with open(self._path) as handle:
+                return json.load(handle)
+        except IOError as exc:
+            if exc.errno == errno.ENOENT:
+                return {}
+            raise FileError('Unable to read session store {0}: {1}'.format(
+                self._path, exc))
+        except ValueError:
+            LOGGER.warning('Ignoring corrupt session store %s', self._path)
+            return {}
+
+    def _write(self, entries):
+        # Session keys are credentials, so the file is only readable by its
+        # owner.  Replace the file atomically so readers never see a partial
+        # write.
+        dirname = os.path.dirname(os.path.abspath(self._path))
+        fd, tmppath = tempfile.mkstemp(dir=dirname, prefix='.sessions')
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(entries, handle)
+            os.rename(tmppath, self._path)
+        except (IOError, OSError) as exc:
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            raise FileError('Unable to write session store {0}: {1}'.format(
+                self._path, exc))
+
+    def get(self, key):
+        with self.lock():
+            return self._read().get(key)
+
+    def set(self, key, entry):
+        with self.lock():
+            entries = self._read()
+            entries[key] = dict(entry)
+            self._write(entries)
+
+    def remove(self, key):
+        with self.lock():
+            entries = self._read()
+            if entries.pop(key, None) is not None:
+                self._write(entries)
+
+
+def session_store(value):
+    """
+    Return a session store for `value`, which may be a :class:`SessionStore`
+    or a path to a session store file
+    """
+    if value is None or isinstance(value, SessionStore):
+        return value
+
+    return FileSessionStore(value)
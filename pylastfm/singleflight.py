@@ -0,0 +1,70 @@
+"""
+Coalescing of identical concurrent calls
+"""
+
+import threading
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Ensures that only one call per key is in flight at a time.  Callers that
+    ask for a key while a call for it is running wait for that call and share
+    its result (or exception) instead of making their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.executed = 0
+        self.absorbed = 0
+
+    def do(self, key, func):
+        """Return `func()`, sharing the result with concurrent callers"""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.absorbed += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """
+        Return a dict of counts: `calls` made, calls `executed`, and calls
+        `absorbed` by sharing the result of an identical call in flight
+        """
+        with self._lock:
+            return dict(calls=self.calls,
+                        executed=self.executed,
+                        absorbed=self.absorbed)
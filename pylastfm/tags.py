@@ -0,0 +1,214 @@
+"""
+Bulk syncing of a user's tags on artists, albums and tracks
+"""
+
+import logging
+from collections import namedtuple
+
+import six
+
+from pylastfm import constants
+from pylastfm.entities import ALBUM, ARTIST, TRACK
+from pylastfm.util import RateLimiter, normalize_name, parallel_map
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+ADD = 'add'
+REMOVE = 'remove'
+
+# Number of names in the key of each kind of entity
+KEY_LENGTHS = {ARTIST: 2, ALBUM: 3, TRACK: 3}
+
+
+TagChange = namedtuple('TagChange', ['entity', 'add', 'remove'])
+TagFailure = namedtuple('TagFailure', ['entity', 'operation', 'tags',
+                                       'error'])
+
+
+def _check_entity(entity):
+    if (not isinstance(entity, tuple) or
+            KEY_LENGTHS.get(entity[0] if entity else None) != len(entity)):
+        raise ValueError('Invalid entity: {0!r}'.format(entity))
+
+
+def diff_tags(current, desired):
+    """
+    Return `(add, remove)`: the tags in `desired` that aren't in `current`,
+    and the tags in `current` that aren't in `desired`.  Tags are compared by
+    their normalized names (see :func:`pylastfm.util.normalize_name`), so
+    changing only the case of a tag isn't a change.
+    """
+    current_names = set(normalize_name(tag) for tag in current)
+    desired_names = set(normalize_name(tag) for tag in desired)
+
+    add = []
+    for tag in desired:
+        name = normalize_name(tag)
+        if name not in current_names:
+            add.append(tag)
+            current_names.add(name)
+
+    remove = [tag for tag in current
+              if normalize_name(tag) not in desired_names]
+    return add, remove
+
+
+class TagSync(object):
+    """
+    Makes the authenticated user's tags on many artists, albums and tracks
+    match the desired tags, with as few requests as possible.
+
+    Desired tags are given as a dict mapping entities to lists of tags, where
+    an entity is `('artist', artist)`, `('album', artist, album)` or
+    `('track', artist, track)`.  The user's current tags on every entity are
+    fetched concurrently, only missing tags are added, in requests of up to
+    10 tags, and only unwanted tags are removed.  Requests are made by up to
+    `workers` threads, at most `rate` requests per second.  Failed requests
+    are logged and collected in `failures`, and don't stop the other changes.
+
+        sync = TagSync(client, rate=5)
+        changes = sync.sync({
+            ('artist', 'Low'): ['slowcore', 'minnesota'],
+            ('album', 'Low', 'Things We Lost in the Fire'): ['slowcore'],
+        })
+    """
+
+    def __init__(self, client, workers=4, rate=None):
+        self._client = client
+        self._workers = workers
+        self._limiter = RateLimiter(rate) if rate else None
+
+        self.failures = []
+
+    def _acquire(self):
+        if self._limiter is not None:
+            self._limiter.acquire()
+
+    def _get_tags(self, entity):
+        self._acquire()
+
+        kind = entity[0]
+        if kind == ARTIST:
+            tags = self._client.artist.get_tags(entity[1],
+                                                username=self._client.username)
+        else:
+            resource = getattr(self._client, kind)
+            tags = resource.get_tags(entity[1], entity[2],
+                                     username=self._client.username)
+
+        return [tag.name for tag in tags]
+
+    def _add_tags(self, entity, tags):
+        self._acquire()
+
+        kind = entity[0]
+        if kind == ARTIST:
+            self._client.artist.add_tags(entity[1], *tags)
+        elif kind == ALBUM:
+            self._client.album.add_tags(entity[1], entity[2], *tags)
+        else:
+            self._client.track.add_tags(entity[1], entity[2], list(tags))
+
+    def _remove_tag(self, entity, tag):
+        self._acquire()
+        getattr(self._client, entity[0]).remove_tag(*entity[1:] + (tag,))
+
+    def _run(self, operation):
+        entity, kind, tags = operation
+        try:
+            if kind == ADD:
+                self._add_tags(entity, tags)
+            elif kind == REMOVE:
+                self._remove_tag(entity, tags[0])
+            else:
+                return entity, self._get_tags(entity)
+        except Exception as exc:
+            LOGGER.warning('Tag %s failed for %s: %s', kind or 'fetch',
+                           entity, exc)
+            return TagFailure(entity, kind, tags, exc)
+
+    def current(self, entities):
+        """
+        Return a dict of the user's current tags on each entity.  Entities
+        whose tags can't be fetched are left out, and added to `failures`.
+        """
+        entities = list(entities)
+        for entity in entities:
+            _check_entity(entity)
+
+        tags = {}
+        results = parallel_map(self._run, [(entity, None, None)
+                                           for entity in entities],
+                               workers=self._workers)
+        for result in results:
+            if isinstance(result, TagFailure):
+                self.failures.append(result)
+            else:
+                tags[result[0]] = result[1]
+
+        return tags
+
+    def diff(self, desired, current=None):
+        """
+        Return a list of :class:`TagChange` for the entities in `desired`
+        whose tags need to change.  If `current` isn't given, the current
+        tags are fetched with :meth:`current`.
+        """
+        if current is None:
+            current = self.current(desired)
+
+        changes = []
+        for entity, tags in six.iteritems(desired):
+            _check_entity(entity)
+            if entity not in current:
+                continue
+
+            add, remove = diff_tags(current[entity],
+                                    [six.text_type(tag) for tag in tags])
+            if add or remove:
+                changes.append(TagChange(entity, add, remove))
+
+        return changes
+
+    def operations(self, changes):
+        """
+        Return the requests that make `changes`, as `(entity, operation,
+        tags)` tuples: tags are added 10 at a time, and removed one at a time
+        """
+        operations = []
+        size = constants.MAX_TAGS
+        for change in changes:
+            for start in six.moves.range(0, len(change.add), size):
+                operations.append(
+                    (change.entity, ADD, change.add[start:start + size]))
+            for tag in change.remove:
+                operations.append((change.entity, REMOVE, [tag]))
+
+        return operations
+
+    def apply(self, changes):
+        """
+        Make a list of :class:`TagChange`, returning the list of
+        :class:`TagFailure` for the requests that failed
+        """
+        results = parallel_map(self._run, self.operations(changes),
+                               workers=self._workers)
+        failures = [result for result in results if result is not None]
+        self.failures.extend(failures)
+        return failures
+
+    def sync(self, desired, dry_run=False):
+        """
+        Make the user's tags match `desired`, returning the list of
+        :class:`TagChange` made; changes with a failed request are left out,
+        and the failures are added to `failures`.  If `dry_run` is true, the
+        changes are only computed, and all of them are returned.
+        """
+        changes = self.diff(desired)
+        if dry_run:
+            return changes
+
+        failed = set(failure.entity for failure in self.apply(changes))
+        return [change for change in changes if change.entity not in failed]
@@ -0,0 +1,121 @@
+"""
+HTTP transport helpers: content-encoding negotiation, streaming response
+bodies, and transfer statistics
+"""
+
+import json
+import threading
+
+import six
+
+from pylastfm import error
+
+
+# Read decompressed response bodies in chunks of this size
+CHUNK_SIZE = 64 * 1024
+
+
+def accept_encoding():
+    """
+    Return the `Accept-Encoding` header value for every content encoding that
+    can be decoded: gzip and deflate, plus brotli and zstd if the optional
+    libraries that urllib3 uses for them are installed
+    """
+    try:
+        from urllib3.util.request import ACCEPT_ENCODING
+    except ImportError:  # pragma: no cover
+        return 'gzip,deflate'
+
+    return ACCEPT_ENCODING
+
+
+class HttpResponse(object):
+    """An HTTP response whose body has been read"""
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        if not self.body:
+            raise ValueError('Empty response body')
+
+        # json accepts bytes in python 3.6+; decode for older versions
+        try:
+            return json.loads(self.body)
+        except TypeError:  # pragma: no cover
+            return json.loads(self.body.decode('utf-8'))
+
+
+def read_response(resp):
+    """
+    Read a streamed `requests` response, decompressing its body chunk by chunk
+    into a single buffer.  Returns a tuple of (:class:`HttpResponse`, bytes
+    received over the wire).  Errors while reading the body are raised as
+    :class:`pylastfm.error.RequestTimeout` or
+    :class:`pylastfm.error.LastfmError`.
+    """
+    from requests.packages.urllib3 import exceptions
+
+    body = bytearray()
+    try:
+        for chunk in resp.raw.stream(CHUNK_SIZE, decode_content=True):
+            body.extend(chunk)
+        received = resp.raw.tell()
+    except exceptions.TimeoutError as exc:
+        six.raise_from(error.RequestTimeout(
+            'Request timed out: {0}'.format(exc)), exc)
+    except exceptions.HTTPError as exc:
+        # Connection dropped or body undecodable while reading the body
+        six.raise_from(error.LastfmError(
+            'Request error: {0}'.format(exc)), exc)
+    finally:
+        resp.close()
+
+    return HttpResponse(resp.status_code, resp.headers, bytes(body)), received
+
+
+class TransferStats(object):
+    """
+    Thread-safe per-method counts of requests, bytes received over the wire
+    (compressed), and bytes of decompressed response bodies
+    """
+
+    def __init__(self):
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, compressed, decompressed):
+        with self._lock:
+            stats = self._methods.setdefault(method, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += compressed
+            stats[2] += decompressed
+
+    def __getitem__(self, method):
+        """
+        Return a dict of `requests`, `compressed` and `decompressed` bytes,
+        and compression `ratio` for a method
+        """
+        with self._lock:
+            requests, compressed, decompressed = self._methods.get(
+                method, (0, 0, 0))
+
+        return dict(requests=requests,
+                    compressed=compressed,
+                    decompressed=decompressed,
+                    ratio=(float(decompressed) / compressed
+                           if compressed else None))
+
+    def methods(self):
+        with self._lock:
+            return sorted(self._methods)
+
+    def report(self):
+        """Return a dict of stats for every method"""
+        return dict((method, self[method]) for method in self.methods())
+
+    def clear(self):
+        with self._lock:
+            self._methods.clear()
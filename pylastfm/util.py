@@ -1,10 +1,17 @@
 import six
 from functools import wraps
+import calendar
 import itertools
 import logging
 import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 from datetime import datetime
-from dateutil.parser import parse as dateparse
+
+from pylastfm.error import RequestTimeout
 
 
 LOGGER = logging.getLogger('lastfm')
@@ -94,38 +101,637 @@ class Signer(object):
         return params
 
 
+class RateLimiter(object):
+    """
+    Token bucket rate limiter that allows `rate` calls per second on average,
+    with bursts of up to `burst` calls. Thread-safe.
+    """
+
+    def __init__(self, rate, burst=None):
+        if not rate > 0:
+            raise ValueError('Rate must be positive')
+
+        self._rate = float(rate)
+        self._burst = float(burst or max(1, rate))
+        self._tokens = self._burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self._burst,
+                           self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        """Number of calls that may be made right now"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def wait_time(self):
+        """Seconds until a call may be made"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self._rate)
+
+    def try_acquire(self):
+        """Take a token if one is available, returning True if successful"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+
+            return False
+
+    def acquire(self):
+        """Take a token, waiting until one is available"""
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
+
+
+def _smaller_page_size(size):
+    """Return the largest divisor of `size` that is at most half of it"""
+    for divisor in six.moves.range(2, size + 1):
+        if size % divisor == 0:
+            return size // divisor
+
+
+def _reduce_page_size(page, size, adaptive, min_perpage):
+    """
+    Return the page size to use after page `page` of `size` items timed out,
+    or `None` if pages can't be made smaller
+    """
+    smaller = _smaller_page_size(size)
+    if not adaptive or smaller is None or smaller < min_perpage:
+        return None
+
+    LOGGER.warning('Page %d of size %d timed out; reducing page size to %d',
+                   page, size, smaller)
+    return smaller
+
+
+def fetch_first_page(fetch, page, perpage, adaptive=False, min_perpage=10):
+    """
+    Fetch page `page` of `perpage` items with `fetch(page, size)`, before the
+    total number of items (and so a :class:`Pager`) is known, returning
+    `(response, size)`.  If `adaptive` is true and the page times out, only
+    the first part of it is fetched, on a smaller page of `size` items, as
+    :class:`Pager` does; the rest of it is fetched with :meth:`Pager.page`.
+    """
+    size = perpage
+    while True:
+        number = (page - 1) * perpage // size + 1
+        try:
+            return fetch(number, size), size
+        except RequestTimeout:
+            size = _reduce_page_size(number, size, adaptive, min_perpage)
+            if size is None:
+                raise
+
+
+class Pager(object):
+    """
+    Fetches the items on pages of a paginated API method.
+
+    Pages are numbered from 1 and contain `perpage` items.  `fetch(page,
+    size)` must return the list of items on page `page`, where pages contain
+    `size` items.  If `adaptive` is true and fetching a page times out, the
+    page is fetched as several smaller pages instead, and the smaller size is
+    used from then on.  Smaller sizes always divide `perpage`, so that pages
+    of either size line up.  `size` is the page size to start with, if the
+    first page was fetched at a smaller size (see :func:`fetch_first_page`).
+    """
+
+    def __init__(self, fetch, perpage, total, adaptive=False, min_perpage=10,
+                 size=None):
+        self._fetch = fetch
+        self._perpage = perpage
+        self._total = total
+        self._adaptive = adaptive
+        self._min_perpage = min_perpage
+        self._size = size or perpage
+
+    @property
+    def perpage(self):
+        return self._perpage
+
+    @property
+    def size(self):
+        """Page size currently used to make requests"""
+        return self._size
+
+    def page(self, page, start=0):
+        """
+        Return the items on a page, from the `start`-th item on, which must
+        be a multiple of the current page size
+        """
+        return self._items((page - 1) * self._perpage + start,
+                           page * self._perpage)
+
+    def _items(self, start, stop):
+        # Offsets are always multiples of the current page size, since sizes
+        # only shrink to divisors of the previous size
+        items = []
+        offset = start
+        while offset < min(stop, self._total):
+            size = self._size
+            items.extend(self._fetch_sized(offset // size + 1, size))
+            offset += size
+
+        return items
+
+    def _fetch_sized(self, page, size):
+        try:
+            return self._fetch(page, size)
+        except RequestTimeout:
+            smaller = _reduce_page_size(page, size, self._adaptive,
+                                        self._min_perpage)
+            if smaller is None:
+                raise
+
+            self._size = min(self._size, smaller)
+            return self._items((page - 1) * size, page * size)
+
+
+class _PageLayout(object):
+    """
+    Positions of the items on pages of `perpage` items, where some pages may
+    hold more items than that, e.g. page 1 of `user.getRecentTracks`, which
+    also holds the track that is playing now.  Items are located from the
+    lengths of the pages that have been seen.
+    """
+
+    def __init__(self, perpage):
+        self.perpage = perpage
+        self._surplus = {}
+
+    def record(self, page, length):
+        """Record the number of items on a page"""
+        if length - self.perpage > self._surplus.get(page, 0):
+            self._surplus[page] = length - self.perpage
+
+    @property
+    def extra(self):
+        """Number of items on all pages beyond `perpage` per page"""
+        return sum(six.itervalues(self._surplus))
+
+    def start(self, page):
+        """Index of the first item on a page"""
+        return (page - 1) * self.perpage + sum(
+            surplus for number, surplus in six.iteritems(self._surplus)
+            if number < page)
+
+    def locate(self, index):
+        """Return the (page, offset) of the item at an index"""
+        shift = 0
+        for page in sorted(self._surplus):
+            start = (page - 1) * self.perpage + shift
+            if index < start:
+                break
+            if index < start + self.perpage + self._surplus[page]:
+                return page, index - start
+            shift += self._surplus[page]
+
+        page, offset = divmod(index - shift, self.perpage)
+        return page + 1, offset
+
+
+class Page(list):
+    """
+    List of the items on a page of a paginated API method, with the page
+    number (`page`), and the `total_pages` and `total` items reported by the
+    API
+    """
+
+    def __init__(self, items, page, total_pages, total):
+        super(Page, self).__init__(items)
+        self.page = page
+        self.total_pages = total_pages
+        self.total = total
+
+    def __repr__(self):
+        return '<Page({0} of {1}, {2} items)>'.format(
+            self.page, self.total_pages, len(self))
+
+
+def _compose(outer, inner=None):
+    """Return a function that applies `inner`, if given, then `outer`"""
+    if inner is None:
+        return outer
+
+    return lambda item: outer(inner(item))
+
+
 class PaginatedIterator(object):
+    """
+    Iterator over the items of a paginated API method.
+
+    Pages are fetched from `pager` (a :class:`Pager`) only when their items
+    are reached, and `first_page`, the items on page 1, is used without being
+    fetched again.  Iteration stops after `limit` items, if given, so no more
+    pages are requested than are consumed.  :meth:`skip` and :meth:`islice`
+    move straight to the page containing an item without fetching the pages
+    before it.
+
+    If `first_page` is not page 1, iteration starts at the first item of
+    `page`, and `extra` is the number of items that the pages before it held
+    beyond the page size.  `request` describes the API call, so that the
+    iterator can be checkpointed (see :meth:`checkpoint`), and `start_total`
+    is the total number of items when the call was first made, if it was
+    resumed.
+
+    Items are located from the actual lengths of the pages, so pages that
+    hold more items than the page size (such as the now-playing track on
+    page 1 of `user.getRecentTracks`) don't hide any items.
+
+    For compatibility, an iterator over all items may be passed as
+    `iterator` instead of a pager.
+    """
 
-    def __init__(self, pages, total, iterator):
+    def __init__(self, pages, total, iterator=None, pager=None,
+                 first_page=None, limit=None, page=1, request=None,
+                 start_total=None, extra=0):
         self._pages = max(1, pages)
         self._total = total
+        self._start_total = total if start_total is None else start_total
+        self._cap = None if limit is None else max(0, limit)
         self._iterator = iterator
+        self._pager = pager
+        self._request = request
+        self._func = None
+        self._model = None
+        self._layout = None
+        self._position = 0
+        if pager is not None:
+            self._layout = _PageLayout(pager.perpage)
+            if extra:
+                self._layout.record(1, pager.perpage + extra)
+
+        if pager is not None:
+            self._position = min(self._count, self._layout.start(page))
+
+        # Items on the page that is currently being iterated
+        self._page = None
+        self._page_items = None
+        if first_page is not None:
+            self._page = page
+            self._page_items = list(first_page)
+            self._record(page, self._page_items)
+
+    @property
+    def _count(self):
+        count = self._total
+        if self._layout is not None:
+            count += self._layout.extra
+        if self._cap is not None:
+            count = min(count, self._cap)
+        return count
+
+    def _record(self, page, items):
+        if self._layout is not None:
+            self._layout.record(page, len(items))
 
     def __iter__(self):
-        return self._iterator
+        return self
 
     def next(self):
-        return six.next(self._iterator)
+        if self._position >= self._count:
+            raise StopIteration
+
+        if self._pager is None:
+            item = six.next(self._iterator)
+        else:
+            item = self._item(self._position)
+
+        self._position += 1
+        return item if self._func is None else self._func(item)
 
     __next__ = next
 
+    def _load(self, page):
+        if page != self._page:
+            # Drop the current page first, so that only one page is in memory
+            self._page_items = None
+            self._page_items = self._pager.page(page)
+            self._page = page
+            self._record(page, self._page_items)
+
+        return self._page_items
+
+    def _truncate(self, index):
+        """The API returned fewer items than it reported"""
+        self._cap = index
+
+    def _item(self, index):
+        page, offset = self._layout.locate(index)
+        if offset >= len(self._load(page)):
+            self._truncate(index)
+            raise StopIteration
+
+        return self._page_items[offset]
+
     def __len__(self):
+        """Number of items produced by the iterator, including consumed ones"""
+        return self._count
+
+    @property
+    def remaining(self):
+        """Number of items that haven't been consumed yet"""
+        return self._count - self._position
+
+    @property
+    def total(self):
+        """Total number of items reported by the API, ignoring `limit`"""
         return self._total
 
+    @property
+    def model(self):
+        """Model class that items are mapped to, if known"""
+        return self._model
+
+    @property
+    def drift(self):
+        """
+        Change in the total number of items since the API call was first
+        made, if it was resumed from a checkpoint
+        """
+        return self._total - self._start_total
+
+    @property
+    def pages(self):
+        """Number of pages that are requested to produce every item"""
+        if self._pager is None:
+            return self._pages
+
+        if not self._count:
+            return 1
+
+        return min(self._pages, self._layout.locate(self._count - 1)[0])
+
+    def __repr__(self):
+        return '<PaginatedIterator({0} pages)>'.format(self.pages)
+
+    def _copy(self):
+        copy = PaginatedIterator.__new__(PaginatedIterator)
+        copy.__dict__.update(self.__dict__)
+        return copy
+
+    def map(self, func, model=None):
+        """Return a new PaginatedIterator generated from mapping the function
+        to this iterator.  If `func` creates instances of a model class,
+        `model` is the class, which is recorded in checkpoints."""
+        copy = self._copy()
+        copy._func = _compose(func, self._func)
+        copy._model = model
+        return copy
+
+    def iter_pages(self, raw=False):
+        """
+        Iterate over the remaining items a page at a time, yielding a
+        :class:`Page` for each page.  Items are mapped by the iterator's
+        function (e.g. into response models) unless `raw` is true.  The
+        first page only contains the remaining items on it.
+        """
+        while self.remaining > 0:
+            if self._pager is None:
+                number = 1
+                items = list(itertools.islice(self._iterator, self.remaining))
+            else:
+                number, start = self._layout.locate(self._position)
+                items = self._load(number)
+                items = items[start:start + self.remaining]
+
+            if not items:
+                self._truncate(self._position)
+                return
+
+            self._position += len(items)
+            if not raw and self._func is not None:
+                items = [self._func(item) for item in items]
+
+            yield Page(items, number, self._pages, self._total)
+
+    def checkpoint(self):
+        """
+        Return a JSON-serializable dict describing the API call and the
+        position of the next item: the API `method`, its `params`, the
+        `page` and `offset` within it, and the `total` number of items when
+        the call was first made.  Pass it to
+        :meth:`pylastfm.client.LastFM.resume` to continue from that item.
+        """
+        if self._request is None or self._pager is None:
+            raise TypeError('Iterator does not support checkpoints')
+
+        page, offset = self._layout.locate(self._position)
+        checkpoint = json_copy(self._request)
+        checkpoint.update(
+            perpage=self._pager.perpage,
+            page=page,
+            offset=offset,
+            extra=self._layout.start(page) - (page - 1) * self._pager.perpage,
+            total=self._start_total,
+            model=class_path(self._model) if self._model else None,
+        )
+        return checkpoint
+
+    def skip(self, n):
+        """
+        Skip the next `n` items.  Pages that only contain skipped items are
+        not requested.  Returns the iterator.
+        """
+        n = min(n, self.remaining)
+        if self._pager is None:
+            for _ in six.moves.range(n):
+                six.next(self._iterator)
+
+        self._position += n
+        return self
+
+    def seek(self, page):
+        """
+        Move to the first item on `page`, without fetching the pages before
+        it.  Returns the iterator.
+        """
+        if self._pager is None:
+            if self._count:
+                raise TypeError('Cannot seek an iterator without a pager')
+            return self
+
+        self._position = min(self._count, self._layout.start(page))
+        return self
+
+    def sequence(self, max_pages=None):
+        """
+        Return a :class:`PaginatedSequence` over the same items, which keeps
+        up to `max_pages` fetched pages in memory (all pages if `None`).  An
+        iterator without a pager is read into memory.
+        """
+        if self._pager is None:
+            items = list(self._iterator)
+            pager = Pager(lambda page, size: [], max(1, len(items)),
+                          len(items))
+            cache = _PageCache(pager, max_pages)
+            cache.seed(1, items)
+            return PaginatedSequence(1, len(items), cache, func=self._func)
+
+        cache = _PageCache(self._pager, max_pages, layout=self._layout)
+        if self._page is not None:
+            cache.seed(self._page, self._page_items)
+
+        return PaginatedSequence(self.pages, self._count, cache,
+                                 func=self._func)
+
+    def islice(self, start, stop=None):
+        """
+        Return a new PaginatedIterator over items `start` to `stop` of the
+        remaining items, like :func:`itertools.islice`, but without fetching
+        the pages before `start`
+        """
+        copy = self._copy()
+        if stop is not None:
+            stop = self._position + max(start, stop)
+            copy._cap = stop if copy._cap is None else min(copy._cap, stop)
+
+        return copy.skip(start)
+
+
+class _PageCache(object):
+    """
+    Thread-safe LRU cache of the pages fetched by a :class:`Pager`, holding
+    up to `max_pages` pages, or every page if `None`.  The lengths of the
+    pages are recorded in `layout`.
+    """
+
+    def __init__(self, pager, max_pages=None, layout=None):
+        if max_pages is not None and max_pages < 1:
+            raise ValueError('max_pages must be at least 1')
+
+        self._pager = pager
+        self._max_pages = max_pages
+        self.layout = layout or _PageLayout(pager.perpage)
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.fetched = 0
+
+    def __len__(self):
+        return len(self._pages)
+
+    def _add(self, page, items):
+        self.layout.record(page, len(items))
+        self._pages.pop(page, None)
+        self._pages[page] = items
+
+        while (self._max_pages is not None and
+               len(self._pages) > self._max_pages):
+            self._pages.popitem(last=False)
+
+    def seed(self, page, items):
+        """Add a page that was fetched elsewhere"""
+        with self._lock:
+            self._add(page, list(items))
+
+    def page(self, page):
+        """Return the items on a page, fetching it if it isn't cached"""
+        with self._lock:
+            items = self._pages.get(page)
+            if items is not None:
+                # Re-insert to mark as most recently used
+                self._add(page, items)
+                return items
+
+        items = self._pager.page(page)
+        with self._lock:
+            self.fetched += 1
+            self._add(page, items)
+
+        return items
+
+
+class PaginatedSequence(object):
+    """
+    Read-only sequence of the items of a paginated API method.
+
+    Items may be accessed by index or slice, and the sequence may be iterated
+    any number of times.  Only the pages containing the requested items are
+    fetched, and fetched pages are kept in an LRU cache, so pages are only
+    fetched again if they were evicted.  Create one with
+    :meth:`PaginatedIterator.sequence`.
+    """
+
+    def __init__(self, pages, count, page_cache, func=None):
+        self._pages = max(1, pages)
+        self._count = count
+        self._cache = page_cache
+        self._func = func
+
+    def __len__(self):
+        return self._count
+
     @property
     def pages(self):
         return self._pages
 
+    @property
+    def fetched(self):
+        """Number of pages that have been fetched by the sequence"""
+        return self._cache.fetched
+
     def __repr__(self):
-        return '<PaginatedIterator({} pages)>'.format(self._pages)
+        return '<PaginatedSequence({0} items)>'.format(self._count)
+
+    def _apply(self, item):
+        return item if self._func is None else self._func(item)
+
+    def _raw(self, index):
+        page, offset = self._cache.layout.locate(index)
+        items = self._cache.page(page)
+        if offset >= len(items):
+            # The API returned fewer items than it reported
+            raise IndexError('PaginatedSequence index out of range')
+
+        return items[offset]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._apply(self._raw(i))
+                    for i in six.moves.range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('PaginatedSequence index out of range')
+
+        return self._apply(self._raw(index))
+
+    def __iter__(self):
+        return self.seek(1)
+
+    def seek(self, page):
+        """Return an iterator over the items from the start of `page` on"""
+        for index in six.moves.range(self._cache.layout.start(page),
+                                     self._count):
+            try:
+                item = self._raw(index)
+            except IndexError:
+                return
+
+            yield self._apply(item)
 
     def map(self, func):
-        """Return a new PaginatedIterator generated from mapping the function
-        to this iterator"""
-        return PaginatedIterator(
-            self._pages,
-            self._total,
-            (func(item) for item in self._iterator))
+        """
+        Return a new PaginatedSequence generated from mapping the function to
+        this sequence.  The sequences share fetched pages.
+        """
+        return PaginatedSequence(self._pages, self._count, self._cache,
+                                 func=_compose(func, self._func))
 
 
 def unix_timestamp(date):
@@ -140,19 +746,68 @@ def query_date(value):
     if isinstance(value, datetime):
         return unix_timestamp(value)
 
-    # See if it's already a UNIX timestamp
+    # See if it's already a UNIX timestamp, which is passed unchanged
     try:
-        date = datetime.fromtimestamp(int(value))
-        assert date >= datetime.fromtimestamp(0)
-        return unix_timestamp(date)
+        timestamp = int(value)
+        assert timestamp >= 0
+        return timestamp
     except (ValueError, AssertionError):
         pass
 
     # Try to parse a datestring
+    from dateutil.parser import parse as dateparse
     try:
         return unix_timestamp(dateparse(value))
     except ValueError:
-        raise ValueError('Invalid timestamp: {}'.format(value))
+        raise ValueError('Invalid timestamp: {0}'.format(value))
+
+
+# ISO 8601 dates and times, e.g. '2015-04-17T18:54:00Z'; times without an
+# offset are UTC, as with `query_date`
+ISO_DATETIME = re.compile(
+    r'^(\d{4})-(\d\d)-(\d\d)(?:[T ](\d\d):(\d\d)(?::(\d\d)(?:\.\d+)?)?)?'
+    r'\s*(Z|[+-]\d\d:?\d\d)?$')
+
+
+def parse_timestamp(value):
+    """
+    Return a UNIX timestamp for a date, like `query_date`, without the cost
+    of dateutil for common formats.  Numbers and numeric strings are returned
+    as whole seconds, unchanged, and ISO 8601 dates are parsed directly;
+    anything else is parsed by `query_date`.
+    """
+    if (isinstance(value, six.integer_types + (float,)) and
+            not isinstance(value, bool)):
+        if not 0 <= value < float('inf'):
+            raise ValueError('Invalid timestamp: {0}'.format(value))
+        return int(value)
+
+    if isinstance(value, six.string_types):
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+
+        try:
+            number = float(value)
+        except ValueError:
+            pass
+        else:
+            return parse_timestamp(number)
+
+        match = ISO_DATETIME.match(value)
+        if match:
+            year, month, day, hour, minute, second, offset = match.groups()
+            timestamp = calendar.timegm((int(year), int(month), int(day),
+                                         int(hour or 0), int(minute or 0),
+                                         int(second or 0)))
+            if offset and offset != 'Z':
+                offset = offset.replace(':', '')
+                seconds = (int(offset[1:3]) * 60 + int(offset[3:])) * 60
+                timestamp += -seconds if offset[0] == '+' else seconds
+
+            return timestamp
+
+    return query_date(value)
 
 
 def keywords(*keys, **defaultkeys):
@@ -227,3 +882,69 @@ def nested_in(data, keys):
 def ceildiv(a, b):
     """Integer ceiling division"""
     return -(-a // b)
+
+
+def class_path(cls):
+    """Return the dotted path of a class, e.g. `pylastfm.util.Pager`"""
+    return '{0}.{1}'.format(cls.__module__, cls.__name__)
+
+
+def import_class(path):
+    """Import a class by its dotted path; the inverse of :func:`class_path`"""
+    module, name = path.rsplit('.', 1)
+    return getattr(__import__(module, fromlist=[name]), name)
+
+
+def normalize_name(name):
+    """
+    Normalize an artist, album or track name for comparison: Unicode
+    compatibility normalization (NFKC), case folding, and collapsing
+    whitespace
+    """
+    name = unicodedata.normalize('NFKC', six.text_type(name))
+    name = name.casefold() if hasattr(name, 'casefold') else name.lower()
+    return ' '.join(name.split())
+
+
+def json_copy(data):
+    """Deep copy of decoded JSON data; much faster than `copy.deepcopy`"""
+    if isinstance(data, dict):
+        return dict((key, json_copy(value)) for key, value in data.items())
+    elif isinstance(data, list):
+        return [json_copy(item) for item in data]
+
+    return data
+
+
+# Request parameters that don't affect the content of the response
+UNKEYED_PARAMS = frozenset(('api_key', 'api_sig', 'sk', 'format', 'method'))
+
+
+def request_key(method, params):
+    """
+    Return a hashable key that identifies an API request by its method and
+    canonical parameters.  Parameters with `None` values are not sent, so
+    they are ignored.
+    """
+    return (method, tuple(sorted(
+        (key, six.text_type(value)) for key, value in params.items()
+        if value is not None and key not in UNKEYED_PARAMS)))
+
+
+def parallel_map(func, items, workers=4):
+    """
+    Return `[func(item) for item in items]`, calling `func` from a pool of
+    `workers` threads.  If any call raises an exception, it is re-raised.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
+        pool.join()
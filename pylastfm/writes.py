@@ -0,0 +1,227 @@
+"""
+Debouncing and coalescing of superseded write requests
+"""
+
+import logging
+import threading
+import time
+
+from pylastfm import constants, error
+from pylastfm.util import normalize_name
+
+
+LOGGER = logging.getLogger('lastfm')
+
+
+NOW_PLAYING = 'now_playing'
+LOVE = 'love'
+
+# API errors after which a write is retried
+TRANSIENT_ERRORS = frozenset([constants.SERVICE_OFFLINE,
+                              constants.TEMPORARY_ERROR,
+                              constants.RATE_LIMIT_EXCEEDED])
+
+
+def _transient(exc):
+    """Return True if a write that failed with `exc` may succeed later"""
+    if isinstance(exc, error.APIError):
+        return exc.code in TRANSIENT_ERRORS
+
+    # Timeouts and connection errors
+    return (isinstance(exc, error.LastfmError) and
+            not isinstance(exc, error.AuthenticationError))
+
+
+class _Write(object):
+
+    __slots__ = ('method', 'args', 'kwargs', 'due', 'deadline', 'attempts')
+
+    def __init__(self, method, args, kwargs, due, deadline):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.due = due
+        self.deadline = deadline
+        self.attempts = 0
+
+
+class WriteCoalescer(object):
+    """
+    Sends `track.updateNowPlaying`, `track.love` and `track.unlove` requests
+    asynchronously, dropping writes that are superseded before they are
+    sent.
+
+    A write is sent once no write for the same thing has been made for
+    `delay` seconds (or at most `max_delay` seconds after the first one, if
+    given): the now-playing track of the client's session, or the loved
+    state of a track.  Only the last now-playing update is sent, and a track
+    that is loved, unloved and loved again is loved once.  Requests are made
+    by up to `workers` threads, and never concurrently for the same thing, so
+    the final state always wins.
+
+    Failed requests are logged.  A write that fails with a transient error
+    (service offline, temporary error, rate limit, timeout or connection
+    error) is retried up to `retries` times, waiting `retry_delay` seconds
+    and twice as long after each attempt, unless a newer write for the same
+    thing has been made.
+
+        with client.track.coalescer(delay=2) as writes:
+            writes.now_playing('Low', 'Words')
+            writes.love('Low', 'Words')
+    """
+
+    def __init__(self, client, delay=1.0, max_delay=None, workers=2,
+                 retries=3, retry_delay=1.0):
+        self._client = client
+        self._delay = delay
+        self._max_delay = max_delay
+        self._retries = retries
+        self._retry_delay = retry_delay
+
+        self._pending = {}
+        self._in_flight = set()
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+        from multiprocessing.pool import ThreadPool
+        self._pool = ThreadPool(workers)
+
+        self._dispatcher = threading.Thread(target=self._dispatch)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _schedule(self, key, method, args, kwargs):
+        now = time.time()
+        with self._cond:
+            if self._closed:
+                raise ValueError('Write coalescer is closed')
+
+            self.requested += 1
+            previous = self._pending.get(key)
+            if previous is not None:
+                self.coalesced += 1
+                deadline = previous.deadline
+            elif self._max_delay is not None:
+                deadline = now + self._max_delay
+            else:
+                deadline = None
+
+            due = now + self._delay
+            if deadline is not None:
+                due = min(due, deadline)
+
+            self._pending[key] = _Write(method, args, kwargs, due, deadline)
+            self._cond.notify_all()
+
+    def now_playing(self, *args, **kwargs):
+        """
+        Update the now-playing track, with the arguments of
+        :meth:`pylastfm.api.track.Resource.update_now_playing`
+        """
+        self._schedule((NOW_PLAYING,), self._client.track.update_now_playing,
+                       args, kwargs)
+
+    def _love_key(self, artist, track):
+        return LOVE, normalize_name(artist), normalize_name(track)
+
+    def love(self, artist, track):
+        """Love a track"""
+        self._schedule(self._love_key(artist, track), self._client.track.love,
+                       (artist, track), {})
+
+    def unlove(self, artist, track):
+        """Unlove a track"""
+        self._schedule(self._love_key(artist, track),
+                       self._client.track.unlove, (artist, track), {})
+
+    def _send(self, key, write):
+        try:
+            write.method(*write.args, **write.kwargs)
+        except Exception as exc:
+            with self._cond:
+                self.failed += 1
+
+                # Retry unless the write has been superseded
+                if (_transient(exc) and write.attempts < self._retries and
+                        key not in self._pending):
+                    wait = self._retry_delay * 2 ** write.attempts
+                    LOGGER.warning('Write %s failed, retrying in %.1fs: %s',
+                                   key[0], wait, exc)
+                    write.attempts += 1
+                    write.due = time.time() + wait
+                    write.deadline = None
+                    self._pending[key] = write
+                else:
+                    LOGGER.warning('Write %s failed: %s', key[0], exc)
+        else:
+            with self._cond:
+                self.sent += 1
+        finally:
+            with self._cond:
+                self._in_flight.discard(key)
+                self._cond.notify_all()
+
+    def _dispatch(self):
+        with self._cond:
+            while not (self._closed and not self._pending):
+                now = time.time()
+                wait = None
+                for key, write in list(self._pending.items()):
+                    if key in self._in_flight:
+                        continue
+
+                    if write.due > now:
+                        remaining = write.due - now
+                        wait = remaining if wait is None else min(wait,
+                                                                  remaining)
+                        continue
+
+                    del self._pending[key]
+                    self._in_flight.add(key)
+                    self._pool.apply_async(self._send, (key, write))
+
+                self._cond.wait(wait)
+
+    def flush(self):
+        """Send every pending write now, and wait until they are done"""
+        with self._cond:
+            for write in self._pending.values():
+                write.due = 0
+            self._cond.notify_all()
+
+            while self._pending or self._in_flight:
+                self._cond.wait()
+
+    def close(self):
+        """Flush pending writes and stop the coalescer"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        self._dispatcher.join()
+        self._pool.close()
+        self._pool.join()
+
+    def stats(self):
+        """
+        Return a dict of counts: writes `requested`, requests `sent`,
+        writes `coalesced` into another write, and requests `failed`
+        (including requests that were retried)
+        """
+        with self._cond:
+            return dict(requested=self.requested,
+                        sent=self.sent,
+                        coalesced=self.coalesced,
+                        failed=self.failed)
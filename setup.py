@@ -60,12 +60,14 @@ Changelog
         download_url=download_url(),
 
         packages=find_packages(exclude=['tests']),
+        entry_points={
+            'console_scripts': ['pylastfm = pylastfm.cli:main'],
+        },
         install_requires=[
             'requests>=2.5.1',
             'six>=1.9.0',
             'python-dateutil>=2.4.0',
             'figgis>=1.6.0',
-            'iso3166>=0.7',
         ],
 
         classifiers=[
@@ -73,7 +75,6 @@ Changelog
             'Intended Audience :: Developers',
             'License :: OSI Approved :: Apache Software License',
             'Operating System :: OS Independent',
-            'Programming Language :: Python :: 2.6',
             'Programming Language :: Python :: 2.7',
             'Programming Language :: Python :: 3.3',
             'Programming Language :: Python :: 3.4',
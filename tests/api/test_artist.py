@@ -23,6 +23,7 @@ def test_get_similar(client):
     resp = client.artist.get_similar('queen')
     assert isinstance(resp, list)
     assert all(isinstance(item, common.SimilarArtist) for item in resp)
+    assert all(0 <= item.match <= 1 for item in resp)
 
 
 @pytest.mark.live
@@ -1,9 +1,53 @@
 import six
+import json
 import pytest
 
+from pylastfm import LastFM
+from pylastfm.countries import country_name
 from pylastfm.response import geo
+from pylastfm.transport import HttpResponse
 from pylastfm.util import PaginatedIterator
 
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+@pytest.mark.parametrize('country', [
+    'us', 'USA', 840, '840', 'United States', 'united states of america',
+    'america',
+])
+def test_country_name(country):
+    assert country_name(country) == 'United States'
+
+
+def test_country_name_unknown():
+    pytest.raises(KeyError, country_name, 'atlantis')
+
+
+def test_get_top_artists_by_country():
+    client = LastFM('key', 'secret', cache=True)
+
+    def send(http_method, request_args, headers=None):
+        country = request_args['params']['country']
+        data = {'topartists': {
+            'artist': [{'name': country, 'listeners': '1'}],
+            '@attr': {'page': '1', 'totalPages': '1', 'total': '1'},
+        }}
+        return HttpResponse(200, {}, json.dumps(data).encode('utf-8'))
+
+    with patch.object(client, '_send') as request:
+        request.side_effect = send
+
+        for _ in range(2):
+            resp = client.geo.get_top_artists_by_country(['us', 'GB', 'de'])
+            assert sorted(resp) == ['GB', 'de', 'us']
+            assert resp['GB'][0].name == 'United Kingdom'
+            assert resp['de'][0].name == 'Germany'
+
+        assert request.call_count == 3
+
 
 @pytest.mark.live
 @pytest.mark.parametrize('limit_one', [False, True])
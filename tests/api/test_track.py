@@ -24,7 +24,8 @@ def test_get_similar(client):
     assert resp
 
     track = resp[0]
-    assert isinstance(track, common.Track)
+    assert isinstance(track, common.SimilarTrack)
+    assert 0 <= track.match <= 1
 
 
 @pytest.mark.live
@@ -1,5 +1,7 @@
 import pytest
 import logging
+import os
+import time
 from pylastfm import LastFM
 from six.moves.configparser import SafeConfigParser
 
@@ -24,6 +26,40 @@ def pytest_addoption(parser):
     parser.addoption('--api_secret', help='API Secret')
     parser.addoption('--username', help='Username')
     parser.addoption('--password', help='Password (may be MD5 hashed)')
+    parser.addoption('--run-benchmarks', action='store_true',
+                     help='Run tests marked as benchmarks')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'benchmark: timing test, skipped without --run-benchmarks')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-benchmarks'):
+        return
+
+    skip = pytest.mark.skip(reason='needs --run-benchmarks')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def local_timezone():
+    """Run a test in a timezone other than UTC"""
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset is not available')
+
+    old = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+    yield
+    if old is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = old
+    time.tzset()
 
 
 @pytest.fixture(scope='session')
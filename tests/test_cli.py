@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from pylastfm import LastFM
+from pylastfm.cli import main, parser
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+CHART = {
+    'artist': [dict(name='Artist {0}'.format(i), playcount=10 - i,
+                    listeners=1) for i in range(3)],
+    '@attr': {'page': '1', 'totalPages': '1', 'total': '3'},
+}
+
+
+@pytest.fixture
+def client():
+    client = LastFM('key', 'secret', username='user', password='password')
+    with patch.object(LastFM, 'from_config', return_value=client):
+        yield client
+
+
+def test_parser():
+    args = parser().parse_args(['charts', '--rate', '5', '--workers', '8',
+                                '--country', 'us', '--country', 'gb'])
+    assert args.command == 'charts'
+    assert (args.rate, args.workers) == (5.0, 8)
+    assert args.country == ['us', 'gb']
+
+    with pytest.raises(SystemExit):
+        parser().parse_args(['export', 'user'])
+
+    # Scrobbles are imported one request at a time
+    with pytest.raises(SystemExit):
+        parser().parse_args(['import', 'scrobbles.csv', '--workers', '2'])
+
+
+def test_charts(client, tmpdir, capsys):
+    output = tmpdir.join('charts.ndjson')
+
+    with patch.object(client, '_request', return_value=CHART):
+        assert main(['charts', '-o', str(output)]) == 0
+
+    lines = [json.loads(line) for line in output.readlines()]
+    assert [line['name'] for line in lines] == [
+        'Artist 0', 'Artist 1', 'Artist 2']
+    assert '3 items in' in capsys.readouterr().err
+
+
+def test_import(client, tmpdir):
+    path = tmpdir.join('scrobbles.csv')
+    path.write('artist,track,timestamp,album\n' + ''.join(
+        'Artist,Track {0},{1},\n'.format(i, 1400000000 + i)
+        for i in range(120)))
+
+    with patch.object(client.track, 'scrobble') as scrobble:
+        assert main(['import', str(path), '--no-dedupe']) == 0
+
+    batches = [call[0][0] for call in scrobble.call_args_list]
+    assert [len(batch) for batch in batches] == [50, 50, 20]
+    assert batches[0][0] == dict(artist='Artist', track='Track 0',
+                                 timestamp=1400000000)
+
+
+def test_error(client, capsys):
+    with patch.object(client, '_request', side_effect=ValueError('bad')):
+        assert main(['charts']) == 1
+
+    assert 'pylastfm charts: bad' in capsys.readouterr().err
+
+
+def test_unknown_country(client, capsys):
+    with patch.object(client, '_request') as request:
+        assert main(['charts', '--country', 'us', '--country',
+                     'atlantis']) == 1
+
+    assert not request.called
+    assert capsys.readouterr().err == (
+        'pylastfm charts: Unknown country: atlantis\n')
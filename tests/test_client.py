@@ -1,9 +1,16 @@
+import json
 import pytest
 import six
+import threading
+import time
 from pylastfm.util import PaginatedIterator
 from pylastfm.auth import (Password, PasswordAuthToken, SessionKeyFile,
                            SessionKey)
 from pylastfm import LastFM
+from pylastfm.error import PaginationDrift, RequestTimeout
+from pylastfm.transport import HttpResponse
+from pylastfm.cache import (ResponseCache, CachePolicy, FRESH, REFRESH, STALE,
+                            MISS)
 
 try:
     from unittest.mock import patch
@@ -11,6 +18,11 @@ except ImportError:
     from mock import patch
 
 
+def make_response(data, status_code=200, headers=None):
+    body = json.dumps(data).encode('utf-8') if data is not None else b''
+    return HttpResponse(status_code, headers or {}, body)
+
+
 def make_paginated(response, page, total_pages, total):
     result = response.copy()
     result.update({
@@ -43,6 +55,157 @@ def test_pagination(client):
         assert request.call_count == 3
 
 
+def test_pagination_page_size():
+    client = LastFM('key', 'secret')
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = [
+            make_paginated({'coll': list(range(500))}, 1, 3, 1200),
+            list(range(500, 1000)),
+            list(range(1000, 1200)),
+        ]
+
+        resp = client._paginate_request('GET', 'library.getArtists', 'coll')
+        assert request.call_args[1]['params']['limit'] == 1000
+
+        # The API returned smaller pages than requested
+        assert list(resp['coll']) == list(range(1200))
+        assert request.call_args[1]['params'] == dict(page=3, limit=500)
+
+
+def test_pagination_adaptive_first_page():
+    client = LastFM('key', 'secret', adaptive_pages=True)
+    sizes = []
+
+    def request(http_method, method, params=None, collection_key=None,
+                **kwargs):
+        page, size = params.get('page', 1), params['limit']
+        sizes.append(size)
+        if size > 250:
+            raise RequestTimeout('timed out')
+
+        items = list(range((page - 1) * size, min(page * size, 1200)))
+        if collection_key:
+            return items
+
+        return make_paginated({'coll': items}, page, -(-1200 // size), 1200)
+
+    with patch.object(client, '_request', side_effect=request):
+        coll = client._paginate_request('GET', 'library.getArtists',
+                                        'coll')['coll']
+        assert sizes == [1000, 500, 250, 250, 250, 250]
+        assert coll.pages == 2
+        assert list(coll) == list(range(1200))
+
+
+def test_pagination_limit(client):
+    with patch.object(client, '_request') as request:
+        request.side_effect = [
+            make_paginated({'coll': list(range(30))}, 1, 4, 100),
+            list(range(30, 60)),
+        ]
+
+        coll = client._paginate_request('GET', 'method', 'coll',
+                                        perpage=30, limit=45)['coll']
+        assert len(coll) == 45
+        assert list(coll) == list(range(45))
+        assert request.call_count == 2
+
+
+def test_pagination_now_playing(client):
+    # Page 1 of user.getRecentTracks also holds the track playing now
+    with patch.object(client, '_request') as request:
+        request.side_effect = [
+            make_paginated({'coll': ['np', 'a', 'b']}, 1, 3, 6),
+            ['c', 'd'], ['e', 'f'],
+        ]
+
+        coll = client._paginate_request('GET', 'method', 'coll',
+                                        perpage=2)['coll']
+        assert len(coll) == 7
+        assert [next(coll) for _ in range(4)] == ['np', 'a', 'b', 'c']
+
+        checkpoint = coll.checkpoint()
+        assert (checkpoint['page'], checkpoint['offset']) == (2, 1)
+        assert list(coll) == ['d', 'e', 'f']
+
+        request.side_effect = [make_paginated({'coll': ['c', 'd']}, 2, 3, 6),
+                               ['e', 'f']]
+        assert list(client.resume(checkpoint)) == ['d', 'e', 'f']
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = [
+            make_paginated({'coll': ['np', 'a', 'b']}, 1, 3, 6),
+            ['c', 'd'], ['e', 'f'],
+        ]
+
+        coll = client._paginate_request('GET', 'method', 'coll',
+                                        perpage=2)['coll']
+        sequence = coll.sequence()
+        assert list(sequence) == ['np', 'a', 'b', 'c', 'd', 'e', 'f']
+        assert sequence[3] == 'c'
+
+
+def library_artists(total, requests):
+    """Fake `_request` for library.getArtists with `total` artists"""
+    def request(http_method, method, params=None, collection_key=None,
+                **kwargs):
+        page, size = params.get('page', 1), params['limit']
+        requests.append(page)
+        artists = [dict(name='Artist {0}'.format(i), playcount=1, tagcount=0)
+                   for i in range((page - 1) * size, min(page * size, total))]
+        if collection_key:
+            return artists
+
+        return make_paginated({'artist': artists}, page,
+                              -(-total // size), total)
+
+    return request
+
+
+def test_pagination_checkpoint():
+    from pylastfm.response.library import Artist
+
+    client = LastFM('key', 'secret')
+    requests = []
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = library_artists(2500, requests)
+        artists = client.library.get_artists('user')
+        for _ in range(1234):
+            next(artists)
+
+        checkpoint = json.loads(json.dumps(artists.checkpoint()))
+        assert checkpoint['method'] == 'library.getArtists'
+        assert checkpoint['params'] == dict(user='user')
+        assert (checkpoint['page'], checkpoint['offset']) == (2, 234)
+        assert checkpoint['total'] == 2500
+        assert requests == [1, 2]
+
+        resumed = client.resume(checkpoint)
+        artist = next(resumed)
+        assert isinstance(artist, Artist)
+        assert artist.name == 'Artist 1234'
+        assert resumed.remaining == 2500 - 1235
+        assert requests == [1, 2, 2]
+
+        # The library has grown since the checkpoint
+        request.side_effect = library_artists(2600, requests)
+        assert client.resume(checkpoint).drift == 100
+        pytest.raises(PaginationDrift, client.resume, checkpoint,
+                      strict=True)
+
+
+@pytest.mark.parametrize('method,limit,size', [
+    ('library.getArtists', None, 1000),
+    ('library.getArtists', 45, 45),
+    ('track.search', None, 30),
+    ('user.getRecentTracks', None, 200),
+])
+def test_page_size(method, limit, size):
+    assert LastFM('key', 'secret').page_size(method, limit) == size
+
+
 @pytest.mark.parametrize('auth_method,session_key,auth_class', [
     ('password', None, Password),
     ('hashed_password', None, PasswordAuthToken),
@@ -58,6 +221,166 @@ def test_auth_method(auth_method, session_key, auth_class):
     assert isinstance(client._auth, auth_class)
 
 
+def test_from_config_options(tmpdir):
+    path = tmpdir.join('config')
+    path.write('[lastfm]\napi_key = key\napi_secret = secret\n'
+               'rate = 5\ncache_ttl = 60\n')
+
+    client = LastFM.from_config(str(path), timeout='2.5')
+    assert client._limiter.rate == 5
+    assert client.cache.ttl == 60
+    assert client._timeout == 2.5
+
+    client = LastFM.from_config(str(path), rate='', cache_ttl='')
+    assert client._limiter is None
+    assert client.cache is None
+
+
 def test_session_key_auth():
     auth = SessionKey('key', 'secret', 'username', 'password', 'session_key')
     assert auth.session_key() == 'session_key'
+
+
+def test_response_cache():
+    client = LastFM('key', 'secret', cache=ResponseCache(ttl=60))
+
+    with patch.object(client, '_send') as request:
+        request.side_effect = lambda *args, **kwargs: make_response(
+            {'artists': {'artist': [1, 2]}})
+
+        first = client._request('GET', 'chart.getTopArtists',
+                                params=dict(page=1), unwrap='artists')
+        first['artist'].append(3)
+
+        second = client._request('GET', 'chart.getTopArtists',
+                                 params=dict(page=1), unwrap='artists')
+        assert second == {'artist': [1, 2]}
+        assert request.call_count == 1
+
+        client._request('GET', 'chart.getTopArtists', params=dict(page=2))
+        assert request.call_count == 2
+
+        # Authenticated methods are never cached
+        with patch.object(client, '_sign', side_effect=lambda data: data):
+            for _ in range(2):
+                client._request('POST', 'track.love', data=dict(track='a'))
+        assert request.call_count == 4
+
+
+def test_response_cache_expiry():
+    cache = ResponseCache(ttl=60, max_entries=2,
+                          policies={'expired': CachePolicy(ttl=-1)})
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    assert cache.get('b', method='expired') is None
+
+    cache.set('c', 3)
+    cache.set('d', 4)
+    assert cache.get('a') is None
+    assert len(cache) == 2
+
+
+@pytest.mark.parametrize('age,state', [
+    (0, FRESH),
+    (79, FRESH),
+    (81, REFRESH),
+    (101, STALE),
+    (201, MISS),
+])
+def test_cache_policy(age, state):
+    policy = CachePolicy(ttl=100, stale_ttl=100, refresh_ahead=0.8)
+    assert policy.state(age) == state
+
+
+def test_stale_while_revalidate():
+    policy = CachePolicy(ttl=-1, stale_ttl=3600)
+    cache = ResponseCache(policies={'chart.getTopTags': policy})
+    client = LastFM('key', 'secret', cache=cache)
+    refreshed = threading.Event()
+
+    def send(http_method, request_args, headers=None):
+        if request.call_count > 1:
+            refreshed.set()
+        return make_response({'version': request.call_count})
+
+    with patch.object(client, '_send') as request:
+        request.side_effect = send
+
+        assert client._request('GET', 'chart.getTopTags') == {'version': 1}
+
+        # The stale entry is served while a new version is fetched
+        assert client._request('GET', 'chart.getTopTags') == {'version': 1}
+        assert refreshed.wait(5)
+
+        # Wait for the refreshed response to be stored
+        while cache.refreshes and cache._refreshing:
+            time.sleep(0.001)
+        assert client._request('GET', 'chart.getTopTags')['version'] >= 2
+
+
+def test_conditional_revalidation():
+    cache = ResponseCache(ttl=-1)
+    client = LastFM('key', 'secret', cache=cache)
+    data = {'tags': {'tag': ['rock']}}
+
+    with patch.object(client, '_send') as request:
+        request.return_value = make_response(data, headers={'ETag': 'v1'})
+        assert client._request('GET', 'chart.getTopTags') == data
+
+        # The expired entry is revalidated with its ETag
+        request.return_value = make_response(None, status_code=304)
+        assert client._request('GET', 'chart.getTopTags') == data
+        assert request.call_args[1]['headers'] == {'If-None-Match': 'v1'}
+        assert cache.not_modified == 1
+
+        # Without validators, an identical body isn't decoded again
+        request.return_value = make_response(data)
+        with patch.object(client, '_decode') as decode:
+            assert client._request('GET', 'chart.getTopTags') == data
+            assert not decode.called
+        assert cache.unchanged == 1
+
+
+def test_coalesce():
+    client = LastFM('key', 'secret', coalesce=True)
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def fetch(http_method, method, request_args):
+        started.set()
+        release.wait()
+        return {'artist': {'name': 'Radiohead'}}
+
+    def get_info():
+        result = client._request('GET', 'artist.getInfo',
+                                 params=dict(artist='Radiohead'),
+                                 unwrap='artist')
+        results.append(result)
+
+    with patch.object(client, '_fetch') as request:
+        request.side_effect = fetch
+
+        leader = threading.Thread(target=get_info)
+        leader.start()
+        started.wait()
+
+        followers = [threading.Thread(target=get_info) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+
+        # Wait for the followers to join the call in flight
+        while client.single_flight.stats()['calls'] < 5:
+            time.sleep(0.001)
+
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        assert request.call_count == 1
+
+    assert results == [{'name': 'Radiohead'}] * 5
+    assert len(set(id(result) for result in results)) == 5
+    assert client.single_flight.stats() == dict(calls=5, executed=1,
+                                                absorbed=4)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from pylastfm import LastFM, APIError
+from pylastfm.corrections import CorrectionIndex, Correction
+from pylastfm.util import normalize_name as normalize
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+CorrectedArtist = namedtuple('CorrectedArtist', ['name', 'mbid'])
+CorrectedTrack = namedtuple('CorrectedTrack',
+                            ['artist_name', 'artist_mbid', 'name', 'mbid'])
+
+
+def get_artist_correction(artist):
+    if artist == 'nobody':
+        raise APIError(6, 'The artist you supplied could not be found')
+    if normalize(artist) == 'guns n roses':
+        return [CorrectedArtist("Guns N' Roses", 'gnr-mbid')]
+    return []
+
+
+def get_track_correction(artist, track):
+    return CorrectedTrack("Guns N' Roses", 'gnr-mbid',
+                          "Sweet Child O' Mine", '')
+
+
+def test_normalize():
+    assert normalize('  Guns\tN  ROSES ') == 'guns n roses'
+    assert normalize('Beyoncé') == normalize('Beyoncé')
+    assert normalize('ＡＢＢＡ') == 'abba'
+
+
+def test_correction_index(tmpdir):
+    path = str(tmpdir.join('corrections.db'))
+    client = LastFM('key', 'secret')
+
+    with patch.object(client.artist, 'get_correction',
+                      side_effect=get_artist_correction) as artist, \
+            patch.object(client.track, 'get_correction',
+                         side_effect=get_track_correction) as track:
+        index = CorrectionIndex(client, path)
+        corrections = index.correct_many([
+            'Guns N Roses', 'guns  n roses', 'Queen', 'nobody',
+            ('guns n roses', 'sweet child of mine')])
+
+        assert corrections == [
+            Correction("Guns N' Roses", 'gnr-mbid', None, None),
+            Correction("Guns N' Roses", 'gnr-mbid', None, None),
+            Correction('Queen', None, None, None),
+            Correction('nobody', None, None, None),
+            Correction("Guns N' Roses", 'gnr-mbid', "Sweet Child O' Mine",
+                       None),
+        ]
+        assert artist.call_count == 3
+        assert track.call_count == 1
+        assert len(index) == 4
+        index.close()
+
+        # Corrections are read back from disk
+        index = CorrectionIndex(client, path)
+        assert index.correct_artist('GUNS N ROSES').artist == "Guns N' Roses"
+        assert index.correct_track(
+            'Guns N Roses', 'Sweet Child Of Mine').track_mbid is None
+        assert artist.call_count == 3
+        assert track.call_count == 1
+        assert (index.hits, index.misses) == (2, 0)
+
+
+def test_correction_failures():
+    client = LastFM('key', 'secret')
+
+    def get_correction(artist):
+        if artist == 'offline':
+            raise APIError(11, 'Service offline')
+        return [CorrectedArtist(artist.title(), '')]
+
+    with patch.object(client.artist, 'get_correction',
+                      side_effect=get_correction) as artist:
+        index = CorrectionIndex(client)
+        corrections = index.correct_many(['queen', 'offline', 'abba'])
+
+        # Other corrections are kept, and empty mbids are normalized
+        assert corrections == [Correction('Queen', None, None, None), None,
+                               Correction('Abba', None, None, None)]
+        assert [failure.item for failure in index.failures] == ['offline']
+        assert len(index) == 2
+
+        # Failed names are requested again
+        index.correct_artist('offline')
+        assert artist.call_count == 4
@@ -0,0 +1,231 @@
+import six
+from collections import namedtuple
+
+from pylastfm import LastFM, APIError
+from pylastfm.crawl import (UserCrawler, FriendCrawler, SimilarityCrawler,
+                            Edge, user_job, write_csv)
+from pylastfm.util import PaginatedIterator
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+Info = namedtuple('Info', ['playcount'])
+
+PLAYCOUNTS = dict(alice=100, bob=500, carol=50)
+
+
+def get_info(username):
+    if username not in PLAYCOUNTS:
+        raise APIError(6, 'User not found')
+    return Info(PLAYCOUNTS[username])
+
+
+def test_prioritize():
+    client = LastFM('key', 'secret')
+    crawler = UserCrawler(client, [], workers=2)
+
+    with patch.object(client.user, 'get_info', side_effect=get_info):
+        ranked = crawler.prioritize(['alice', 'bob', 'carol', 'dave'],
+                                    previous=dict(bob=490, carol=0))
+        assert ranked == [('alice', 100), ('carol', 50), ('bob', 10),
+                          ('dave', None)]
+
+        # Deltas are relative to the playcounts of the previous call
+        assert crawler.prioritize(['alice', 'bob'])[0] == ('alice', 0)
+
+
+def test_run():
+    client = LastFM('key', 'secret')
+
+    def failing(client, username):
+        raise APIError(8, 'Operation failed')
+
+    jobs = dict(loved=user_job('get_loved_tracks'), failing=failing)
+    crawler = UserCrawler(client, jobs, workers=4, rate=1000)
+
+    with patch.object(client.user, 'get_info', side_effect=get_info), \
+            patch.object(client.user, 'get_loved_tracks') as loved:
+        loved.side_effect = lambda username: PaginatedIterator(
+            1, 2, iter([username, username]))
+        crawler.playcounts.update(alice=100, bob=0, carol=0)
+
+        results = list(crawler.run(['alice', 'bob', 'carol'],
+                                   skip_idle=True))
+
+    assert len(results) == 4
+    assert sorted(result.username for result in results
+                  if result.job == 'loved') == ['bob', 'carol']
+    assert all(result.result == [result.username] * 2
+               for result in results if result.job == 'loved')
+    assert all(isinstance(result.error, APIError)
+               for result in results if result.job == 'failing')
+
+    stats = crawler.stats
+    assert stats.progress == 1.0
+    assert stats.failed == 2
+    assert stats['loved']['calls'] == 2
+    assert stats['failing']['failures'] == 2
+    assert stats['loved']['p95'] >= stats['loved']['p50'] >= 0
+
+
+FRIENDS = dict(
+    a=['b', 'c'],
+    b=['a', 'c', 'd'],
+    c=['a', 'b'],
+    d=['b', 'e'],
+    e=['d'],
+)
+
+
+def get_friends(username):
+    friends = [dict(name=name) for name in FRIENDS[username]]
+    return PaginatedIterator(1, len(friends), iter(friends))
+
+
+def crawl_friends(**kwargs):
+    client = LastFM('key', 'secret')
+    crawler = FriendCrawler(client, workers=2, **kwargs)
+    with patch.object(client.user, 'get_friends', side_effect=get_friends):
+        return crawler, list(crawler.crawl(['a']))
+
+
+def test_friend_crawler():
+    crawler, edges = crawl_friends(max_depth=3)
+    pairs = set(frozenset((edge.source, edge.target)) for edge in edges)
+    assert len(pairs) == len(edges) == 5
+    assert frozenset('de') in pairs
+    assert len(crawler.visited) == 5
+    assert 'E' in crawler.visited
+
+    # Friends of d are at depth 3, so e is never expanded
+    assert crawler.expanded == 4
+
+    _, edges = crawl_friends(max_depth=1)
+    assert sorted(edge.target for edge in edges) == ['b', 'c']
+
+    crawler, edges = crawl_friends(max_depth=3, max_nodes=3)
+    assert len(crawler.visited) == 3
+    assert all(edge.target in 'abc' for edge in edges)
+
+
+def friends_request(requests):
+    """Fake `_request` for user.getFriends with 5 friends, 2 per page"""
+    def request(http_method, method, params=None, unwrap=None,
+                collection_key=None, **kwargs):
+        requests.append(params.get('page', 1))
+        start = (params.get('page', 1) - 1) * 2
+        users = [dict(name=name, realname='', url='', gender='', country='',
+                      age='0', bootstrap='0', playcount='0',
+                      registered={'#text': '1400000000'})
+                 for name in 'bcdef'[start:start + 2]]
+        if collection_key is not None:
+            return users
+
+        return {'user': users, '@attr': {'page': '1', 'totalPages': '3',
+                                         'total': '5'}}
+
+    return request
+
+
+def test_user_rate_per_request():
+    client = LastFM('key', 'secret')
+    requests = []
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = friends_request(requests)
+
+        crawler = UserCrawler(client, ['get_friends'], rate=1000)
+        with patch.object(crawler._limiter, 'acquire') as acquire:
+            results = list(crawler.run(['a'], prioritize=False))
+
+        assert [user.name for user in results[0].result] == list('bcdef')
+        assert requests == [1, 2, 3]
+        assert acquire.call_count == 3
+
+
+def test_friend_rate_per_request():
+    client = LastFM('key', 'secret')
+    requests = []
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = friends_request(requests)
+
+        crawler = FriendCrawler(client, max_depth=1, rate=1000)
+        with patch.object(crawler._limiter, 'acquire') as acquire:
+            edges = list(crawler.crawl(['a']))
+
+    assert [edge.target for edge in edges] == list('bcdef')
+    assert requests == [1, 2, 3]
+    assert acquire.call_count == 3
+
+
+def test_write_csv():
+    buf = six.StringIO()
+    count = write_csv([Edge('a', 'b', 1), Edge('a', 'c', 1)], buf)
+    assert count == 2
+    assert buf.getvalue().splitlines() == [
+        'source,target,depth', 'a,b,1', 'a,c,1']
+
+
+SIMILAR = {
+    'a': [('B', 'mbid-b', 0.9), ('c', None, 0.2)],
+    'b': [('A', None, 0.9), ('d', None, 0.5)],
+    'c': [('e', None, 0.05)],
+    'd': [('f', None, 1.0)],
+}
+
+
+class Similar(object):
+
+    def __init__(self, name, mbid, match):
+        self.name = name
+        self.mbid = mbid
+        self.match = match
+
+
+def get_similar(artist=None, mbid=None):
+    return [Similar(*item) for item in SIMILAR[artist.lower()]]
+
+
+def build_similar(*seeds, **kwargs):
+    client = LastFM('key', 'secret')
+    crawler = SimilarityCrawler(client, workers=2, **kwargs)
+    with patch.object(client.artist, 'get_similar',
+                      side_effect=get_similar) as similar:
+        graph = crawler.build(seeds)
+        return graph, similar.call_args_list
+
+
+def test_similarity_crawler():
+    graph, calls = build_similar('a', max_depth=2)
+    assert graph.labels == ['a', 'B', 'c', 'd', 'e']
+    assert sorted(graph.edge_list()) == [
+        ('B', 'a', 0.9), ('B', 'd', 0.5), ('a', 'B', 0.9), ('a', 'c', 0.2),
+        ('c', 'e', 0.05)]
+    assert sorted((call[1]['artist'], call[1]['mbid']) for call in calls) == [
+        ('B', 'mbid-b'), ('a', None), ('c', None)]
+
+    assert graph.adjacency()[0] == {1: 0.9, 2: 0.2}
+
+    graph, _ = build_similar('a', max_depth=2, min_match=0.1, max_nodes=3)
+    assert graph.labels == ['a', 'B', 'c']
+    assert len(graph.edges) == 3
+
+
+def test_similarity_memo_any_key():
+    client = LastFM('key', 'secret')
+    crawler = SimilarityCrawler(client, workers=2, max_depth=2)
+    with patch.object(client.artist, 'get_similar',
+                      side_effect=get_similar) as similar:
+        crawler.build(['a'])
+        assert similar.call_count == 3
+
+        # B was fetched by its MusicBrainz ID, and is found by its name
+        graph = crawler.build(['b'])
+        assert similar.call_count == 4
+        assert similar.call_args[1]['artist'] == 'd'
+
+    assert sorted(graph.labels) == ['A', 'b', 'c', 'd', 'f']
@@ -0,0 +1,63 @@
+import json
+
+from pylastfm import LastFM
+from pylastfm.entities import EntityIndex, ARTIST, TRACK
+from pylastfm.response import chart, library
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def paginated(key, items):
+    return {key: items, '@attr': {'page': '1', 'totalPages': '1',
+                                  'total': str(len(items))}}
+
+
+def test_intern():
+    index = EntityIndex()
+    cher = index.intern(ARTIST, 'Cher')
+    assert index.intern(ARTIST, ' CHER ') is cher
+
+    # The MusicBrainz ID is learned later
+    assert index.intern(ARTIST, 'Cher', mbid='cher-mbid') is cher
+    assert cher.mbid == 'cher-mbid'
+    assert index.get(ARTIST, mbid='cher-mbid') is cher
+
+    # A different artist with the same name
+    other = index.intern(ARTIST, 'Cher', mbid='other-mbid')
+    assert other is not cher
+    assert index.get(ARTIST, name='cher') is cher
+
+    believe = index.intern(TRACK, 'Believe', artist='Cher')
+    assert index.intern(TRACK, 'Believe', artist='Other') is not believe
+    assert index.get(TRACK, name='believe', artist='cher') is believe
+
+    assert len(index) == 4
+    assert len(index.entities(ARTIST)) == 2
+
+
+def test_client_entities():
+    client = LastFM('key', 'secret', entities=True)
+    queen = dict(name='Queen', mbid='queen-mbid',
+                 url='https://www.last.fm/music/Queen')
+
+    responses = [
+        paginated('artist', [dict(queen, playcount='10', tagcount='0')]),
+        paginated('artist', [dict(queen, playcount='100', listeners='5')]),
+    ]
+    with patch.object(client, '_request') as request:
+        # Decode each response separately, so that strings aren't shared
+        request.side_effect = [json.loads(json.dumps(resp))
+                               for resp in responses]
+        artist = next(client.library.get_artists('user'))
+        charted = next(client.chart.get_top_artists())
+
+    assert isinstance(artist, library.Artist)
+    assert isinstance(charted, chart.Artist)
+    assert artist.entity is charted.entity
+    assert artist.url is charted.url
+    assert client.entities.get(ARTIST, mbid='queen-mbid') is artist.entity
+
+    assert LastFM('key', 'secret').entities is None
@@ -0,0 +1,168 @@
+import os
+import json
+
+import pytest
+import six
+
+from pylastfm import LastFM, APIError
+from pylastfm.export import Exporter, encode_items
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def paginated(items, key, page, size, total):
+    return {
+        key: items,
+        '@attr': {
+            'page': six.text_type(page),
+            'totalPages': six.text_type(-(-total // size)),
+            'total': six.text_type(total),
+        }
+    }
+
+
+def account(total, fail_pages=()):
+    """Fake `_request` for an account with `total` library artists"""
+    fail_pages = set(fail_pages)
+
+    def request(http_method, method, params=None, collection_key=None,
+                **kwargs):
+        if method == 'user.getWeeklyChartList':
+            return {'chart': [{'from': '100', 'to': '200'},
+                              {'from': '200', 'to': '300'}]}
+        elif method != 'library.getArtists':
+            return [] if collection_key else paginated([], 'track', 1, 50, 0)
+
+        page, size = params.get('page', 1), params['limit']
+        if page in fail_pages:
+            fail_pages.remove(page)
+            raise APIError(8, 'Operation failed')
+
+        artists = [dict(name='Artist {0}'.format(i), playcount=i, tagcount=0)
+                   for i in range((page - 1) * size, min(page * size, total))]
+        if collection_key:
+            return artists
+
+        return paginated(artists, 'artist', page, size, total)
+
+    return request
+
+
+def read_lines(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_plan():
+    client = LastFM('key', 'secret')
+    exporter = Exporter(client, 'user', 'unused', periods=('7day',))
+
+    with patch.object(client, '_request', side_effect=account(0)):
+        tasks = exporter.plan()
+
+    assert sorted(tasks) == [
+        'library_artists',
+        'loved_tracks',
+        'recent_tracks',
+        'top_albums_7day',
+        'top_artists_7day',
+        'top_tracks_7day',
+        'weekly_album_chart_100_200',
+        'weekly_album_chart_200_300',
+        'weekly_artist_chart_100_200',
+        'weekly_artist_chart_200_300',
+        'weekly_track_chart_100_200',
+        'weekly_track_chart_200_300',
+    ]
+    assert tasks['weekly_artist_chart_100_200']['kwargs'] == dict(
+        username='user', start='100', end='200')
+    assert tasks['top_albums_7day']['file'] == 'top_albums_7day.ndjson'
+
+
+def test_weekly_chart_dates(local_timezone):
+    client = LastFM('key', 'secret')
+    exporter = Exporter(client, 'user', 'unused', periods=())
+
+    with patch.object(client, '_request', side_effect=account(0)):
+        task = exporter.plan()['weekly_artist_chart_100_200']
+
+    # The chart's timestamps are sent unchanged, whatever the local timezone
+    with patch.object(client, '_request') as request:
+        client.user.get_weekly_artist_chart(**task['kwargs'])
+
+    params = request.call_args[1]['params']
+    assert (params['from'], params['to']) == (100, 200)
+
+
+@pytest.mark.parametrize('processes', [0, 1])
+def test_export(tmpdir, processes):
+    client = LastFM('key', 'secret')
+    exporter = Exporter(client, 'user', str(tmpdir), processes=processes,
+                        periods=(), weekly=False)
+
+    with patch.object(client, '_request', side_effect=account(2500)):
+        manifest = exporter.run()
+
+    assert manifest['complete']
+    assert manifest['tasks']['library_artists']['items'] == 2500
+    assert manifest['tasks']['loved_tracks']['items'] == 0
+
+    artists = read_lines(str(tmpdir.join('library_artists.ndjson')))
+    assert [artist['name'] for artist in artists] == [
+        'Artist {0}'.format(i) for i in range(2500)]
+    assert artists[7] == dict(name='Artist 7', playcount=7, tagcount=0,
+                              mbid=None, url=None, images={},
+                              streamable=None)
+
+    with open(exporter.manifest_path) as handle:
+        assert json.load(handle) == manifest
+
+
+def test_export_resume(tmpdir):
+    client = LastFM('key', 'secret')
+    exporter = Exporter(client, 'user', str(tmpdir), processes=0,
+                        periods=(), weekly=False)
+    path = str(tmpdir.join('library_artists.ndjson'))
+
+    with patch.object(client, '_request') as request:
+        request.side_effect = account(2500, fail_pages=[2])
+        manifest = exporter.run()
+
+        task = manifest['tasks']['library_artists']
+        assert not manifest['complete']
+        assert task['status'] == 'failed'
+        assert task['items'] == 1000
+        assert task['checkpoint']['page'] == 2
+
+        # Output written after the last checkpoint is discarded on resume
+        with open(path, 'a') as handle:
+            handle.write('{"name": "partial')
+
+        requests = request.call_count
+        manifest = exporter.run()
+        assert manifest['complete']
+
+        # Only the remaining pages of the unfinished task are requested
+        assert request.call_count - requests == 2
+
+    assert [artist['name'] for artist in read_lines(path)] == [
+        'Artist {0}'.format(i) for i in range(2500)]
+
+
+def test_export_other_user(tmpdir):
+    client = LastFM('key', 'secret')
+    with patch.object(client, '_request', side_effect=account(0)):
+        Exporter(client, 'user', str(tmpdir), processes=0, periods=(),
+                 weekly=False).run()
+
+    with pytest.raises(ValueError):
+        Exporter(client, 'other', str(tmpdir), processes=0).run()
+
+
+def test_encode_items():
+    assert encode_items(None, [{'b': 1, 'a': None}, [1]]) == (
+        '{"a": null, "b": 1}\n[1]\n')
+    assert os.linesep not in encode_items(None, [])
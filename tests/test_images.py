@@ -0,0 +1,67 @@
+import gc
+import json
+
+import pytest
+
+from pylastfm.images import ImageMap, images
+from pylastfm.response import common
+
+
+URL = 'https://lastfm.freetls.fastly.net/i/u/{0}/{1:032x}.png'
+SIZES = (('small', '34s'), ('medium', '64s'), ('large', '174s'),
+         ('extralarge', '300x300'))
+
+
+def image_list(i):
+    return [{'size': size, '#text': URL.format(px, i)} for size, px in SIZES]
+
+
+def test_image_map():
+    image_map = images(image_list(1))
+    assert image_map == dict((size, URL.format(px, 1)) for size, px in SIZES)
+    assert list(image_map) == [size for size, _ in SIZES]
+    assert image_map['large'] == URL.format('174s', 1)
+    pytest.raises(KeyError, image_map.__getitem__, 'mega')
+
+    # Maps with the same sizes share their layout
+    assert images(image_list(2))._layout is image_map._layout
+
+    irregular = images([{'size': 'small', '#text': 'http://example.com/a'},
+                        {'size': 'large', '#text': ''}])
+    assert irregular == {'small': 'http://example.com/a', 'large': ''}
+
+    assert images([]) == {}
+    assert len(ImageMap()) == 0
+
+
+def test_to_dict_json():
+    artist = common.TagArtist(dict(name='Low', image=image_list(1),
+                                   **{'@attr': {'rank': '1'}}))
+    data = json.loads(json.dumps(artist.to_dict()))
+    assert data['images']['large'] == URL.format('174s', 1)
+    assert type(artist.to_dict()['images']) is dict
+
+
+def test_image_memory():
+    tracemalloc = pytest.importorskip('tracemalloc')
+    count = 5000
+    body = json.dumps([image_list(i) for i in range(count)])
+
+    def retained(convert):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            data = json.loads(body)
+            maps = [convert(value) for value in data]
+            del data
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0], maps
+        finally:
+            tracemalloc.stop()
+
+    dicts, plain = retained(
+        lambda value: dict((item['size'], item['#text']) for item in value))
+    compact, maps = retained(images)
+    assert maps == plain
+
+    assert compact * 3 < dicts
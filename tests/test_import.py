@@ -0,0 +1,62 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+
+# Dependencies that should only be imported when a code path needs them
+HEAVY_MODULES = frozenset(['requests', 'dateutil', 'figgis', 'iso3166'])
+
+IMPORT_TIMER = """
+import time
+start = time.time()
+{0}
+print(time.time() - start)
+"""
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode()
+
+
+def imported_modules(code):
+    output = run_python(
+        code + '\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))')
+    return frozenset(json.loads(output.strip().splitlines()[-1]))
+
+
+def import_time(code, runs=5):
+    """Best-of-n wall time of executing `code` in a fresh interpreter"""
+    return min(float(run_python(IMPORT_TIMER.format(code)))
+               for _ in range(runs))
+
+
+def top_level(modules):
+    return frozenset(name.split('.')[0] for name in modules)
+
+
+def test_import_is_lazy():
+    modules = imported_modules('import pylastfm')
+
+    assert not HEAVY_MODULES.intersection(top_level(modules))
+    assert not any(name.startswith(('pylastfm.api', 'pylastfm.response'))
+                   for name in modules)
+
+
+def test_resource_imported_on_access():
+    modules = imported_modules(
+        'import pylastfm\n'
+        'pylastfm.LastFM("key", "secret").chart')
+
+    assert 'pylastfm.api.chart' in modules
+    assert 'pylastfm.response.chart' in modules
+    assert 'pylastfm.api.geo' not in modules
+    assert 'pylastfm.countries' not in modules
+
+
+@pytest.mark.benchmark
+def test_import_time():
+    lazy = import_time('import pylastfm')
+    eager = import_time('import pylastfm, requests, dateutil.parser, figgis')
+    assert lazy < eager
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+
+import pytest
+
+from pylastfm import LastFM, APIError
+from pylastfm.cache import ResponseCache
+from pylastfm.client import ApiInfo
+from pylastfm.keypool import ApiKeyPool
+from pylastfm.transport import HttpResponse
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def make_pool(n, **kwargs):
+    return ApiKeyPool([ApiInfo('key{0}'.format(i), 'secret')
+                       for i in range(n)], **kwargs)
+
+
+def test_lru():
+    pool = make_pool(3)
+    keys = [pool.acquire().key for _ in range(6)]
+    assert keys == ['key0', 'key1', 'key2'] * 2
+
+
+def test_budget():
+    pool = make_pool(2, strategy='budget', rate=1000)
+    keys = set(pool.acquire().key for _ in range(4))
+    assert keys == set(['key0', 'key1'])
+
+    pytest.raises(ValueError, make_pool, 2, strategy='budget')
+
+
+def test_quarantine():
+    pool = make_pool(2)
+    pool.quarantine(ApiInfo('key0', 'secret'), 29)
+    assert [pool.acquire().key for _ in range(3)] == ['key1'] * 3
+
+    # Errors unrelated to the key don't quarantine it
+    pool.quarantine(ApiInfo('key1', 'secret'), 6)
+    assert pool.acquire().key == 'key1'
+
+    pool.quarantine(ApiInfo('key1', 'secret'), 26)
+    exc = pytest.raises(APIError, pool.acquire)
+    assert exc.value.code == 29
+
+
+def error_response(code):
+    body = json.dumps({'error': code, 'message': 'Error'}).encode('utf-8')
+    return HttpResponse(200, {}, body)
+
+
+def test_client_pool():
+    client = LastFM('key0', 'secret', session_key='sk',
+                    api_keys=[('key1', 'secret1'), ('key2', 'secret2')])
+
+    def send(http_method, request_args, headers=None):
+        data = request_args.get('params') or request_args.get('data')
+        if data['api_key'] == 'key0' and data['method'] != 'track.love':
+            return error_response(29)
+        body = json.dumps({'key': data['api_key']}).encode('utf-8')
+        return HttpResponse(200, {}, body)
+
+    with patch.object(client, '_send') as request:
+        request.side_effect = send
+
+        # key0 is quarantined after its first error, and the request is
+        # retried with the next key
+        keys = [client._request('GET', 'chart.getTopTags')['key']
+                for _ in range(4)]
+        assert keys == ['key1', 'key2', 'key1', 'key2']
+        assert request.call_count == 5
+
+        # Signed methods always use the key that owns the session
+        assert client._request('POST', 'track.love')['key'] == 'key0'
+
+
+def test_client_pool_cache():
+    client = LastFM('key0', 'secret', api_keys=[('key1', 'secret1')],
+                    cache=ResponseCache(ttl=60))
+
+    with patch.object(client, '_send') as request, \
+            patch.object(client.key_pool, 'acquire',
+                         wraps=client.key_pool.acquire) as acquire:
+        request.return_value = HttpResponse(200, {}, b'{}')
+        for _ in range(3):
+            client._request('GET', 'chart.getTopTags')
+
+    # Keys are only taken for requests that are sent
+    assert (request.call_count, acquire.call_count) == (1, 1)
+
+
+def test_client_pool_coalesce():
+    client = LastFM('key0', 'secret', coalesce=True,
+                    api_keys=[('key1', 'secret1'), ('key2', 'secret2')])
+    started = threading.Event()
+    release = threading.Event()
+    sent = []
+    errors = []
+
+    def send(http_method, request_args, headers=None):
+        sent.append(request_args['params']['api_key'])
+        started.set()
+        release.wait()
+        return error_response(6)
+
+    def get_tags():
+        try:
+            client._request('GET', 'chart.getTopTags')
+        except APIError as exc:
+            errors.append(exc.code)
+
+    with patch.object(client, '_send', side_effect=send), \
+            patch.object(client.key_pool, 'quarantine') as quarantine:
+        threads = [threading.Thread(target=get_tags) for _ in range(4)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+
+        while client.single_flight.stats()['calls'] < 4:
+            time.sleep(0.001)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    # Only the key that was sent is reported to the pool
+    assert errors == [6] * 4
+    assert [call[0][0].key for call in quarantine.call_args_list] == sent
+    assert len(sent) == 1
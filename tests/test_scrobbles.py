@@ -0,0 +1,136 @@
+import json
+
+import pytest
+import six
+
+from pylastfm import LastFM, APIError
+from pylastfm.scrobbles import (ScrobbleImporter, normalize_rows, read_rows,
+                                scrobble_key)
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def history(count, start=1400000000):
+    return [dict(artist='Artist', track='Track {0}'.format(i),
+                 timestamp=six.text_type(start + i)) for i in range(count)]
+
+
+def recent_tracks(scrobbled, requests):
+    """Fake `_request` for user.getRecentTracks of `scrobbled` scrobbles"""
+    def request(http_method, method, params=None, collection_key=None,
+                **kwargs):
+        assert method == 'user.getRecentTracks'
+        requests.append((params['from'], params['to']))
+
+        tracks = [{'@attr': {'nowplaying': 'true'}, 'name': 'Now',
+                   'artist': {'name': 'Artist'}}]
+        tracks.extend(
+            {'name': track, 'artist': {'name': artist},
+             'date': {'uts': six.text_type(timestamp), '#text': ''}}
+            for timestamp, artist, track in scrobbled
+            if params['from'] <= timestamp <= params['to'])
+
+        return {'track': tracks, '@attr': {
+            'page': '1', 'totalPages': '1',
+            'total': six.text_type(len(tracks))}}
+
+    return request
+
+
+def test_normalize_rows():
+    scrobbles, rejected = normalize_rows([
+        dict(artistName=' Low ', trackName='On My Own',
+             timestamp='2015-04-17T18:54:00Z', duration='240', album=''),
+        dict(artistName='Low', timestamp='1429296840'),
+        dict(artistName='Low', trackName='Words', timestamp='soon'),
+    ], fields=dict(artistName='artist', trackName='track'))
+
+    assert scrobbles == [dict(artist='Low', track='On My Own',
+                              timestamp=1429296840, duration=240)]
+    assert [reason for _, reason in rejected][0] == 'Missing track'
+    assert len(rejected) == 2
+
+
+def test_read_rows():
+    lines = ['{"artist": "A", "track": "T", "timestamp": 1}\n', '\n']
+    assert list(read_rows(lines)) == [dict(artist='A', track='T',
+                                           timestamp=1)]
+    assert list(read_rows(['artist,track,album\n', 'A,T,\n'], 'csv')) == [
+        dict(artist='A', track='T')]
+
+
+def test_import_batches():
+    client = LastFM('key', 'secret', username='user')
+    rows = history(120)
+    rows[10]['timestamp'] = 'never'
+
+    with patch.object(client.track, 'scrobble') as scrobble:
+        stats = ScrobbleImporter(client, dedupe=False).run(iter(rows))
+
+    # Rejected rows don't make batches smaller
+    batches = [call[0][0] for call in scrobble.call_args_list]
+    assert [len(batch) for batch in batches] == [50, 50, 19]
+    assert stats.to_dict() == dict(rows=120, submitted=119, accepted=119,
+                                   ignored=0, duplicates=0, rejected=1)
+
+
+def test_import_dedupe():
+    client = LastFM('key', 'secret', username='user')
+    scrobbled = [scrobble_key(1400000000 + i, 'ARTIST', 'track {0}'.format(i))
+                 for i in range(0, 100, 2)]
+    requests = []
+
+    rows = history(100)
+    rows.append(dict(rows[1]))
+
+    with patch.object(client, '_request') as request, \
+            patch.object(client.track, 'scrobble') as scrobble:
+        request.side_effect = recent_tracks(scrobbled, requests)
+        scrobble.return_value = {'scrobbles': {'@attr': {'accepted': '45',
+                                                         'ignored': '5'}}}
+        stats = ScrobbleImporter(client).run(rows)
+
+    submitted = [item for call in scrobble.call_args_list
+                 for item in call[0][0]]
+    assert [item['timestamp'] for item in submitted] == list(
+        range(1400000001, 1400000100, 2))
+    assert stats.duplicates == 51
+    assert (stats.accepted, stats.ignored) == (45, 5)
+
+    # Recent tracks are only requested for spans of time not seen before
+    assert requests == [(1400000000, 1400000049), (1400000050, 1400000099)]
+
+
+def test_import_resume(tmpdir):
+    client = LastFM('key', 'secret', username='user')
+    state = str(tmpdir.join('state.json'))
+    rows = history(130)
+    scrobbled = []
+    failures = [APIError(11, 'Service offline')]
+
+    def scrobble(scrobbles):
+        if len(scrobbled) == 50 and failures:
+            raise failures.pop()
+        scrobbled.extend(scrobbles)
+
+    with patch.object(client.track, 'scrobble', side_effect=scrobble):
+        with pytest.raises(APIError):
+            ScrobbleImporter(client, dedupe=False, state=state).run(rows)
+
+        with open(state) as handle:
+            assert json.load(handle)['rows'] == 50
+
+        stats = ScrobbleImporter(client, dedupe=False, state=state).run(rows)
+
+    assert [item['track'] for item in scrobbled] == [
+        row['track'] for row in rows]
+    assert (stats.rows, stats.submitted) == (130, 130)
+
+
+def test_batch_size():
+    client = LastFM('key', 'secret', username='user')
+    with pytest.raises(ValueError):
+        ScrobbleImporter(client, batch_size=51)
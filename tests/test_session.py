@@ -0,0 +1,174 @@
+import json
+import pytest
+import threading
+
+from pylastfm.auth import LOGIN_TIMEOUT, Password, PasswordAuthToken
+from pylastfm.client import ApiInfo
+from pylastfm.transport import HttpResponse
+from pylastfm.session import (FileSessionStore, MemorySessionStore,
+                              session_store)
+from pylastfm import LastFM, AuthenticationError, APIError
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def make_auth(auth_class, store, password='password'):
+    return auth_class(None, ApiInfo('key', 'secret'), username='username',
+                      password=password, session_store=store)
+
+
+def test_file_store(tmpdir):
+    path = str(tmpdir.join('sessions'))
+    store = FileSessionStore(path)
+
+    assert store.get('key') is None
+    store.set('key', dict(session_key='sk', mode=True))
+
+    other = FileSessionStore(path)
+    assert other.get('key') == dict(session_key='sk', mode=True)
+
+    other.remove('key')
+    assert store.get('key') is None
+
+
+def test_session_store_from_path(tmpdir):
+    path = str(tmpdir.join('sessions'))
+    assert isinstance(session_store(path), FileSessionStore)
+
+    store = MemorySessionStore()
+    assert session_store(store) is store
+    assert session_store(None) is None
+
+
+def test_store_reused(tmpdir):
+    path = str(tmpdir.join('sessions'))
+
+    with patch.object(Password, '_login') as login:
+        login.return_value = ('sk', None)
+
+        assert make_auth(Password, FileSessionStore(path)).session_key() == \
+            'sk'
+        assert make_auth(Password, FileSessionStore(path)).session_key() == \
+            'sk'
+
+        assert login.call_count == 1
+
+
+@pytest.mark.parametrize('timeout,expected', [
+    (None, LOGIN_TIMEOUT),
+    (2.5, 2.5),
+])
+def test_login_timeout(tmpdir, timeout, expected):
+    import requests
+
+    client = LastFM('key', 'secret', username='username',
+                    password='password', timeout=timeout,
+                    session_store=str(tmpdir.join('sessions')))
+
+    # A login that times out releases the store's lock
+    with patch.object(requests, 'post',
+                      side_effect=requests.exceptions.Timeout) as post:
+        pytest.raises(AuthenticationError, client._auth.session_key)
+        assert post.call_args[1]['timeout'] == expected
+
+        post.side_effect = None
+        post.return_value.json.return_value = {'session': {'key': 'sk'}}
+        assert client._auth.session_key() == 'sk'
+
+
+def test_store_concurrent_login():
+    store = MemorySessionStore()
+    results = []
+
+    with patch.object(Password, '_login') as login:
+        login.return_value = ('sk', None)
+
+        def authenticate():
+            results.append(make_auth(Password, store).session_key())
+
+        threads = [threading.Thread(target=authenticate) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert login.call_count == 1
+        assert results == ['sk'] * 10
+
+
+def test_store_remembers_mode():
+    store = MemorySessionStore()
+    auth = make_auth(PasswordAuthToken, store)
+
+    def authenticate(hashed):
+        # The password doesn't look hashed, but it is
+        if not hashed:
+            raise AuthenticationError('Invalid password')
+        return 'sk'
+
+    with patch.object(auth, '_authenticate_maybe_hashed') as login:
+        login.side_effect = authenticate
+
+        assert auth.session_key() == 'sk'
+        assert login.call_count == 2
+
+        auth.invalidate('sk')
+        assert store.get(auth.store_key) == dict(session_key=None, mode=True)
+
+        login.reset_mock()
+        assert auth.session_key() == 'sk'
+        assert login.call_count == 1
+
+
+def test_client_invalid_session_key():
+    store = MemorySessionStore()
+    client = LastFM('key', 'secret', username='username',
+                    password='password', session_store=store)
+    store.set(client._auth.store_key, dict(session_key='stale', mode=None))
+
+    body = json.dumps(dict(error=9, message='Invalid session key'))
+    with patch.object(client, '_send') as send:
+        send.return_value = HttpResponse(200, {}, body.encode('utf-8'))
+
+        exc = pytest.raises(APIError, client.track.love, 'artist', 'track')
+        assert exc.value.code == 9
+
+    assert not client.api_info.authenticated
+    assert store.get(client._auth.store_key)['session_key'] is None
+
+
+def test_client_stale_session_key():
+    store = MemorySessionStore()
+    clients = [LastFM('key', 'secret', username='username',
+                      password='password', session_store=store)
+               for _ in range(2)]
+    store.set(clients[0]._auth.store_key, dict(session_key='old', mode=None))
+
+    def send(http_method, request_args, headers=None):
+        if request_args['data']['sk'] == 'old':
+            body = dict(error=9, message='Invalid session key')
+        else:
+            body = {}
+        return HttpResponse(200, {}, json.dumps(body).encode('utf-8'))
+
+    with patch.object(LastFM, '_send', side_effect=send), \
+            patch.object(type(clients[0]._auth), '_login') as login:
+        login.return_value = ('new', None)
+
+        # Both clients start with the old key
+        for client in clients:
+            client.authenticate()
+
+        pytest.raises(APIError, clients[0].track.love, 'artist', 'track')
+        clients[0].track.love('artist', 'track')
+        assert store.get(clients[0]._auth.store_key)['session_key'] == 'new'
+
+        # The other client's rejected key doesn't wipe the new one
+        pytest.raises(APIError, clients[1].track.love, 'artist', 'track')
+        assert store.get(clients[1]._auth.store_key)['session_key'] == 'new'
+
+        clients[1].track.love('artist', 'track')
+        assert login.call_count == 1
@@ -0,0 +1,129 @@
+import pytest
+import six
+
+from pylastfm import LastFM, APIError
+from pylastfm.tags import TagChange, TagSync, diff_tags
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def tags_response(*names):
+    tags = [dict(name=name, url='') for name in names]
+    if len(tags) == 1:
+        tags = tags[0]
+    return {'tag': tags, '@attr': {}}
+
+
+def test_diff_tags():
+    add, remove = diff_tags(['Rock', 'indie', 'seen live'],
+                            ['rock', 'Slowcore', 'slowcore', 'seen  live'])
+    assert add == ['Slowcore']
+    assert remove == ['indie']
+
+
+def test_add_tags_chunked():
+    client = LastFM('key', 'secret')
+    tags = ['tag {0}'.format(i) for i in range(23)]
+
+    with patch.object(client, '_request') as request:
+        client.track.add_tags('Low', 'Words', tags)
+        client.artist.add_tags('Low')
+
+    sent = [call[1]['data']['tags'].split(',')
+            for call in request.call_args_list]
+    assert [len(chunk) for chunk in sent] == [10, 10, 3]
+    assert sum(sent, []) == tags
+
+
+def test_remove_tag_method():
+    client = LastFM('key', 'secret')
+    with patch.object(client, '_request') as request:
+        client.track.remove_tag('Low', 'Words', 'slowcore')
+
+    assert request.call_args[0][1] == 'track.removeTag'
+
+
+def test_sync():
+    client = LastFM('key', 'secret', username='user')
+    current = {
+        'artist.getTags': tags_response('Slowcore', 'indie'),
+        'album.getTags': {'@attr': {}},
+        'track.getTags': tags_response('minnesota'),
+    }
+    writes = []
+
+    def request(http_method, method, params=None, data=None, **kwargs):
+        if http_method == 'GET':
+            assert params['user'] == 'user'
+            return current[method]
+        writes.append((method, data))
+
+    desired = {
+        ('artist', 'Low'): ['slowcore', 'minnesota'],
+        ('album', 'Low', 'Trust'): ['tag {0}'.format(i) for i in range(12)],
+        ('track', 'Low', 'Words'): ['Minnesota'],
+    }
+
+    with patch.object(client, '_request', side_effect=request):
+        sync = TagSync(client, workers=2)
+        changes = sync.sync(desired, dry_run=True)
+        assert writes == []
+
+        changes = sync.sync(desired)
+
+    assert sorted(changes) == [
+        TagChange(('album', 'Low', 'Trust'), desired[('album', 'Low',
+                                                      'Trust')], []),
+        TagChange(('artist', 'Low'), ['minnesota'], ['indie']),
+    ]
+    assert sorted((method, data.get('tag') or data['tags'])
+                  for method, data in writes) == [
+        ('album.addTags', ','.join('tag {0}'.format(i) for i in range(10))),
+        ('album.addTags', 'tag 10,tag 11'),
+        ('artist.addTags', 'minnesota'),
+        ('artist.removeTag', 'indie'),
+    ]
+    assert sync.failures == []
+
+
+def test_sync_failures():
+    client = LastFM('key', 'secret', username='user')
+
+    def request(http_method, method, params=None, data=None, **kwargs):
+        if method == 'track.getTags':
+            raise APIError(6, 'Track not found')
+        if method == 'artist.addTags':
+            raise APIError(11, 'Service offline')
+        if http_method == 'GET':
+            return tags_response('indie')
+
+    with patch.object(client, '_request', side_effect=request) as mock:
+        sync = TagSync(client, rate=1000)
+        changes = sync.sync({
+            ('artist', 'Low'): ['slowcore'],
+            ('track', 'Low', 'Words'): ['slowcore'],
+            ('album', 'Low', 'Trust'): ['indie', 'slowcore'],
+        })
+
+    # Changes with a failed request aren't reported as made
+    assert changes == [TagChange(('album', 'Low', 'Trust'), ['slowcore'],
+                                 [])]
+    assert [(failure.entity, failure.operation) for failure in
+            sync.failures] == [(('track', 'Low', 'Words'), None),
+                               (('artist', 'Low'), 'add')]
+    assert isinstance(sync.failures[0].error, APIError)
+
+    # The other change of the entity is still made
+    assert 'artist.removeTag' in [call[0][1] for call in mock.call_args_list]
+
+
+def test_invalid_entity():
+    client = LastFM('key', 'secret', username='user')
+    with pytest.raises(ValueError):
+        TagSync(client).diff({('album', 'Low'): []}, current={})
+
+    with pytest.raises(ValueError):
+        TagSync(client).current([six.text_type('Low')])
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+import six
+from figgis import PropertyError, ValidationError
+
+from pylastfm import LastFM
+from pylastfm.response import track as response
+
+
+def reference_marshal(scrobbles):
+    """Marshal scrobbles with the `Scrobble` model, field by field"""
+    data = {}
+    for index, scrobble in enumerate(scrobbles):
+        for key, value in response.Scrobble(scrobble).to_dict().items():
+            data['{0}[{1}]'.format(key, index)] = value
+    return data
+
+
+SCROBBLES = [
+    dict(artist='Low', track='On My Own', timestamp=1429296840),
+    dict(artist='Low', track='Words', timestamp='2015-04-17T18:54:00Z',
+         album='I Could Live in Hope', album_artist=5, track_number='3',
+         duration=180.5, chosen_by_user=False, stream_id='s', context='c',
+         mbid='m', streamId='ignored'),
+    dict(artist=None, track='Words', timestamp='1429296840'),
+]
+
+
+def test_marshal_scrobbles():
+    client = LastFM('key', 'secret')
+    scrobbles = SCROBBLES * 20
+
+    marshalled = client.track._marshal_scrobbles(scrobbles)
+    expected = reference_marshal(scrobbles)
+    assert marshalled == expected
+    assert list(marshalled) == list(expected)
+
+
+@pytest.mark.parametrize('scrobble,error', [
+    (dict(artist='Low', timestamp=1), PropertyError),
+    (dict(artist='Low', track='Words', timestamp=1, duration='long'),
+     ValidationError),
+    (dict(artist='Low', track='Words', timestamp=-1), ValueError),
+])
+def test_marshal_invalid_scrobbles(scrobble, error):
+    client = LastFM('key', 'secret')
+    pytest.raises(error, client.track._marshal_scrobbles, [scrobble])
+
+
+@pytest.mark.benchmark
+def test_marshal_scrobbles_benchmark():
+    client = LastFM('key', 'secret')
+    batch = [dict(artist='Artist {0}'.format(i), track='Track {0}'.format(i),
+                  album='Album', timestamp=1400000000 + i, duration=200)
+             for i in range(50)]
+
+    def throughput(marshal, batches):
+        started = time.time()
+        for _ in six.moves.range(batches):
+            marshal(batch)
+        return batches * len(batch) / (time.time() - started)
+
+    fast = throughput(client.track._marshal_scrobbles, 400)
+    slow = throughput(reference_marshal, 40)
+    assert fast > 3 * slow
@@ -0,0 +1,154 @@
+import io
+import gzip
+import json
+import time
+
+import pytest
+import requests
+import urllib3
+
+from pylastfm import LastFM, LastfmError
+from pylastfm.error import RequestTimeout
+from pylastfm.transport import (TransferStats, accept_encoding,
+                                read_response)
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+IMAGE_URL = 'https://lastfm.freetls.fastly.net/i/u/{0}/{1:032x}.png'
+
+
+def recent_tracks_page(size=200):
+    """Synthetic user.getRecentTracks page with extended data"""
+    def images(i):
+        return [{'size': size, '#text': IMAGE_URL.format(px, i)}
+                for size, px in (('small', '34s'), ('medium', '64s'),
+                                 ('large', '174s'), ('extralarge', '300x300'))]
+
+    tracks = [{
+        'name': 'Track {0}'.format(i),
+        'url': 'https://www.last.fm/music/Artist+{0}/_/Track+{0}'.format(i),
+        'mbid': '',
+        'streamable': '0',
+        'loved': '0',
+        'image': images(i),
+        'album': {'#text': 'Album {0}'.format(i), 'mbid': ''},
+        'artist': {'name': 'Artist {0}'.format(i), 'mbid': '',
+                   'url': 'https://www.last.fm/music/Artist+{0}'.format(i),
+                   'image': images(i)},
+        'date': {'uts': str(1500000000 + i), '#text': '14 Jul 2017, 02:40'},
+    } for i in range(size)]
+
+    return {'recenttracks': {
+        'track': tracks,
+        '@attr': {'user': 'user', 'page': '1', 'perPage': str(size),
+                  'totalPages': '1', 'total': str(size)},
+    }}
+
+
+def gzipped(body):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as handle:
+        handle.write(body)
+    return buf.getvalue()
+
+
+def streamed_response(body, encoding=None):
+    headers = {'Content-Encoding': encoding} if encoding else {}
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=headers,
+                                    status=200, preload_content=False,
+                                    decode_content=True)
+    resp.headers = requests.structures.CaseInsensitiveDict(headers)
+    return resp
+
+
+def test_accept_encoding():
+    encodings = accept_encoding()
+    assert 'gzip' in encodings
+    assert 'deflate' in encodings
+
+
+def test_read_response():
+    body = json.dumps(recent_tracks_page()).encode('utf-8')
+    compressed = gzipped(body)
+
+    resp, received = read_response(streamed_response(compressed, 'gzip'))
+    assert resp.body == body
+    assert received == len(compressed)
+    assert resp.json() == json.loads(body.decode('utf-8'))
+
+    resp, received = read_response(streamed_response(body))
+    assert resp.body == body
+    assert received == len(body)
+
+
+def test_read_response_errors():
+    resp = streamed_response(b'{}')
+    errors = urllib3.exceptions
+
+    with patch.object(resp.raw, 'stream') as stream:
+        stream.side_effect = errors.ReadTimeoutError(None, None, 'timeout')
+        pytest.raises(RequestTimeout, read_response, resp)
+
+        stream.side_effect = errors.ProtocolError('Connection reset')
+        exc = pytest.raises(LastfmError, read_response, resp)
+        assert not isinstance(exc.value, RequestTimeout)
+
+
+def test_transfer_stats():
+    stats = TransferStats()
+    stats.record('user.getRecentTracks', 100, 1000)
+    stats.record('user.getRecentTracks', 100, 1000)
+
+    assert stats['user.getRecentTracks'] == dict(
+        requests=2, compressed=200, decompressed=2000, ratio=10.0)
+    assert stats['chart.getTopTags']['ratio'] is None
+    assert list(stats.report()) == ['user.getRecentTracks']
+
+
+def test_client_transfer_stats():
+    client = LastFM('key', 'secret')
+    body = json.dumps(recent_tracks_page()).encode('utf-8')
+    compressed = gzipped(body)
+
+    with patch.object(client, '_http_session') as session:
+        session.return_value.request.return_value = streamed_response(
+            compressed, 'gzip')
+        client._request('GET', 'user.getRecentTracks')
+
+    stats = client.transfer_stats['user.getRecentTracks']
+    assert stats['compressed'] == len(compressed)
+    assert stats['decompressed'] == len(body)
+
+
+def test_compressed_page():
+    body = json.dumps(recent_tracks_page()).encode('utf-8')
+    compressed = gzipped(body)
+
+    resp, _ = read_response(streamed_response(compressed, 'gzip'))
+    assert resp.json() == json.loads(body.decode('utf-8'))
+    assert len(compressed) * 4 < len(body)
+
+
+@pytest.mark.benchmark
+def test_decompression_benchmark():
+    body = json.dumps(recent_tracks_page()).encode('utf-8')
+    compressed = gzipped(body)
+    runs = 20
+
+    results = {}
+    for encoding, payload in (('identity', body), ('gzip', compressed)):
+        start = time.time()
+        for _ in range(runs):
+            resp, _ = read_response(streamed_response(
+                payload, None if encoding == 'identity' else encoding))
+            resp.json()
+        results[encoding] = (time.time() - start) / runs
+
+    # Decompressing costs far less than the transfer it saves
+    assert results['gzip'] < results['identity'] * 5
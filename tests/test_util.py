@@ -1,7 +1,11 @@
 import pytest
+from datetime import datetime
 from mock import MagicMock
 
-from pylastfm.util import Signer, nested_set, nested_get, nested_in
+from pylastfm.error import RequestTimeout
+from pylastfm.util import (Signer, Pager, PaginatedIterator, RateLimiter,
+                           nested_set, nested_get, nested_in,
+                           parse_timestamp)
 from pylastfm.client import ApiInfo
 
 
@@ -79,3 +83,167 @@ def test_nested_set_fail():
 ])
 def test_nested_in(keys, data, is_in):
     assert nested_in(data, keys) == is_in
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(10, burst=2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert 0 < limiter.wait_time() <= 0.1
+
+    pytest.raises(ValueError, RateLimiter, 0)
+
+
+def test_pager_adaptive():
+    requests = []
+
+    def fetch(page, size):
+        requests.append((page, size))
+        if size > 50:
+            raise RequestTimeout('timed out')
+        return list(range((page - 1) * size, min(page * size, 450)))
+
+    pager = Pager(fetch, 200, 450, adaptive=True)
+    assert pager.page(1) == list(range(200))
+    assert pager.size == 50
+    assert pager.page(3) == list(range(400, 450))
+
+    assert requests == [(1, 200), (1, 100), (1, 50), (2, 50), (3, 50),
+                        (4, 50), (9, 50)]
+
+    pager = Pager(fetch, 200, 450)
+    pytest.raises(RequestTimeout, pager.page, 1)
+
+
+def paginated(total, perpage, limit=None):
+    requests = []
+
+    def fetch(page, size):
+        requests.append(page)
+        return list(range((page - 1) * size, min(page * size, total)))
+
+    pager = Pager(fetch, perpage, total)
+    iterator = PaginatedIterator(-(-total // perpage), total, pager=pager,
+                                 first_page=range(min(perpage, total)),
+                                 limit=limit)
+    return iterator, requests
+
+
+def test_paginated_iterator_limit():
+    iterator, requests = paginated(100, 30, limit=45)
+    assert len(iterator) == 45
+    assert iterator.total == 100
+    assert iterator.pages == 2
+
+    assert next(iterator) == 0
+    assert iterator.remaining == 44
+    assert list(iterator) == list(range(1, 45))
+    assert iterator.remaining == 0
+    assert requests == [2]
+
+
+def test_paginated_iterator_skip():
+    iterator, requests = paginated(100, 30)
+    assert next(iterator.skip(65)) == 65
+    assert requests == [3]
+
+    assert list(iterator.islice(10, 15)) == list(range(76, 81))
+    assert requests == [3]
+
+    iterator, requests = paginated(100, 30)
+    assert list(iterator.skip(200)) == []
+    assert requests == []
+
+
+def test_paginated_iterator_map():
+    iterator, _ = paginated(10, 4, limit=6)
+    mapped = iterator.map(str).map(len)
+    assert list(mapped) == [1] * 6
+    assert len(mapped) == 6
+
+
+def test_paginated_iterator_seek():
+    iterator, requests = paginated(100, 30)
+    assert next(iterator.seek(3)) == 60
+    assert requests == [3]
+
+
+def test_paginated_sequence():
+    iterator, requests = paginated(100, 30)
+    sequence = iterator.map(str).sequence()
+    assert len(sequence) == 100
+
+    assert sequence[75] == '75'
+    assert sequence[-1] == '99'
+    assert requests == [3, 4]
+    pytest.raises(IndexError, sequence.__getitem__, 100)
+
+    assert sequence[25:35] == [str(i) for i in range(25, 35)]
+    assert requests == [3, 4, 2]
+
+    # Every page is cached, so iterating again doesn't fetch anything
+    assert list(sequence) == [str(i) for i in range(100)]
+    assert list(sequence.seek(4)) == [str(i) for i in range(90, 100)]
+    assert requests == [3, 4, 2]
+    assert sequence.fetched == 3
+
+
+def test_paginated_sequence_max_pages():
+    iterator, requests = paginated(100, 30)
+    sequence = iterator.sequence(max_pages=2)
+
+    assert list(sequence) == list(range(100))
+    assert requests == [2, 3, 4]
+
+    assert sequence[0] == 0
+    assert sequence[95] == 95
+    assert requests == [2, 3, 4, 1]
+
+    empty = PaginatedIterator(0, 0, iter([])).sequence()
+    assert len(empty) == 0
+    assert list(empty) == []
+
+
+def test_paginated_iterator_iter_pages():
+    iterator, requests = paginated(100, 30, limit=80)
+    assert next(iterator) == 0
+
+    mapped = iterator.map(str)
+    pages = list(mapped.iter_pages())
+    assert [(page.page, len(page)) for page in pages] == [
+        (1, 29), (2, 30), (3, 20)]
+    assert all(page.total_pages == 4 and page.total == 100 for page in pages)
+    assert pages[1] == [str(i) for i in range(30, 60)]
+    assert mapped.remaining == 0
+    assert requests == [2, 3]
+
+    iterator, _ = paginated(100, 30)
+    raw = next(iterator.map(str).skip(90).iter_pages(raw=True))
+    assert raw == list(range(90, 100))
+
+
+@pytest.mark.parametrize('value,expected', [
+    (1429296840, 1429296840),
+    ('1429296840', 1429296840),
+    ('2015-04-17', 1429228800),
+    ('2015-04-17 18:54', 1429296840),
+    ('2015-04-17T18:54:00Z', 1429296840),
+    ('2015-04-17T20:54:00.5+02:00', 1429296840),
+    ('2015-04-17T16:54:00-0200', 1429296840),
+    (datetime(2015, 4, 17, 18, 54), 1429296840),
+])
+def test_parse_timestamp(value, expected):
+    assert parse_timestamp(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    1429296840.0, 1429296840.7, '1429296840.0', ' 1429296840 ', u'1429296840',
+])
+def test_parse_timestamp_number(local_timezone, value):
+    assert parse_timestamp(value) == 1429296840
+
+
+@pytest.mark.parametrize('value', [-1, -1.5, '-1', 'nan', float('inf'), ''])
+def test_parse_timestamp_invalid(value):
+    pytest.raises(ValueError, parse_timestamp, value)
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from pylastfm import LastFM, APIError
+from pylastfm.error import RequestTimeout
+
+try:
+    from unittest.mock import patch, call
+except ImportError:
+    from mock import patch, call
+
+
+@pytest.fixture
+def client():
+    client = LastFM('key', 'secret')
+    with patch.object(client.track, 'update_now_playing'), \
+            patch.object(client.track, 'love'), \
+            patch.object(client.track, 'unlove'):
+        yield client
+
+
+def wait_for(condition, timeout=2):
+    started = time.time()
+    while not condition():
+        assert time.time() - started < timeout
+        time.sleep(0.005)
+
+
+def test_now_playing_debounced(client):
+    with client.track.coalescer(delay=10) as writes:
+        for number in range(10):
+            writes.now_playing('Low', 'Track {0}'.format(number),
+                               album='Album')
+
+    client.track.update_now_playing.assert_called_once_with(
+        'Low', 'Track 9', album='Album')
+    assert writes.stats() == dict(requested=10, sent=1, coalesced=9,
+                                  failed=0)
+
+
+def test_love_collapsed(client):
+    writes = client.track.coalescer(delay=10)
+    writes.love('Low', 'Words')
+    writes.unlove('low', 'words')
+    writes.love('Low', 'Words')
+    writes.unlove('Low', 'Canada')
+    writes.flush()
+
+    client.track.love.assert_called_once_with('Low', 'Words')
+    client.track.unlove.assert_called_once_with('Low', 'Canada')
+
+    # The track may have been unloved elsewhere, so a state sent before is
+    # sent again
+    writes.unlove('Low', 'Words')
+    writes.love('Low', 'Words')
+    writes.close()
+
+    assert client.track.love.call_count == 2
+    assert writes.stats() == dict(requested=6, sent=3, coalesced=3,
+                                  failed=0)
+
+
+def test_delay(client):
+    with client.track.coalescer(delay=0.01) as writes:
+        writes.love('Low', 'Words')
+        wait_for(lambda: client.track.love.called)
+
+        writes.unlove('Low', 'Words')
+        wait_for(lambda: client.track.unlove.called)
+
+
+def test_max_delay(client):
+    with client.track.coalescer(delay=10, max_delay=0.05) as writes:
+        started = time.time()
+        while not client.track.update_now_playing.called:
+            assert time.time() - started < 2
+            writes.now_playing('Low', 'Words')
+            time.sleep(0.005)
+
+
+def test_failure(client):
+    client.track.love.side_effect = [APIError(11, 'Service offline'), None]
+    client.track.unlove.side_effect = APIError(6, 'Invalid parameters')
+
+    with client.track.coalescer(delay=10, retry_delay=0.01) as writes:
+        writes.love('Low', 'Words')
+        writes.unlove('Low', 'Canada')
+        writes.flush()
+
+    # Transient errors are retried, other errors aren't
+    assert client.track.love.call_args_list == [call('Low', 'Words')] * 2
+    assert client.track.unlove.call_count == 1
+    assert writes.stats() == dict(requested=2, sent=1, coalesced=0,
+                                  failed=2)
+
+    with pytest.raises(ValueError):
+        writes.love('Low', 'Words')
+
+
+def test_retry_limit(client):
+    client.track.love.side_effect = RequestTimeout('Request timed out')
+
+    with client.track.coalescer(delay=10, retries=2,
+                                retry_delay=0.001) as writes:
+        writes.love('Low', 'Words')
+
+    assert client.track.love.call_count == 3
+    assert writes.stats()['failed'] == 3
+
+
+def test_retry_superseded(client):
+    def love(artist, track):
+        # A newer write is made while the request is in flight
+        writes.unlove(artist, track)
+        raise APIError(16, 'Temporary error')
+
+    client.track.love.side_effect = love
+
+    with client.track.coalescer(delay=0.01, retry_delay=0.001) as writes:
+        writes.love('Low', 'Words')
+        wait_for(lambda: client.track.unlove.called)
+
+    assert client.track.love.call_count == 1
+    client.track.unlove.assert_called_once_with('Low', 'Words')